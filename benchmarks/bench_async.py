@@ -0,0 +1,85 @@
+"""
+Requests/sec and latency of the hot endpoints with the sync engine (thread pool)
+versus the asyncpg engine (DB_ASYNC=1).
+
+Starts one uvicorn server per mode against POSTGRES_URI and drives it with
+concurrent httpx clients. The catalog cache is disabled so every request reaches
+the database. Only read endpoints are exercised, so any database with the schema
+loaded will do:
+
+    python -m benchmarks.bench_async --requests 2000 --concurrency 64
+"""
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import time
+import httpx
+from benchmarks.common import print_table, summarize
+
+ENDPOINTS = ["/catalog/", "/carts/search/?potion_sku=GP-001"]
+
+
+def start_server(port, async_mode):
+    env = dict(os.environ, DB_ASYNC="1" if async_mode else "0", CATALOG_CACHE_TTL="0")
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "src.api.server:app", "--port", str(port), "--log-level", "warning"],
+        env=env,
+    )
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/", timeout=1)
+            return process
+        except httpx.TransportError:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError(f"uvicorn did not start on port {port}")
+
+
+async def drive(base_url, path, total, concurrency):
+    headers = {"access_token": os.environ.get("API_KEY", "")}
+    samples = []
+    errors = 0
+    remaining = iter(range(total))
+
+    async def worker(client):
+        nonlocal errors
+        for _ in remaining:
+            start = time.perf_counter()
+            response = await client.get(path, headers=headers)
+            samples.append((time.perf_counter() - start) * 1000)
+            if response.status_code >= 500:
+                errors += 1
+
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+    return {"rps": total / elapsed, "errors": errors, **summarize(samples)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--port", type=int, default=3100)
+    args = parser.parse_args()
+
+    rows = []
+    for async_mode in (False, True):
+        process = start_server(args.port, async_mode)
+        try:
+            for path in ENDPOINTS:
+                result = asyncio.run(drive(f"http://127.0.0.1:{args.port}", path, args.requests, args.concurrency))
+                rows.append({"mode": "async" if async_mode else "sync", "endpoint": path, **result})
+        finally:
+            process.terminate()
+            process.wait()
+    print_table(rows, ["mode", "endpoint", "rps", "p50_ms", "p99_ms", "errors"])
+
+
+if __name__ == "__main__":
+    main()
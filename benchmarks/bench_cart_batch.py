@@ -0,0 +1,68 @@
+"""
+Cost per cart item when a cart is filled one POST /carts/{id}/items/ at a time (a
+transaction per item) versus one POST /carts/{id}/items/batch (one SKU check and one
+upsert for the whole batch), as the batch grows.
+
+Commits real cart lines, so point POSTGRES_URI at a scratch database. The BENCH_
+SKUs, the cart and its lines are removed afterwards.
+
+    python -m benchmarks.bench_cart_batch --batch-sizes 1 5 20 50
+"""
+import argparse
+import sqlalchemy
+from src import cart_store
+from src import database as db
+from src.api.carts import CartItem, Customer, create_cart, set_cart_items
+from benchmarks.common import measure, print_table
+
+
+def setup(sku_count):
+    with db.engine.begin() as connection:
+        connection.execute(sqlalchemy.text("""
+            INSERT INTO potion_mixes (name, potion_composition, sku, price, inventory_quantity)
+            SELECT 'Bench ' || i, jsonb_build_object('red', 100, 'green', 0, 'blue', 0, 'dark', 0), 'BENCH_' || i, 10, 0
+            FROM generate_series(1, :skus) AS i
+            ON CONFLICT (sku) DO NOTHING
+        """), {'skus': sku_count})
+        return create_cart(connection, Customer(customer_name="Bench Cart Batch", character_class="Bench", level=1))
+
+
+def teardown(cart_id):
+    with db.engine.begin() as connection:
+        connection.execute(sqlalchemy.text("DELETE FROM cart_items WHERE cart_id = :cart_id"), {'cart_id': cart_id})
+        connection.execute(sqlalchemy.text("DELETE FROM carts WHERE cart_id = :cart_id"), {'cart_id': cart_id})
+        connection.execute(sqlalchemy.text("DELETE FROM potion_mixes WHERE sku LIKE 'BENCH\\_%'"))
+
+
+def one_at_a_time(cart_id, items):
+    for item in items:
+        with db.engine.begin() as connection:
+            cart_store.upsert_items(connection, [(cart_id, item.item_sku, item.quantity)])
+
+
+def batched(cart_id, items):
+    with db.engine.begin() as connection:
+        set_cart_items(connection, cart_id, items)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 5, 20, 50])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    cart_id = setup(max(args.batch_sizes))
+    rows = []
+    try:
+        for size in args.batch_sizes:
+            items = [CartItem(item_sku=f"BENCH_{i}", quantity=i % 5 + 1) for i in range(1, size + 1)]
+            for mode, fill in (("item per request", one_at_a_time), ("batch", batched)):
+                stats = measure(lambda: fill(cart_id, items), repeat=args.repeat, warmup=1)
+                rows.append({"batch_size": size, "mode": mode, "per_item_ms": stats["mean_ms"] / size, **stats})
+    finally:
+        teardown(cart_id)
+    print_table(rows, ["batch_size", "mode", "per_item_ms", "p50_ms", "p99_ms"])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Add-to-cart latency for each cart store: a committed upsert per call (CART_STORE=db)
+versus the in-memory store, with and without its journal, plus the cost the memory
+store moves to checkout (writing a whole cart in one upsert).
+
+Adds to one real cart, so point POSTGRES_URI at a scratch database; the cart and
+its lines are removed afterwards.
+
+    python -m benchmarks.bench_cart_store --calls 500 --cart-size 5
+"""
+import argparse
+import os
+import tempfile
+import sqlalchemy
+from src import cart_store
+from src import database as db
+from src.api.carts import Customer, create_cart
+from benchmarks.common import measure, print_table
+
+SKUS = ("GP-001", "RP-001", "BP-001", "PP-001")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=500)
+    parser.add_argument("--cart-size", type=int, default=len(SKUS), help="Distinct SKUs per cart (at most 4).")
+    args = parser.parse_args()
+    skus = SKUS[:args.cart_size]
+
+    with db.engine.begin() as connection:
+        cart_id = create_cart(connection, Customer(customer_name="Bench Cart Store", character_class="Bench", level=1))
+
+    def db_add(n=[0]):
+        n[0] += 1
+        with db.engine.begin() as connection:
+            cart_store.upsert_items(connection, [(cart_id, skus[n[0] % len(skus)], n[0] % 5 + 1)])
+
+    def memory_add(store, n=[0]):
+        n[0] += 1
+        store.put(cart_id, skus[n[0] % len(skus)], n[0] % 5 + 1)
+
+    rows = []
+    journal_dir = tempfile.mkdtemp()
+    try:
+        rows.append({"store": "db (commit per call)", **measure(db_add, repeat=args.calls)})
+
+        memory = cart_store.MemoryCartStore(flush_seconds=0)
+        rows.append({"store": "memory", **measure(lambda: memory_add(memory), repeat=args.calls)})
+
+        for fsync in (False, True):
+            journaled = cart_store.MemoryCartStore(
+                flush_seconds=0, journal_path=os.path.join(journal_dir, f"carts-{fsync}.jsonl"), journal_fsync=fsync,
+            )
+            name = "memory + journal" + (" (fsync)" if fsync else "")
+            rows.append({"store": name, **measure(lambda: memory_add(journaled), repeat=args.calls)})
+            journaled.clear()
+
+        # What the memory store pays once per cart instead of once per call
+        with db.engine.connect() as connection:
+            transaction = connection.begin()
+            try:
+                persist = measure(lambda: memory.persist(connection, cart_id), repeat=min(args.calls, 100))
+            finally:
+                transaction.rollback()
+        rows.append({"store": f"memory persist at checkout ({len(skus)} lines)", **persist})
+    finally:
+        with db.engine.begin() as connection:
+            connection.execute(sqlalchemy.text("DELETE FROM cart_items WHERE cart_id = :cart_id"), {'cart_id': cart_id})
+            connection.execute(sqlalchemy.text("DELETE FROM carts WHERE cart_id = :cart_id"), {'cart_id': cart_id})
+
+    print_table(rows, ["store", "mean_ms", "p50_ms", "p99_ms"])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Catalog latency as the number of SKUs and the size of the ledger grow.
+
+Compares the old per-SKU SUM over inventory_ledger with the single-query
+catalog builder. All seed data is written inside a transaction that is rolled
+back, so this is safe to point at a scratch database via POSTGRES_URI:
+
+    python -m benchmarks.bench_catalog --skus 6 50 500 --ledger-rows 10000 100000
+"""
+import argparse
+import sqlalchemy
+from src import database as db
+from src.api.catalog import build_catalog
+from benchmarks.common import measure, print_table
+
+
+def legacy_catalog(connection):
+    results = connection.execute(sqlalchemy.text(
+        "SELECT name, sku, price, potion_composition FROM potion_mixes"
+    )).fetchall()
+    catalog = []
+    for name, sku, price, potion_composition in results:
+        quantity = connection.execute(sqlalchemy.text(
+            "SELECT SUM(change_amount) FROM inventory_ledger WHERE item_id = :sku"
+        ), {'sku': sku}).scalar() or 0
+        if quantity > 0:
+            catalog.append({"sku": sku, "name": name, "quantity": quantity, "price": price, "potion_composition": potion_composition})
+    return catalog
+
+
+def seed(connection, skus, ledger_rows):
+    connection.execute(sqlalchemy.text("""
+        INSERT INTO potion_mixes (name, potion_composition, sku, price, inventory_quantity)
+        SELECT 'Bench ' || i, jsonb_build_object('red', 100, 'green', 0, 'blue', 0, 'dark', 0), 'BENCH_' || i, 50, 0
+        FROM generate_series(1, :skus) AS i
+    """), {'skus': skus})
+    connection.execute(sqlalchemy.text("""
+        INSERT INTO inventory_ledger (item_type, item_id, change_amount, description, date)
+        SELECT 'potion', 'BENCH_' || (1 + i % :skus), 1, 'bench', now()
+        FROM generate_series(1, :rows) AS i
+    """), {'skus': skus, 'rows': ledger_rows})
+    connection.execute(sqlalchemy.text("""
+        INSERT INTO inventory_balances (item_type, item_id, balance)
+        SELECT item_type, item_id, SUM(change_amount) FROM inventory_ledger
+        WHERE description = 'bench'
+        GROUP BY item_type, item_id
+        ON CONFLICT (item_type, item_id) DO UPDATE SET balance = EXCLUDED.balance
+    """))
+    connection.execute(sqlalchemy.text("ANALYZE inventory_ledger"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--skus", type=int, nargs="+", default=[6, 50, 500])
+    parser.add_argument("--ledger-rows", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    rows = []
+    for skus in args.skus:
+        for ledger_rows in args.ledger_rows:
+            with db.engine.connect() as connection:
+                transaction = connection.begin()
+                try:
+                    seed(connection, skus, ledger_rows)
+                    legacy = measure(lambda: legacy_catalog(connection), repeat=args.repeat)
+                    single = measure(lambda: build_catalog(connection), repeat=args.repeat)
+                finally:
+                    transaction.rollback()
+            rows.append({
+                "skus": skus,
+                "ledger_rows": ledger_rows,
+                "legacy_p50_ms": legacy["p50_ms"],
+                "legacy_p99_ms": legacy["p99_ms"],
+                "single_p50_ms": single["p50_ms"],
+                "single_p99_ms": single["p99_ms"],
+            })
+    print_table(rows, ["skus", "ledger_rows", "legacy_p50_ms", "legacy_p99_ms", "single_p50_ms", "single_p99_ms"])
+
+
+if __name__ == "__main__":
+    main()
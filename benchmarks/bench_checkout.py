@@ -0,0 +1,117 @@
+"""
+Checkout throughput as cart size and the number of concurrent carts grow.
+
+Compares the old per-line loop (price lookup + ledger insert per item) with the
+set-based checkout_cart. The benchmark commits real carts, so point
+POSTGRES_URI at a scratch database. The BENCH_ SKUs, carts and their ledger
+rows are removed afterwards; the gold the bench carts paid is not.
+
+    python -m benchmarks.bench_checkout --cart-sizes 1 5 20 --concurrency 1 8 32
+"""
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+import sqlalchemy
+from src import database as db
+from src import ledger
+from src.api.carts import checkout_cart
+from benchmarks.common import print_table
+
+SKU_COUNT = 20
+
+
+def legacy_checkout(connection, cart_id):
+    items = connection.execute(sqlalchemy.text(
+        "SELECT item_sku, quantity FROM cart_items WHERE cart_id = :cart_id"
+    ), {'cart_id': cart_id}).fetchall()
+    total_cost = 0
+    for item in items:
+        price = connection.execute(sqlalchemy.text(
+            "SELECT price FROM potion_mixes WHERE sku = :sku"
+        ), {'sku': item.item_sku}).scalar()
+        total_cost += price * item.quantity
+        ledger.record_entries(connection, [{'item_type': 'potion', 'item_id': item.item_sku, 'change_amount': -item.quantity, 'description': 'sale'}])
+    ledger.record_entries(connection, [{'item_type': 'gold', 'item_id': 'N/A', 'change_amount': total_cost, 'description': 'sale income'}])
+    connection.execute(sqlalchemy.text("DELETE FROM cart_items WHERE cart_id = :cart_id"), {'cart_id': cart_id})
+
+
+def setup():
+    with db.engine.begin() as connection:
+        connection.execute(sqlalchemy.text("""
+            INSERT INTO potion_mixes (name, potion_composition, sku, price, inventory_quantity)
+            SELECT 'Bench ' || i, jsonb_build_object('red', 100, 'green', 0, 'blue', 0, 'dark', 0), 'BENCH_' || i, 10, 0
+            FROM generate_series(1, :skus) AS i
+            ON CONFLICT (sku) DO NOTHING
+        """), {'skus': SKU_COUNT})
+        ledger.record_entries(connection, [
+            {'item_type': 'potion', 'item_id': f'BENCH_{i}', 'change_amount': 10_000_000, 'description': 'bench stock'}
+            for i in range(1, SKU_COUNT + 1)
+        ])
+        return connection.execute(sqlalchemy.text(
+            "INSERT INTO customer_visits (customer_name) VALUES ('Bench Customer') RETURNING visit_id"
+        )).scalar()
+
+
+def fill_carts(visit_id, carts, cart_size):
+    with db.engine.begin() as connection:
+        cart_ids = [
+            connection.execute(sqlalchemy.text(
+                "INSERT INTO carts (visit_id) VALUES (:visit_id) RETURNING cart_id"
+            ), {'visit_id': visit_id}).scalar()
+            for _ in range(carts)
+        ]
+        connection.execute(sqlalchemy.text("""
+            INSERT INTO cart_items (cart_id, item_sku, quantity)
+            SELECT cart_id, 'BENCH_' || i, 1
+            FROM unnest(CAST(:cart_ids AS INTEGER[])) AS cart_id, generate_series(1, :cart_size) AS i
+        """), {'cart_ids': cart_ids, 'cart_size': cart_size})
+    return cart_ids
+
+
+def run(checkout, cart_ids, concurrency):
+    def one(cart_id):
+        with db.engine.begin() as connection:
+            checkout(connection, cart_id)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, cart_ids))
+    return len(cart_ids) / (time.perf_counter() - start)
+
+
+def teardown(visit_id):
+    with db.engine.begin() as connection:
+        connection.execute(sqlalchemy.text(
+            "DELETE FROM cart_items WHERE cart_id IN (SELECT cart_id FROM carts WHERE visit_id = :visit_id)"
+        ), {'visit_id': visit_id})
+        connection.execute(sqlalchemy.text("DELETE FROM carts WHERE visit_id = :visit_id"), {'visit_id': visit_id})
+        connection.execute(sqlalchemy.text("DELETE FROM customer_visits WHERE visit_id = :visit_id"), {'visit_id': visit_id})
+        connection.execute(sqlalchemy.text("DELETE FROM inventory_ledger WHERE item_id LIKE 'BENCH\\_%'"))
+        connection.execute(sqlalchemy.text("DELETE FROM inventory_balances WHERE item_id LIKE 'BENCH\\_%'"))
+        connection.execute(sqlalchemy.text("DELETE FROM potion_mixes WHERE sku LIKE 'BENCH\\_%'"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cart-sizes", type=int, nargs="+", default=[1, 5, 20])
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--carts", type=int, default=200, help="Carts checked out per measurement.")
+    args = parser.parse_args()
+
+    visit_id = setup()
+    rows = []
+    try:
+        for cart_size in args.cart_sizes:
+            for concurrency in args.concurrency:
+                row = {"cart_size": cart_size, "concurrency": concurrency}
+                for name, checkout in (("legacy", legacy_checkout), ("batched", checkout_cart)):
+                    cart_ids = fill_carts(visit_id, args.carts, cart_size)
+                    row[f"{name}_carts_per_s"] = run(checkout, cart_ids, concurrency)
+                rows.append(row)
+    finally:
+        teardown(visit_id)
+    print_table(rows, ["cart_size", "concurrency", "legacy_carts_per_s", "batched_carts_per_s"])
+
+
+if __name__ == "__main__":
+    main()
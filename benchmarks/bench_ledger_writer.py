@@ -0,0 +1,82 @@
+"""
+Ledger rows/sec: one INSERT per row (the old write pattern) versus LedgerWriter
+with array parameters versus LedgerWriter over COPY.
+
+Every run happens inside a transaction that is rolled back:
+
+    python -m benchmarks.bench_ledger_writer --rows 10 100 1000 10000
+"""
+import argparse
+import datetime
+import time
+import sqlalchemy
+from src import database as db
+from src import ledger
+from benchmarks.common import print_table
+
+PER_ROW_INSERT = sqlalchemy.text("""
+    INSERT INTO inventory_ledger (item_type, item_id, change_amount, description, date)
+    VALUES (:item_type, :item_id, :change_amount, :description, :date)
+""")
+
+
+def entries(rows):
+    return [
+        {'item_type': 'potion', 'item_id': f'BENCH_{i % 50}', 'change_amount': 1, 'description': 'bench'}
+        for i in range(rows)
+    ]
+
+
+def per_row(connection, rows):
+    for entry in entries(rows):
+        connection.execute(PER_ROW_INSERT, {**entry, 'date': datetime.datetime.now()})
+
+
+def writer_arrays(connection, rows):
+    writer = ledger.LedgerWriter(connection).extend(entries(rows))
+    threshold, ledger.COPY_THRESHOLD = ledger.COPY_THRESHOLD, float("inf")
+    try:
+        writer.flush()
+    finally:
+        ledger.COPY_THRESHOLD = threshold
+
+
+def writer_copy(connection, rows):
+    writer = ledger.LedgerWriter(connection).extend(entries(rows))
+    threshold, ledger.COPY_THRESHOLD = ledger.COPY_THRESHOLD, 0
+    try:
+        writer.flush()
+    finally:
+        ledger.COPY_THRESHOLD = threshold
+
+
+def rows_per_second(write, rows):
+    with db.engine.connect() as connection:
+        transaction = connection.begin()
+        try:
+            start = time.perf_counter()
+            write(connection, rows)
+            return rows / (time.perf_counter() - start)
+        finally:
+            transaction.rollback()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[10, 100, 1000, 10000])
+    args = parser.parse_args()
+
+    results = []
+    for rows in args.rows:
+        results.append({
+            "rows": rows,
+            "per_row_insert": rows_per_second(per_row, rows),
+            "writer_arrays": rows_per_second(writer_arrays, rows),
+            "writer_copy": rows_per_second(writer_copy, rows),
+        })
+    print("rows/sec (per_row_insert does not maintain inventory_balances)")
+    print_table(results, ["rows", "per_row_insert", "writer_arrays", "writer_copy"])
+
+
+if __name__ == "__main__":
+    main()
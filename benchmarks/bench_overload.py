@@ -0,0 +1,102 @@
+"""
+Latency under overload with and without admission control.
+
+Starts uvicorn against POSTGRES_URI once with MAX_IN_FLIGHT=0 (no cap) and once
+with the cap, rate limits off both times, and drives /carts/search/ with far more
+concurrent clients than the database pool can serve. Without the cap every
+request queues for a connection and latency grows with the offered load; with it
+the excess is answered 503 at once and the admitted requests stay fast. Only a
+read endpoint is used, so any database with the schema loaded will do:
+
+    python -m benchmarks.bench_overload --concurrency 32 128 512 --max-in-flight 16
+"""
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import time
+from collections import Counter
+import httpx
+from benchmarks.common import print_table, summarize
+
+PATH = "/carts/search/?potion_sku=GP-001"
+API_KEY = "bench-overload"
+
+
+def start_server(port, max_in_flight):
+    env = dict(os.environ, API_KEY=API_KEY, API_RATE_LIMIT="0", MAX_IN_FLIGHT=str(max_in_flight))
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "src.api.server:app", "--port", str(port), "--log-level", "warning"],
+        env=env,
+    )
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/", timeout=1)
+            return process
+        except httpx.TransportError:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError(f"uvicorn did not start on port {port}")
+
+
+async def drive(base_url, seconds, concurrency):
+    admitted = []
+    shed = []
+    statuses = Counter()
+    deadline = time.perf_counter() + seconds
+
+    async def worker(client):
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            try:
+                response = await client.get(PATH, headers={"access_token": API_KEY})
+                status = response.status_code
+            except httpx.TimeoutException:
+                status = "timeout"
+            elapsed = (time.perf_counter() - start) * 1000
+            statuses[status] += 1
+            (shed if status in (429, 503) else admitted).append(elapsed)
+            if status == 503:
+                # A well-behaved client backs off for Retry-After; keep it short here
+                await asyncio.sleep(0.05)
+
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30) as client:
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+
+    admitted_stats = summarize(admitted)
+    return {
+        "ok_per_s": statuses[200] / seconds,
+        "shed": statuses[503] + statuses[429],
+        "errors": sum(count for status, count in statuses.items() if status not in (200, 429, 503)),
+        "p50_ms": admitted_stats["p50_ms"],
+        "p99_ms": admitted_stats["p99_ms"],
+        "shed_p99_ms": summarize(shed)["p99_ms"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[32, 128, 512])
+    parser.add_argument("--max-in-flight", type=int, default=16)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--port", type=int, default=3200)
+    args = parser.parse_args()
+
+    rows = []
+    for max_in_flight in (0, args.max_in_flight):
+        process = start_server(args.port, max_in_flight)
+        try:
+            for concurrency in args.concurrency:
+                result = asyncio.run(drive(f"http://127.0.0.1:{args.port}", args.seconds, concurrency))
+                rows.append({"max_in_flight": max_in_flight or "off", "concurrency": concurrency, **result})
+        finally:
+            process.terminate()
+            process.wait()
+    print_table(rows, ["max_in_flight", "concurrency", "ok_per_s", "shed", "errors", "p50_ms", "p99_ms", "shed_p99_ms"])
+
+
+if __name__ == "__main__":
+    main()
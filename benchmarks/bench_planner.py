@@ -0,0 +1,67 @@
+"""
+Planning time of the bottling planner for catalogs of dozens of mixes and of
+the barrel planner for large wholesale catalogs.
+
+Pure NumPy, no database needed:
+
+    python -m benchmarks.bench_planner --mixes 6 24 48 96 --barrels 100 10000 100000
+"""
+import argparse
+import numpy as np
+from src.planner import plan_barrels, plan_bottles
+from benchmarks.common import measure, print_table
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mixes", type=int, nargs="+", default=[6, 24, 48, 96])
+    parser.add_argument("--barrels", type=int, nargs="+", default=[100, 10_000, 100_000])
+    parser.add_argument("--capacity", type=int, default=500)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    ml_available = np.array([40_000, 40_000, 40_000, 20_000])
+    rows = []
+    for mixes in args.mixes:
+        compositions = rng.multinomial(100, [0.25] * 4, size=mixes)
+        prices = rng.integers(20, 120, size=mixes)
+        stats = measure(lambda: plan_bottles(compositions, prices, ml_available, args.capacity), repeat=args.repeat)
+        counts = plan_bottles(compositions, prices, ml_available, args.capacity)
+        rows.append({
+            "mixes": mixes,
+            "potions": int(counts.sum()),
+            "mixes_used": int((counts > 0).sum()),
+            "ml_used_pct": float((counts @ compositions).sum() / ml_available.sum() * 100),
+            "p50_ms": stats["p50_ms"],
+            "p99_ms": stats["p99_ms"],
+        })
+    print_table(rows, ["mixes", "potions", "mixes_used", "ml_used_pct", "p50_ms", "p99_ms"])
+    print()
+
+    rows = []
+    for barrels in args.barrels:
+        ml_per_barrel = rng.choice([500, 2500, 10000], size=barrels)
+        prices = (ml_per_barrel * rng.uniform(0.02, 0.2, size=barrels)).astype(int) + 1
+        quantities = rng.integers(1, 20, size=barrels)
+        colors = rng.integers(0, 4, size=barrels)
+        demand = [30_000, 30_000, 30_000, 10_000]
+
+        def plan():
+            return plan_barrels(ml_per_barrel, prices, quantities, colors, 5_000, 100_000, demand)
+
+        stats = measure(plan, repeat=max(5, args.repeat // 10))
+        counts = plan()
+        rows.append({
+            "barrels": barrels,
+            "bought": int(counts.sum()),
+            "gold_spent": int(counts @ prices),
+            "ml_bought": int(counts @ ml_per_barrel),
+            "p50_ms": stats["p50_ms"],
+            "p99_ms": stats["p99_ms"],
+        })
+    print_table(rows, ["barrels", "bought", "gold_spent", "ml_bought", "p50_ms", "p99_ms"])
+
+
+if __name__ == "__main__":
+    main()
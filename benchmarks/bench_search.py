@@ -0,0 +1,104 @@
+"""
+Order search latency by page depth: keyset cursors versus OFFSET paging.
+
+Seeds a history of sold line items (a million by default) and walks deep pages
+both ways. Everything runs inside one transaction that is rolled back, so any
+database with the schema and migrations/002_order_search.sql loaded will do:
+
+    python -m benchmarks.bench_search --rows 1000000 --pages 1 100 1000 10000
+"""
+import argparse
+import sqlalchemy
+from src import database as db
+from src import pagination
+from src.api import carts
+from benchmarks.common import measure, print_table
+
+SEED_QUERY = sqlalchemy.text("""
+    WITH visits AS (
+        INSERT INTO customer_visits (customer_name, visit_timestamp)
+        SELECT 'Bench Customer ' || i, now() - i * interval '1 second'
+        FROM generate_series(1, :visits) AS i
+        RETURNING visit_id
+    ),
+    new_carts AS (
+        INSERT INTO carts (visit_id)
+        SELECT visit_id FROM visits
+        RETURNING cart_id
+    ),
+    numbered AS (
+        SELECT cart_id, row_number() OVER () AS n FROM new_carts
+    )
+    INSERT INTO cart_items (cart_id, item_sku, quantity, line_item_total, sold_at)
+    SELECT c.cart_id, pm.sku, 1 + (c.n % 5), CAST(ROUND((1 + (c.n % 5)) * pm.price) AS INTEGER),
+           now() - (c.n * :skus + pm.rn) * interval '1 second'
+    FROM numbered c
+    CROSS JOIN (SELECT sku, price, row_number() OVER (ORDER BY sku) AS rn FROM potion_mixes) pm
+""")
+
+OFFSET_QUERY = sqlalchemy.text("""
+    SELECT ci.cart_items_id, ci.item_sku, cv.customer_name, ci.line_item_total, ci.sold_at
+    FROM cart_items ci
+    JOIN carts c ON ci.cart_id = c.cart_id
+    JOIN customer_visits cv ON c.visit_id = cv.visit_id
+    WHERE ci.sold_at IS NOT NULL
+    ORDER BY ci.sold_at DESC, ci.cart_items_id DESC
+    LIMIT :limit OFFSET :offset
+""")
+
+
+def seed(connection, rows):
+    skus = connection.execute(sqlalchemy.text("SELECT COUNT(*) FROM potion_mixes")).scalar()
+    if not skus:
+        raise SystemExit("potion_mixes is empty; load schema.sql first")
+    connection.execute(SEED_QUERY, {'visits': -(-rows // skus), 'skus': skus})
+    connection.execute(sqlalchemy.text("ANALYZE cart_items"))
+    connection.execute(sqlalchemy.text("ANALYZE customer_visits"))
+
+
+def keyset_token(connection, page):
+    """
+    Cursor for the given page, built from the row just before it.
+    """
+    if page <= 1:
+        return ""
+    row = connection.execute(sqlalchemy.text("""
+        SELECT sold_at, cart_items_id FROM cart_items
+        WHERE sold_at IS NOT NULL
+        ORDER BY sold_at DESC, cart_items_id DESC
+        OFFSET :offset LIMIT 1
+    """), {'offset': (page - 1) * carts.SEARCH_PAGE_SIZE - 1}).one()
+    return pagination.encode_cursor("timestamp", "desc", row.sold_at, row.cart_items_id, pagination.NEXT)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--pages", type=int, nargs="+", default=[1, 100, 1000, 10000, 100000])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    rows = []
+    with db.engine.connect() as connection:
+        transaction = connection.begin()
+        try:
+            seed(connection, args.rows)
+            for page in args.pages:
+                token = keyset_token(connection, page)
+                keyset = measure(lambda: carts.find_orders(
+                    connection, None, None, None, token,
+                    carts.search_sort_options.timestamp, carts.search_sort_order.desc,
+                ), repeat=args.repeat, warmup=2)
+                offset = measure(lambda: connection.execute(OFFSET_QUERY, {
+                    'limit': carts.SEARCH_PAGE_SIZE + 1,
+                    'offset': (page - 1) * carts.SEARCH_PAGE_SIZE,
+                }).fetchall(), repeat=args.repeat, warmup=2)
+                rows.append({"page": page, "mode": "keyset", **keyset})
+                rows.append({"page": page, "mode": "offset", **offset})
+        finally:
+            transaction.rollback()
+    print_table(rows, ["page", "mode", "p50_ms", "p99_ms"])
+
+
+if __name__ == "__main__":
+    main()
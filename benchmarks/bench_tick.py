@@ -0,0 +1,242 @@
+"""
+Replay full Potion Exchange ticks against the app and report throughput and
+latency percentiles per endpoint.
+
+Each tick does what the game does: every customer reads the catalog, the tick's
+customers are posted to /carts/visits, the buying share of them create a cart,
+add an item and check out (up to --concurrency at once), then the shop runs the
+barrel and bottler plan/deliver cycle.
+
+Requests go through the ASGI app in-process, so the numbers cover routing,
+validation and the database but not the network. With no --database-url a
+temporary Postgres cluster is started (see benchmarks/pg.py) and schema.sql is
+loaded; with one, pass --load-schema only if the database is empty. Either way
+the run seeds gold and stock and commits its traffic, so never point it at the
+live shop.
+
+Results are written as JSON so runs can be compared:
+
+    python -m benchmarks.bench_tick --ticks 10 --customers 300 --concurrency 32
+    python -m benchmarks.bench_tick --baseline benchmarks/results/tick-20240101-120000.json
+"""
+import argparse
+import asyncio
+import contextlib
+import datetime
+import json
+import os
+import random
+import subprocess
+import time
+from collections import defaultdict
+import httpx
+import sqlalchemy
+from src import ledger
+from benchmarks.common import percentile, print_table, summarize
+from benchmarks.pg import ROOT, load_schema, local_postgres
+
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+
+CLASSES = ("Wizard", "Fighter", "Rogue", "Cleric", "Druid", "Bard")
+
+WHOLESALE_CATALOG = [
+    {"sku": f"{size}_{color.upper()}_BARREL", "ml_per_barrel": ml, "potion_type": potion_type, "price": price, "quantity": 10}
+    for color, potion_type in (("red", [1, 0, 0, 0]), ("green", [0, 1, 0, 0]), ("blue", [0, 0, 1, 0]), ("dark", [0, 0, 0, 1]))
+    for size, ml, price in (("SMALL", 500, 100), ("MEDIUM", 2500, 250), ("LARGE", 10000, 750))
+]
+
+
+class Recorder:
+    """
+    Times every request and groups the samples by endpoint.
+    """
+
+    def __init__(self, client):
+        self.client = client
+        self.samples = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    async def request(self, endpoint, method, path, **kwargs):
+        start = time.perf_counter()
+        response = await self.client.request(method, path, **kwargs)
+        self.samples[endpoint].append((time.perf_counter() - start) * 1000)
+        if response.status_code >= 400:
+            self.errors[endpoint] += 1
+            return None
+        return response.json()
+
+
+def seed(connection, customers, ticks):
+    """
+    Enough gold, ml and stock that checkouts and deliveries aren't rejected for
+    running dry, so the run measures the happy path.
+    """
+    skus = connection.execute(sqlalchemy.text("SELECT sku FROM potion_mixes")).scalars().all()
+    stock = max(1000, customers * ticks * 5)
+    entries = [{'item_type': 'gold', 'item_id': 'N/A', 'change_amount': 1_000_000, 'description': 'tick benchmark seed'}]
+    entries += [{'item_type': 'ml', 'item_id': color, 'change_amount': 50_000, 'description': 'tick benchmark seed'} for color in ("red", "green", "blue", "dark")]
+    entries += [{'item_type': 'potion', 'item_id': sku, 'change_amount': stock, 'description': 'tick benchmark seed'} for sku in skus]
+    ledger.record_entries(connection, entries)
+    connection.execute(sqlalchemy.text(
+        "UPDATE capacity_inventory SET potion_capacity = GREATEST(potion_capacity, 1000), ml_capacity = GREATEST(ml_capacity, 200000)"
+    ))
+
+
+async def customer_flow(recorder, semaphore, rng, customer):
+    async with semaphore:
+        catalog = await recorder.request("GET /catalog/", "GET", "/catalog/")
+        if not catalog:
+            return
+        cart = await recorder.request("POST /carts/", "POST", "/carts/", json=customer)
+        if not cart:
+            return
+        cart_id = cart["cart_id"]
+        item = rng.choice(catalog)
+        await recorder.request(
+            "POST /carts/{cart_id}/items/", "POST", f"/carts/{cart_id}/items/",
+            json={"item_sku": item["sku"], "quantity": rng.randint(1, 3)},
+        )
+        await recorder.request("POST /carts/{cart_id}/checkout", "POST", f"/carts/{cart_id}/checkout", json={"payment": "gold"})
+
+
+async def run_tick(recorder, rng, tick, args):
+    customers = [
+        {"customer_name": f"Customer {tick}-{i}", "character_class": rng.choice(CLASSES), "level": rng.randint(1, 20)}
+        for i in range(args.customers)
+    ]
+    await recorder.request("POST /carts/visits/{visit_id}", "POST", f"/carts/visits/{tick}", json=customers)
+
+    buyers = [customer for customer in customers if rng.random() < args.buy_rate]
+    semaphore = asyncio.Semaphore(args.concurrency)
+    await asyncio.gather(*(customer_flow(recorder, semaphore, random.Random(rng.random()), customer) for customer in buyers))
+
+    order_id = tick + 1
+    barrels = await recorder.request("POST /barrels/plan", "POST", "/barrels/plan", json=WHOLESALE_CATALOG)
+    if barrels:
+        by_sku = {barrel["sku"]: barrel for barrel in WHOLESALE_CATALOG}
+        delivery = [dict(by_sku[item["sku"]], quantity=item["quantity"]) for item in barrels]
+        await recorder.request("POST /barrels/deliver/{order_id}", "POST", f"/barrels/deliver/{order_id}", json=delivery)
+
+    bottles = await recorder.request("POST /bottler/plan", "POST", "/bottler/plan")
+    if bottles:
+        await recorder.request("POST /bottler/deliver/{order_id}", "POST", f"/bottler/deliver/{order_id}", json=bottles)
+
+
+async def replay(app, args):
+    headers = {"access_token": os.environ["API_KEY"]}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", headers=headers, timeout=120) as client:
+        recorder = Recorder(client)
+        rng = random.Random(args.seed)
+        start = time.perf_counter()
+        for tick in range(args.ticks):
+            await run_tick(recorder, rng, tick, args)
+        elapsed = time.perf_counter() - start
+    return recorder, elapsed
+
+
+def report(recorder, elapsed, args):
+    endpoints = {}
+    for endpoint, samples in sorted(recorder.samples.items()):
+        endpoints[endpoint] = {
+            **summarize(samples),
+            "p95_ms": percentile(samples, 95),
+            "rps": len(samples) / elapsed,
+            "errors": recorder.errors[endpoint],
+        }
+    total = sum(len(samples) for samples in recorder.samples.values())
+    return {
+        "started_at": datetime.datetime.now().isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "config": {key: getattr(args, key) for key in ("ticks", "customers", "buy_rate", "concurrency", "seed")},
+        "elapsed_s": elapsed,
+        "requests": total,
+        "rps": total / elapsed,
+        "endpoints": endpoints,
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return ""
+
+
+def print_results(results, baseline=None):
+    rows = []
+    for endpoint, stats in results["endpoints"].items():
+        row = {"endpoint": endpoint, **stats}
+        previous = (baseline or {}).get("endpoints", {}).get(endpoint)
+        if previous:
+            row["p50_change"] = f"{(stats['p50_ms'] / previous['p50_ms'] - 1) * 100:+.1f}%" if previous["p50_ms"] else "n/a"
+            row["p99_change"] = f"{(stats['p99_ms'] / previous['p99_ms'] - 1) * 100:+.1f}%" if previous["p99_ms"] else "n/a"
+        rows.append(row)
+    columns = ["endpoint", "count", "rps", "p50_ms", "p95_ms", "p99_ms", "errors"]
+    if baseline:
+        columns += ["p50_change", "p99_change"]
+        for row in rows:
+            row.setdefault("p50_change", "new")
+            row.setdefault("p99_change", "new")
+    print_table(rows, columns)
+    print(f"\n{results['requests']} requests in {results['elapsed_s']:.1f}s ({results['rps']:.0f} req/s)")
+    if baseline:
+        print(f"baseline: {baseline['commit']} at {baseline['started_at']}, {baseline['rps']:.0f} req/s")
+
+
+def run(url, args):
+    # The engine and the API key are read from the environment on first use, so
+    # set them before the app is imported
+    os.environ["POSTGRES_URI"] = url
+    os.environ.setdefault("API_KEY", "bench")
+    # Measure the app, not the admission control in front of it
+    os.environ.setdefault("API_RATE_LIMIT", "0")
+    os.environ.setdefault("MAX_IN_FLIGHT", "0")
+    os.environ["DB_POOL_SIZE"] = str(args.concurrency)
+    from src import database as db
+    from src.api.server import app
+
+    with db.get_engine().begin() as connection:
+        seed(connection, args.customers, args.ticks)
+    recorder, elapsed = asyncio.run(replay(app, args))
+    db.get_engine().dispose()
+    return report(recorder, elapsed, args)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--ticks", type=int, default=5)
+    parser.add_argument("--customers", type=int, default=100, help="customers visiting per tick")
+    parser.add_argument("--buy-rate", type=float, default=0.5, help="share of customers that check out a cart")
+    parser.add_argument("--concurrency", type=int, default=16, help="customers shopping at once")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--database-url", default=None, help="use this database instead of a temporary cluster")
+    parser.add_argument("--load-schema", action="store_true", help="load schema.sql into --database-url first")
+    parser.add_argument("--output", default=None, help="results file (default benchmarks/results/tick-<time>.json)")
+    parser.add_argument("--baseline", default=None, help="earlier results file to compare against")
+    args = parser.parse_args()
+
+    if args.database_url:
+        database = contextlib.nullcontext(args.database_url)
+    else:
+        database = local_postgres(max_connections=args.concurrency + 50)
+    with database as url:
+        if args.load_schema or not args.database_url:
+            load_schema(url)
+        results = run(url, args)
+
+    output = args.output or os.path.join(RESULTS_DIR, f"tick-{datetime.datetime.now():%Y%m%d-%H%M%S}.json")
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    print_results(results, baseline)
+    print(f"results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
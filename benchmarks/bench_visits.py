@@ -0,0 +1,58 @@
+"""
+Time to record one tick of customers: an INSERT per customer versus the single
+unnest() insert in record_visits, plus creating a cart for every customer.
+
+Runs inside a transaction that is rolled back, so any database with the schema
+and migrations loaded will do:
+
+    python -m benchmarks.bench_visits --customers 100 500 1000
+"""
+import argparse
+import sqlalchemy
+from src import database as db
+from src.api.carts import Customer, create_cart, record_visits
+from benchmarks.common import measure, print_table
+
+CLASSES = ("Wizard", "Fighter", "Rogue", "Cleric", "Druid")
+
+
+def make_customers(count):
+    return [
+        Customer(customer_name=f"Bench Customer {i}", character_class=CLASSES[i % len(CLASSES)], level=1 + i % 20)
+        for i in range(count)
+    ]
+
+
+def legacy_visits(connection, visit_id, customers):
+    for customer in customers:
+        connection.execute(sqlalchemy.text("""
+            INSERT INTO customer_visits (game_visit_id, customer_name, character_class, level)
+            VALUES (:visit_id, :customer_name, :character_class, :level)
+        """), {'visit_id': visit_id, **customer.dict()})
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--customers", type=int, nargs="+", default=[100, 500, 1000])
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    rows = []
+    with db.engine.connect() as connection:
+        transaction = connection.begin()
+        try:
+            for count in args.customers:
+                customers = make_customers(count)
+                legacy = measure(lambda: legacy_visits(connection, 1, customers), repeat=args.repeat, warmup=1)
+                batched = measure(lambda: record_visits(connection, 1, customers), repeat=args.repeat, warmup=1)
+                carts = measure(lambda: [create_cart(connection, customer) for customer in customers], repeat=args.repeat, warmup=1)
+                rows.append({"customers": count, "mode": "insert per customer", **legacy})
+                rows.append({"customers": count, "mode": "record_visits", **batched})
+                rows.append({"customers": count, "mode": "create_cart each", **carts})
+        finally:
+            transaction.rollback()
+    print_table(rows, ["customers", "mode", "p50_ms", "p99_ms"])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+import statistics
+import time
+
+
+def measure(fn, repeat=50, warmup=3):
+    """
+    Call fn repeatedly and return latency statistics in milliseconds.
+    """
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return summarize(samples)
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def summarize(samples):
+    return {
+        "count": len(samples),
+        "mean_ms": statistics.fmean(samples) if samples else 0.0,
+        "p50_ms": percentile(samples, 50) if samples else 0.0,
+        "p99_ms": percentile(samples, 99) if samples else 0.0,
+    }
+
+
+def print_table(rows, columns):
+    """
+    Print a list of dicts as an aligned text table.
+    """
+    widths = {column: max(len(column), *(len(format_cell(row[column])) for row in rows)) for column in columns}
+    print("  ".join(column.ljust(widths[column]) for column in columns))
+    for row in rows:
+        print("  ".join(format_cell(row[column]).ljust(widths[column]) for column in columns))
+
+
+def format_cell(value):
+    if isinstance(value, float):
+        return f"{value:.3f}"
+    return str(value)
@@ -0,0 +1,84 @@
+"""
+A throwaway local Postgres for benchmarks that need a real database but shouldn't
+touch a shared one. The cluster lives in a temp directory, runs with fsync off and
+is deleted on exit.
+"""
+import contextlib
+import glob
+import os
+import shutil
+import socket
+import subprocess
+import tempfile
+import sqlalchemy
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCHEMA_PATH = os.path.join(ROOT, "schema.sql")
+
+
+def find_pg_bin():
+    """
+    Directory holding initdb and pg_ctl: PG_BIN, then PATH, then the usual install paths.
+    """
+    candidates = [os.environ.get("PG_BIN")]
+    initdb = shutil.which("initdb")
+    if initdb:
+        candidates.append(os.path.dirname(initdb))
+    candidates += sorted(glob.glob("/usr/lib/postgresql/*/bin"), reverse=True)
+    candidates += ["/usr/local/pgsql/bin", "/opt/homebrew/bin", "/usr/local/bin"]
+    for directory in candidates:
+        if directory and os.path.exists(os.path.join(directory, "initdb")) and os.path.exists(os.path.join(directory, "pg_ctl")):
+            return directory
+    raise RuntimeError("initdb/pg_ctl not found: install PostgreSQL, set PG_BIN, or pass a database URL")
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@contextlib.contextmanager
+def local_postgres(max_connections=200):
+    """
+    Start a temporary cluster and yield its connection URL.
+    """
+    bindir = find_pg_bin()
+    workdir = tempfile.mkdtemp(prefix="centralcoast-pg-")
+    datadir = os.path.join(workdir, "data")
+    port = free_port()
+    try:
+        subprocess.run(
+            [os.path.join(bindir, "initdb"), "-D", datadir, "-U", "postgres", "-A", "trust", "--no-sync"],
+            check=True, stdout=subprocess.DEVNULL,
+        )
+        options = f"-p {port} -k {workdir} -c listen_addresses=127.0.0.1 -c fsync=off -c max_connections={max_connections}"
+        subprocess.run(
+            [os.path.join(bindir, "pg_ctl"), "-D", datadir, "-l", os.path.join(workdir, "postgres.log"), "-o", options, "-w", "start"],
+            check=True, stdout=subprocess.DEVNULL,
+        )
+        try:
+            yield f"postgresql://postgres@127.0.0.1:{port}/postgres"
+        finally:
+            subprocess.run(
+                [os.path.join(bindir, "pg_ctl"), "-D", datadir, "-m", "fast", "-w", "stop"],
+                stdout=subprocess.DEVNULL,
+            )
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def load_schema(url):
+    """
+    Run schema.sql, the fresh-install schema, against an empty database.
+    """
+    with open(SCHEMA_PATH) as f:
+        schema = f.read()
+    engine = sqlalchemy.create_engine(url)
+    try:
+        with engine.begin() as connection:
+            # The driver cursor runs the whole multi-statement script as-is
+            with connection.connection.driver_connection.cursor() as cursor:
+                cursor.execute(schema)
+    finally:
+        engine.dispose()
@@ -1,6 +1,5 @@
 import os
 import uvicorn
-from src.scheduler import start_scheduler  # Import the scheduler start function
 
 if __name__ == "__main__":
     # Determine if running in a development environment
@@ -17,7 +16,4 @@ if __name__ == "__main__":
         "src.api.server:app", port=3000, log_level="info", reload=is_dev, env_file=env_file
     )
     server = uvicorn.Server(config)
-
-    start_scheduler()  # Start the scheduler
-
     server.run()
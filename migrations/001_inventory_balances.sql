@@ -0,0 +1,30 @@
+-- Running balances for inventory_ledger, kept up to date by src/ledger.py.
+-- Safe to run against an existing database: balances are backfilled from the ledger.
+
+CREATE TABLE IF NOT EXISTS inventory_balances (
+    item_type VARCHAR(50) NOT NULL,
+    item_id VARCHAR(50) NOT NULL,
+    balance INT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (item_type, item_id)
+);
+
+CREATE TABLE IF NOT EXISTS ledger_checkpoints (
+    checkpoint_id SERIAL PRIMARY KEY,
+    last_ledger_id BIGINT NOT NULL,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS ledger_checkpoint_balances (
+    checkpoint_id INT NOT NULL REFERENCES ledger_checkpoints(checkpoint_id) ON DELETE CASCADE,
+    item_type VARCHAR(50) NOT NULL,
+    item_id VARCHAR(50) NOT NULL,
+    balance INT NOT NULL,
+    PRIMARY KEY (checkpoint_id, item_type, item_id)
+);
+
+INSERT INTO inventory_balances (item_type, item_id, balance, updated_at)
+SELECT item_type, item_id, SUM(change_amount), now()
+FROM inventory_ledger
+GROUP BY item_type, item_id
+ON CONFLICT (item_type, item_id) DO UPDATE SET balance = EXCLUDED.balance;
@@ -0,0 +1,22 @@
+-- Order history for /carts/search/: checkout now marks cart lines as sold instead
+-- of deleting them, and the search pages through them by keyset on these indexes.
+
+ALTER TABLE cart_items ADD COLUMN IF NOT EXISTS line_item_total INT;
+ALTER TABLE cart_items ADD COLUMN IF NOT EXISTS sold_at TIMESTAMPTZ;
+
+-- Substring customer name search (ILIKE '%name%') through a trigram index
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+CREATE INDEX IF NOT EXISTS idx_customer_visits_name_trgm
+    ON customer_visits USING GIN (customer_name gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_customer_visits_name
+    ON customer_visits (customer_name, visit_id);
+
+-- One index per sort column, with the line item id as the keyset tie-breaker
+CREATE INDEX IF NOT EXISTS idx_cart_items_sold_at
+    ON cart_items (sold_at, cart_items_id) WHERE sold_at IS NOT NULL;
+CREATE INDEX IF NOT EXISTS idx_cart_items_sku_sold
+    ON cart_items (item_sku, cart_items_id) WHERE sold_at IS NOT NULL;
+CREATE INDEX IF NOT EXISTS idx_cart_items_total_sold
+    ON cart_items (line_item_total, cart_items_id) WHERE sold_at IS NOT NULL;
+CREATE INDEX IF NOT EXISTS idx_cart_items_cart
+    ON cart_items (cart_id);
@@ -0,0 +1,6 @@
+-- Customer details sent by POST /carts/visits/{visit_id} and POST /carts/.
+-- game_visit_id is the visit id from the path, shared by every customer of a tick.
+
+ALTER TABLE customer_visits ADD COLUMN IF NOT EXISTS character_class VARCHAR(255);
+ALTER TABLE customer_visits ADD COLUMN IF NOT EXISTS level INT;
+ALTER TABLE customer_visits ADD COLUMN IF NOT EXISTS game_visit_id INT;
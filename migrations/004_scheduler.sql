@@ -0,0 +1,24 @@
+-- Game clock and scheduled job runs for src/scheduler.py. game_time may already
+-- exist without tick_id on databases created before it was added to schema.sql.
+
+CREATE TABLE IF NOT EXISTS game_time (
+    tick_id SERIAL PRIMARY KEY,
+    day VARCHAR(20) NOT NULL,
+    hour INT NOT NULL,
+    posted_at TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+ALTER TABLE game_time ADD COLUMN IF NOT EXISTS tick_id SERIAL;
+ALTER TABLE game_time ADD COLUMN IF NOT EXISTS posted_at TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP;
+
+CREATE TABLE IF NOT EXISTS scheduler_runs (
+    run_id SERIAL PRIMARY KEY,
+    job_name VARCHAR(50) NOT NULL,
+    tick_id INT NOT NULL,
+    day VARCHAR(20) NOT NULL,
+    hour INT NOT NULL,
+    status VARCHAR(20) NOT NULL,
+    started_at TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    duration_ms DOUBLE PRECISION,
+    error TEXT,
+    UNIQUE (job_name, tick_id)
+);
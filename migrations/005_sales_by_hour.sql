@@ -0,0 +1,15 @@
+-- Game day/hour of every sale and the hourly sales rollup kept by src/sales.py.
+-- Sales recorded before this migration have no game time and are not rolled up.
+
+ALTER TABLE cart_items ADD COLUMN IF NOT EXISTS game_day VARCHAR(20);
+ALTER TABLE cart_items ADD COLUMN IF NOT EXISTS game_hour INT;
+
+CREATE TABLE IF NOT EXISTS sales_by_hour (
+    item_sku VARCHAR(50) NOT NULL,
+    game_day VARCHAR(20) NOT NULL,
+    game_hour INT NOT NULL,
+    quantity INT NOT NULL DEFAULT 0,
+    gold INT NOT NULL DEFAULT 0,
+    orders INT NOT NULL DEFAULT 0,
+    PRIMARY KEY (item_sku, game_day, game_hour)
+);
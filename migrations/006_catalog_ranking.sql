@@ -0,0 +1,9 @@
+-- Catalog order decided once per tick by src/ranking.py and read by the catalog query.
+
+CREATE TABLE IF NOT EXISTS catalog_ranking (
+    sku VARCHAR(50) PRIMARY KEY,
+    rank INT NOT NULL,
+    score DOUBLE PRECISION,
+    tick_id INT,
+    ranked_at TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
@@ -0,0 +1,11 @@
+-- Idempotency keys for /barrels/deliver, /bottler/deliver and /inventory/deliver
+-- (see src/idempotency.py).
+
+CREATE TABLE IF NOT EXISTS processed_orders (
+    order_type VARCHAR(20) NOT NULL,
+    order_id INT NOT NULL,
+    request_hash CHAR(40) NOT NULL,
+    response JSONB NOT NULL,
+    processed_at TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (order_type, order_id)
+);
@@ -0,0 +1,42 @@
+-- Partition inventory_ledger by day (see src/ledger.py). Existing rows go into the
+-- default partition; the first run of the ledger job (or `python -m src.ledger compact`)
+-- moves them into daily partitions and compacts the days past LEDGER_RETENTION_DAYS.
+
+BEGIN;
+
+ALTER TABLE inventory_ledger RENAME TO inventory_ledger_unpartitioned;
+ALTER TABLE inventory_ledger_unpartitioned RENAME CONSTRAINT inventory_ledger_pkey TO inventory_ledger_unpartitioned_pkey;
+
+CREATE TABLE inventory_ledger (
+    id BIGINT NOT NULL DEFAULT nextval('inventory_ledger_id_seq'),
+    item_type VARCHAR(50) NOT NULL,
+    item_id VARCHAR(50) NOT NULL,
+    change_amount INT NOT NULL,
+    current_total INT,
+    description TEXT,
+    date TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (id, date)
+) PARTITION BY RANGE (date);
+
+ALTER SEQUENCE inventory_ledger_id_seq OWNED BY inventory_ledger.id;
+
+CREATE TABLE inventory_ledger_default PARTITION OF inventory_ledger DEFAULT;
+
+INSERT INTO inventory_ledger (id, item_type, item_id, change_amount, current_total, description, date)
+SELECT id, item_type, item_id, change_amount, current_total, description, date
+FROM inventory_ledger_unpartitioned;
+
+DROP TABLE inventory_ledger_unpartitioned;
+
+CREATE SCHEMA IF NOT EXISTS ledger_archive;
+
+CREATE TABLE IF NOT EXISTS ledger_compacted_balances (
+    item_type VARCHAR(50) NOT NULL,
+    item_id VARCHAR(50) NOT NULL,
+    balance INT NOT NULL,
+    compacted_through DATE NOT NULL,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (item_type, item_id)
+);
+
+COMMIT;
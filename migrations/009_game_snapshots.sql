@@ -0,0 +1,10 @@
+-- Named game-state dumps for /admin/snapshots (see src/game_state.py). Each column
+-- holds the COPY text of one table.
+
+CREATE TABLE IF NOT EXISTS game_snapshots (
+    name VARCHAR(100) PRIMARY KEY,
+    balances TEXT NOT NULL,
+    potion_mixes TEXT NOT NULL,
+    capacity_inventory TEXT NOT NULL,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
@@ -0,0 +1,12 @@
+-- The cart item upserts (ON CONFLICT (cart_id, item_sku)) need a unique key on the
+-- pair. Databases created from an older schema.sql may lack it; duplicate unsold
+-- lines are collapsed to the newest first.
+
+DELETE FROM cart_items ci
+USING cart_items newer
+WHERE newer.cart_id = ci.cart_id
+AND newer.item_sku = ci.item_sku
+AND newer.cart_items_id > ci.cart_items_id
+AND ci.sold_at IS NULL;
+
+CREATE UNIQUE INDEX IF NOT EXISTS cart_items_cart_id_item_sku_key ON cart_items (cart_id, item_sku);
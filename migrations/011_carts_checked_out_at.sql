@@ -0,0 +1,16 @@
+-- Checkout stamps the cart row itself, so cart line upserts can skip checked-out
+-- carts by locking that one row instead of looking for sold lines. Carts already
+-- checked out are stamped with their last sale.
+
+ALTER TABLE carts ADD COLUMN IF NOT EXISTS checked_out_at TIMESTAMPTZ;
+
+UPDATE carts c
+SET checked_out_at = sold.sold_at
+FROM (
+    SELECT cart_id, MAX(sold_at) AS sold_at
+    FROM cart_items
+    WHERE sold_at IS NOT NULL
+    GROUP BY cart_id
+) sold
+WHERE sold.cart_id = c.cart_id
+AND c.checked_out_at IS NULL;
@@ -18,6 +18,108 @@ CREATE TABLE capacity_inventory (
     gold_cost_per_unit INT NOT NULL CHECK (gold_cost_per_unit >= 0)
 );
 
+-- Create inventory ledger table, partitioned by day (see src/ledger.py). The ledger
+-- job creates the daily partitions; rows for a day without one land in the default.
+CREATE TABLE inventory_ledger (
+    id BIGSERIAL,
+    item_type VARCHAR(50) NOT NULL,
+    item_id VARCHAR(50) NOT NULL,
+    change_amount INT NOT NULL,
+    current_total INT,
+    description TEXT,
+    date TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (id, date)
+) PARTITION BY RANGE (date);
+
+CREATE TABLE inventory_ledger_default PARTITION OF inventory_ledger DEFAULT;
+
+-- Detached ledger partitions past the retention window
+CREATE SCHEMA ledger_archive;
+
+-- Create running balance table, maintained alongside every ledger insert
+CREATE TABLE inventory_balances (
+    item_type VARCHAR(50) NOT NULL,
+    item_id VARCHAR(50) NOT NULL,
+    balance INT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (item_type, item_id)
+);
+
+-- Create ledger checkpoint tables
+CREATE TABLE ledger_checkpoints (
+    checkpoint_id SERIAL PRIMARY KEY,
+    last_ledger_id BIGINT NOT NULL,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE ledger_checkpoint_balances (
+    checkpoint_id INT NOT NULL REFERENCES ledger_checkpoints(checkpoint_id) ON DELETE CASCADE,
+    item_type VARCHAR(50) NOT NULL,
+    item_id VARCHAR(50) NOT NULL,
+    balance INT NOT NULL,
+    PRIMARY KEY (checkpoint_id, item_type, item_id)
+);
+
+-- Totals of the ledger partitions compacted away, one row per item
+CREATE TABLE ledger_compacted_balances (
+    item_type VARCHAR(50) NOT NULL,
+    item_id VARCHAR(50) NOT NULL,
+    balance INT NOT NULL,
+    compacted_through DATE NOT NULL,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (item_type, item_id)
+);
+
+-- Deliveries already applied, so retried order ids return the stored response
+CREATE TABLE processed_orders (
+    order_type VARCHAR(20) NOT NULL,
+    order_id INT NOT NULL,
+    request_hash CHAR(40) NOT NULL,
+    response JSONB NOT NULL,
+    processed_at TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (order_type, order_id)
+);
+
+-- Named game-state dumps saved and restored by /admin/snapshots (see src/game_state.py)
+CREATE TABLE game_snapshots (
+    name VARCHAR(100) PRIMARY KEY,
+    balances TEXT NOT NULL,
+    potion_mixes TEXT NOT NULL,
+    capacity_inventory TEXT NOT NULL,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Catalog order decided once per tick by src/ranking.py
+CREATE TABLE catalog_ranking (
+    sku VARCHAR(50) PRIMARY KEY,
+    rank INT NOT NULL,
+    score DOUBLE PRECISION,
+    tick_id INT,
+    ranked_at TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Game clock as posted to /info/current_time, one row per tick
+CREATE TABLE game_time (
+    tick_id SERIAL PRIMARY KEY,
+    day VARCHAR(20) NOT NULL,
+    hour INT NOT NULL,
+    posted_at TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+-- One row per scheduled job run per tick (see src/scheduler.py)
+CREATE TABLE scheduler_runs (
+    run_id SERIAL PRIMARY KEY,
+    job_name VARCHAR(50) NOT NULL,
+    tick_id INT NOT NULL,
+    day VARCHAR(20) NOT NULL,
+    hour INT NOT NULL,
+    status VARCHAR(20) NOT NULL,
+    started_at TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    duration_ms DOUBLE PRECISION,
+    error TEXT,
+    UNIQUE (job_name, tick_id)
+);
+
 -- Create potion mixes table
 CREATE TABLE potion_mixes (
     potion_id SERIAL PRIMARY KEY,
@@ -32,6 +134,9 @@ CREATE TABLE potion_mixes (
 CREATE TABLE customer_visits (
     visit_id SERIAL PRIMARY KEY,
     customer_name VARCHAR(255) NOT NULL,
+    character_class VARCHAR(255),
+    level INT,
+    game_visit_id INT,
     visit_timestamp TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP
 );
 
@@ -39,7 +144,9 @@ CREATE TABLE customer_visits (
 CREATE TABLE carts (
     cart_id SERIAL PRIMARY KEY,
     visit_id INT NOT NULL REFERENCES customer_visits(visit_id),
-    created_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP
+    created_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP,
+    -- Set by checkout; cart lines are never written to a cart once it is set
+    checked_out_at TIMESTAMPTZ
 );
 
 -- Create cart items table
@@ -47,9 +154,34 @@ CREATE TABLE cart_items (
     cart_items_id SERIAL PRIMARY KEY,
     cart_id INT NOT NULL REFERENCES carts(cart_id),
     item_sku VARCHAR(50) NOT NULL REFERENCES potion_mixes(sku),
-    quantity INT NOT NULL CHECK (quantity >= 0)
+    quantity INT NOT NULL CHECK (quantity >= 0),
+    line_item_total INT,
+    sold_at TIMESTAMPTZ,
+    game_day VARCHAR(20),
+    game_hour INT,
+    UNIQUE (cart_id, item_sku)
 );
 
+-- Sales per SKU per game day and hour, upserted at checkout (see src/sales.py)
+CREATE TABLE sales_by_hour (
+    item_sku VARCHAR(50) NOT NULL,
+    game_day VARCHAR(20) NOT NULL,
+    game_hour INT NOT NULL,
+    quantity INT NOT NULL DEFAULT 0,
+    gold INT NOT NULL DEFAULT 0,
+    orders INT NOT NULL DEFAULT 0,
+    PRIMARY KEY (item_sku, game_day, game_hour)
+);
+
+-- Order search indexes (see migrations/002_order_search.sql)
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+CREATE INDEX idx_customer_visits_name_trgm ON customer_visits USING GIN (customer_name gin_trgm_ops);
+CREATE INDEX idx_customer_visits_name ON customer_visits (customer_name, visit_id);
+CREATE INDEX idx_cart_items_sold_at ON cart_items (sold_at, cart_items_id) WHERE sold_at IS NOT NULL;
+CREATE INDEX idx_cart_items_sku_sold ON cart_items (item_sku, cart_items_id) WHERE sold_at IS NOT NULL;
+CREATE INDEX idx_cart_items_total_sold ON cart_items (line_item_total, cart_items_id) WHERE sold_at IS NOT NULL;
+CREATE INDEX idx_cart_items_cart ON cart_items (cart_id);
+
 -- Add unique constraint for SKU
 ALTER TABLE potion_mixes
     ADD CONSTRAINT uq_sku UNIQUE (sku);
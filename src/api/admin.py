@@ -1,9 +1,13 @@
 from fastapi import APIRouter, HTTPException, Depends
+from fastapi.responses import PlainTextResponse
 import sqlalchemy
+from src import cart_store
 from src import database as db
-from src.api import auth
+from src import game_state
+from src import metrics
+from src.api import auth, catalog
+from src.potions import composition_index
 import logging
-import datetime
 
 router = APIRouter(
     prefix="/admin",
@@ -15,66 +19,16 @@ router = APIRouter(
 def reset():
     """
     Reset the game state. Gold goes to 100, all potion inventories are ledger-reset,
-    and all barrels and carts are reset. The potion mixes are reset to their initial state
-    as defined in the potion_mixes table.
+    and all barrels and carts are reset. The potion mixes are reset to their initial state.
     """
     try:
         with db.engine.begin() as connection:
-            # Clearing all ledger entries
-            logging.info("Clearing inventory ledger...")
-            connection.execute(sqlalchemy.text("DELETE FROM inventory_ledger"))
-
-            # Resetting global inventory via ledger
-            logging.info("Resetting global inventory via ledger...")
-            connection.execute(sqlalchemy.text("""
-                INSERT INTO inventory_ledger (item_type, item_id, change_amount, description, date)
-                VALUES 
-                    ('gold', 'N/A', 100, 'Reset gold to initial state', :date),
-                    ('potion', 'GP-001', 0, 'Initial green potion stock', :date),
-                    ('potion', 'RP-001', 0, 'Initial red potion stock', :date),
-                    ('potion', 'BP-001', 0, 'Initial blue potion stock', :date),
-                    ('ml', 'green', 5000, 'Initial green ml stock', :date),
-                    ('ml', 'red', 5000, 'Initial red ml stock', :date),
-                    ('ml', 'blue', 5000, 'Initial blue ml stock', :date)
-            """), {'date': datetime.datetime.now()})
-
-            # Updating global inventory directly
-            logging.info("Updating global inventory...")
-            connection.execute(sqlalchemy.text("""
-                UPDATE global_inventory
-                SET gold = 100,
-                    num_green_potions = 0,
-                    num_red_potions = 0,
-                    num_blue_potions = 0,
-                    num_green_ml = 5000,
-                    num_red_ml = 5000,
-                    num_blue_ml = 5000
-            """))
-
-            # Clearing and resetting potion mixes
-            logging.info("Clearing potion mixes...")
-            connection.execute(sqlalchemy.text("DELETE FROM potion_mixes"))
-
-            logging.info("Reinserting initial potion mixes...")
-            initial_potion_mixes = [
-                {"name": 'Green Potion', "potion_composition": '{"green": 100, "red": 0, "blue": 0, "dark": 0}', "sku": 'GP-001', "price": 25.00, "inventory_quantity": 0},
-                {"name": 'Red Potion', "potion_composition": '{"red": 100, "blue": 0, "dark": 0, "green": 0}', "sku": 'RP-001', "price": 25.00, "inventory_quantity": 0},
-                {"name": 'Blue Potion', "potion_composition": '{"blue": 100, "red": 0, "dark": 0, "green": 0}', "sku": 'BP-001', "price": 25.00, "inventory_quantity": 0},
-                {"name": 'Purple Potion', "potion_composition": '{"green": 50, "red": 0, "blue": 50, "dark": 0}', "sku": 'PP-001', "price": 25.00, "inventory_quantity": 0}
-            ]
-            for potion in initial_potion_mixes:
-                connection.execute(sqlalchemy.text("""
-                    INSERT INTO potion_mixes (name, potion_composition, sku, price, inventory_quantity)
-                    VALUES (:name, :potion_composition, :sku, :price, :inventory_quantity)
-                """), potion)
-
-            # Clearing any customer visit logs and carts
-            logging.info("Clearing customer visits and carts...")
-            connection.execute(sqlalchemy.text("DELETE FROM customer_visits"))
-            connection.execute(sqlalchemy.text("DELETE FROM carts"))
-            connection.execute(sqlalchemy.text("DELETE FROM cart_items"))
-
+            game_state.reset(connection)
             logging.info("Game state has been reset successfully.")
+        # Cart ids restart, so carts held in memory must not reach the new ones
+        cart_store.get_store().clear()
+        catalog.invalidate_catalog()
+        composition_index.invalidate()
         return {"status": "Game state reset successfully."}
     except sqlalchemy.exc.SQLAlchemyError as e:
         logging.error(f"Database error during reset: {e}")
@@ -82,3 +36,58 @@ def reset():
     except Exception as e:
         logging.error(f"Unexpected error during reset: {e}")
         raise HTTPException(status_code=500, detail=f"Unexpected error during reset: {e}")
+
+
+@router.get("/snapshots")
+def get_snapshots():
+    """
+    Saved game snapshots with when they were taken.
+    """
+    with db.engine.begin() as connection:
+        return game_state.list_snapshots(connection)
+
+
+@router.post("/snapshots/{name}")
+def save_snapshot(name: str):
+    """
+    Save the current balances, potion mixes and capacity as a named snapshot,
+    replacing an older one of the same name.
+    """
+    try:
+        with db.engine.connect() as connection:
+            connection = connection.execution_options(isolation_level="REPEATABLE READ")
+            with connection.begin():
+                game_state.save_snapshot(connection, name)
+        return {"status": f"Snapshot {name} saved."}
+    except sqlalchemy.exc.SQLAlchemyError as e:
+        logging.error(f"Database error saving snapshot {name}: {e}")
+        raise HTTPException(status_code=500, detail=f"Database error saving snapshot: {e}")
+
+
+@router.post("/snapshots/{name}/restore")
+def restore_snapshot(name: str):
+    """
+    Rewind the game to a saved snapshot. Carts, visits and ledger history are
+    cleared as by /admin/reset.
+    """
+    try:
+        with db.engine.begin() as connection:
+            game_state.restore_snapshot(connection, name)
+        cart_store.get_store().clear()
+        catalog.invalidate_catalog()
+        composition_index.invalidate()
+        return {"status": f"Snapshot {name} restored."}
+    except game_state.SnapshotNotFound as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except sqlalchemy.exc.SQLAlchemyError as e:
+        logging.error(f"Database error restoring snapshot {name}: {e}")
+        raise HTTPException(status_code=500, detail=f"Database error restoring snapshot: {e}")
+
+
+@router.get("/metrics")
+def get_metrics():
+    """
+    Per-route request latency, SQL statement counts, DB time and rows, in the
+    Prometheus text format.
+    """
+    return PlainTextResponse(metrics.registry.render(), media_type="text/plain; version=0.0.4")
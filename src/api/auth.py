@@ -1,22 +1,131 @@
 from fastapi import Security, HTTPException, status, Request
 from fastapi.security.api_key import APIKeyHeader
+import math
 import os
+import threading
+import time
 import dotenv
-import sqlalchemy
-from src import database as db
 
 dotenv.load_dotenv()
 
-api_keys = []  
+# Every authenticated request passes two O(1) checks before it reaches a handler:
+#
+#   admission  at most MAX_IN_FLIGHT authenticated requests run at once across all
+#              keys (0 = no cap); the rest get 503 with Retry-After straight away
+#              instead of queueing for a database connection.
+#   rate limit each key has a token bucket refilled at API_RATE_LIMIT requests per
+#              second up to API_RATE_BURST (0 = unlimited); an empty bucket is 429
+#              with Retry-After set to when the next token arrives.
+#
+# Keys come from API_KEY and from API_KEYS, a comma-separated list where an entry
+# may carry its own limits as key:rate:burst.
 
-api_keys.append(os.environ.get("API_KEY"))
+DEFAULT_RATE = float(os.environ.get("API_RATE_LIMIT", "100"))
+DEFAULT_BURST = float(os.environ.get("API_RATE_BURST", "200"))
+MAX_IN_FLIGHT = int(os.environ.get("MAX_IN_FLIGHT", "64"))
+# Seconds a shed client is asked to wait before retrying
+OVERLOAD_RETRY_AFTER = 1
+
+
+class TokenBucket:
+    """
+    Allows `rate` requests per second on average and bursts of up to `burst`.
+    """
+
+    def __init__(self, rate, burst, clock=time.monotonic):
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self.clock = clock
+        self.tokens = self.burst
+        self.updated = clock()
+        self._lock = threading.Lock()
+
+    def take(self):
+        """
+        Take a token. Returns 0 if one was available, otherwise the seconds until
+        one will be.
+        """
+        if self.rate <= 0:
+            return 0
+        with self._lock:
+            now = self.clock()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0
+            return (1 - self.tokens) / self.rate
+
+
+class AdmissionControl:
+    """
+    Counts requests in flight and refuses new ones past the limit.
+    """
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.in_flight = 0
+        self._lock = threading.Lock()
+
+    def enter(self):
+        with self._lock:
+            if self.limit > 0 and self.in_flight >= self.limit:
+                return False
+            self.in_flight += 1
+            return True
+
+    def leave(self):
+        with self._lock:
+            self.in_flight -= 1
+
+
+def load_api_keys(api_key=None, api_keys=None, rate=DEFAULT_RATE, burst=DEFAULT_BURST):
+    """
+    Map every configured key to its token bucket.
+    """
+    buckets = {}
+    entries = [api_key] if api_key else []
+    entries += [entry.strip() for entry in (api_keys or "").split(",") if entry.strip()]
+    for entry in entries:
+        key, *limits = entry.split(":")
+        key_rate = float(limits[0]) if len(limits) > 0 else rate
+        key_burst = float(limits[1]) if len(limits) > 1 else max(burst, key_rate)
+        buckets[key] = TokenBucket(key_rate, key_burst)
+    return buckets
+
+
+api_keys = load_api_keys(os.environ.get("API_KEY"), os.environ.get("API_KEYS"))
+admission = AdmissionControl(MAX_IN_FLIGHT)
 api_key_header = APIKeyHeader(name="access_token", auto_error=False)
 
 
+def _retry_after(seconds):
+    return {"Retry-After": str(max(1, math.ceil(seconds)))}
+
+
 async def get_api_key(request: Request, api_key_header: str = Security(api_key_header)):
-    if api_key_header in api_keys:
-        return api_key_header
-    else:
+    bucket = api_keys.get(api_key_header) if api_key_header else None
+    if bucket is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED, detail="Forbidden"
         )
+
+    wait = bucket.take()
+    if wait:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Rate limit exceeded.",
+            headers=_retry_after(wait),
+        )
+
+    if not admission.enter():
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Server is overloaded; retry shortly.",
+            headers=_retry_after(OVERLOAD_RETRY_AFTER),
+        )
+    try:
+        # Held until the response has been sent
+        yield api_key_header
+    finally:
+        admission.leave()
@@ -2,8 +2,12 @@ from fastapi import APIRouter, Depends, HTTPException
 from pydantic import BaseModel
 from src.api import auth
 import sqlalchemy
+from sqlalchemy.exc import SQLAlchemyError
 from src import database as db
-import datetime
+from src import idempotency
+from src import ledger
+from src.planner import color_demand, plan_barrels
+from src.potions import COLORS, composition_to_potion_type
 import logging
 
 router = APIRouter(
@@ -15,32 +19,43 @@ router = APIRouter(
 class Barrel(BaseModel):
     sku: str
     ml_per_barrel: int
+    potion_type: list[int]  # [r, g, b, d], 1 for the color the barrel holds
     price: int
     quantity: int
 
+    @property
+    def color(self):
+        return COLORS[max(range(len(COLORS)), key=lambda i: self.potion_type[i])]
+
+def deliver_barrels(connection, barrels_delivered):
+    """
+    Pay for the barrels and add their ml in one ledger write.
+    Raises ledger.InsufficientGold without writing anything if they can't be afforded.
+    """
+    total_cost = sum(barrel.price * barrel.quantity for barrel in barrels_delivered)
+
+    with ledger.LedgerWriter(connection) as writer:
+        ledger.spend_gold(connection, total_cost, 'barrel purchase', writer)
+        for barrel in barrels_delivered:
+            writer.add('ml', barrel.color, barrel.ml_per_barrel * barrel.quantity, 'barrel delivery')
+
+
 @router.post("/deliver/{order_id}")
 def post_deliver_barrels(barrels_delivered: list[Barrel], order_id: int):
+    response = {"status": f"Barrels delivered and inventory updated for order_id {order_id}"}
     try:
         with db.engine.begin() as connection:
-            total_cost = sum(barrel.price * barrel.quantity for barrel in barrels_delivered)
-            current_gold_query = sqlalchemy.text("SELECT SUM(change_amount) FROM inventory_ledger WHERE item_type = 'gold'")
-            current_gold = connection.execute(current_gold_query).scalar() or 0
-
-            if current_gold < total_cost:
-                raise HTTPException(status_code=400, detail="Not enough gold to complete the transaction.")
-
-            for barrel in barrels_delivered:
-                connection.execute(sqlalchemy.text("""
-                    INSERT INTO inventory_ledger (item_type, item_id, change_amount, description, date)
-                    VALUES ('ml', :sku, :change_amount, 'barrel delivery', :date)
-                """), {'sku': barrel.sku, 'change_amount': barrel.ml_per_barrel * barrel.quantity, 'date': datetime.datetime.now()})
-
-                connection.execute(sqlalchemy.text("""
-                    INSERT INTO inventory_ledger (item_type, item_id, change_amount, description, date)
-                    VALUES ('gold', 'N/A', -:cost, 'barrel purchase', :date)
-                """), {'cost': barrel.price * barrel.quantity, 'date': datetime.datetime.now()})
+            payload = [barrel.dict() for barrel in barrels_delivered]
+            previous = idempotency.claim_order(connection, 'barrels', order_id, payload, response)
+            if previous is not None:
+                return previous
+            deliver_barrels(connection, barrels_delivered)
 
-        return {"status": f"Barrels delivered and inventory updated for order_id {order_id}"}
+        return response
+    except ledger.InsufficientGold as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except idempotency.OrderConflict as e:
+        raise HTTPException(status_code=409, detail=str(e))
     except SQLAlchemyError as e:
         logging.error(f"Database error during barrel purchase: {str(e)}")
         raise HTTPException(status_code=500, detail="Database error during barrel purchase.")
@@ -49,32 +64,50 @@ def post_deliver_barrels(barrels_delivered: list[Barrel], order_id: int):
         raise HTTPException(status_code=500, detail="Unexpected error during barrel purchase.")
 
 
+# The last wholesale catalog the game server offered to /barrels/plan in this process,
+# which the scheduler's barrels job plans from
+last_wholesale_catalog = []
+
+
+def plan_purchase(connection, wholesale_catalog, gold=None):
+    """
+    How many of each offered barrel to buy, as [(barrel, count)] with count > 0,
+    from the ml on hand, ml capacity, potion mixes and gold (the gold balance
+    unless given).
+    """
+    balances = ledger.get_balances(connection)
+    ml_capacity = connection.execute(sqlalchemy.text(
+        "SELECT ml_capacity FROM capacity_inventory WHERE id = 1"
+    )).scalar() or 0
+    compositions = [
+        composition_to_potion_type(row.potion_composition)
+        for row in connection.execute(sqlalchemy.text("SELECT potion_composition FROM potion_mixes"))
+    ]
+
+    if gold is None:
+        gold = balances.get('gold', {}).get('N/A', 0)
+    ml_available = [balances.get('ml', {}).get(color, 0) for color in COLORS]
+    demand = color_demand(compositions, ml_available, ml_capacity)
+
+    counts = plan_barrels(
+        [barrel.ml_per_barrel for barrel in wholesale_catalog],
+        [barrel.price for barrel in wholesale_catalog],
+        [barrel.quantity for barrel in wholesale_catalog],
+        [COLORS.index(barrel.color) for barrel in wholesale_catalog],
+        gold,
+        ml_capacity - sum(ml_available),
+        demand,
+    )
+    return [(barrel, int(count)) for barrel, count in zip(wholesale_catalog, counts) if count > 0]
+
+
 @router.post("/plan")
-def get_wholesale_purchase_plan():
+def get_wholesale_purchase_plan(wholesale_catalog: list[Barrel]):
+    global last_wholesale_catalog
     try:
+        last_wholesale_catalog = list(wholesale_catalog)
         with db.engine.begin() as connection:
-            required_inventory = 10000
-            inventory_query = sqlalchemy.text("""
-                SELECT item_id, SUM(change_amount) AS total_stock
-                FROM inventory_ledger
-                WHERE item_type = 'ml'
-                GROUP BY item_id
-            """)
-            inventory_result = connection.execute(inventory_query).fetchall()
-            purchase_plan = []
-
-            for inventory in inventory_result:
-                if inventory['total_stock'] < required_inventory:
-                    ml_needed = required_inventory - inventory['total_stock']
-                    barrels_needed = ml_needed // 1000
-                    barrel_info = connection.execute(sqlalchemy.text("SELECT price FROM barrel_prices WHERE sku = :sku"), {'sku': inventory['item_id']}).scalar()
-
-                    if barrel_info is not None:
-                        cost_estimate = barrels_needed * barrel_info
-                        purchase_plan.append({"sku": inventory['item_id'], "barrels_needed": barrels_needed, "total_cost": cost_estimate})
-                    else:
-                        continue
-
-            return purchase_plan
+            plan = plan_purchase(connection, wholesale_catalog)
+        return [{"sku": barrel.sku, "quantity": count} for barrel, count in plan]
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
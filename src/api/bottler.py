@@ -1,9 +1,13 @@
 import sqlalchemy
+from collections import Counter
 from src import database as db
+from src import idempotency
+from src import ledger
+from src.planner import plan_bottles
+from src.potions import COLORS, composition_index, composition_to_potion_type
 from fastapi import APIRouter, Depends, HTTPException
 from pydantic import BaseModel
-from src.api import auth
-import datetime
+from src.api import auth, catalog
 
 router = APIRouter(
     prefix="/bottler",
@@ -12,30 +16,85 @@ router = APIRouter(
 )
 
 class PotionInventory(BaseModel):
-    potion_composition: dict = {}
+    potion_type: list[int]
+    quantity: int
+
+def bottle_potions(connection, quantities):
+    """
+    Record bottled potions and the ml they used in one ledger write.
+    quantities maps (r, g, b, d) tuples to the number of potions bottled.
+    Raises HTTPException 409 without writing anything if the ml on hand can't cover them.
+    """
+    skus, missing = composition_index.resolve(connection, list(quantities))
+    if missing:
+        raise HTTPException(status_code=404, detail=f"Potion mixes with potion_type {missing} not found.")
+
+    ml_used = [0] * len(COLORS)
+    for potion_type, quantity in quantities.items():
+        for i, amount in enumerate(potion_type):
+            ml_used[i] += amount * quantity
+    ml_used = {color: amount for color, amount in zip(COLORS, ml_used) if amount}
+
+    # Same lock order as every other writer: gold, then ml, then potions
+    ledger.lock_gold(connection)
+    ml_on_hand = ledger.lock_balances(connection, 'ml', list(ml_used))
+    short = {color: (ml_on_hand[color], amount) for color, amount in ml_used.items() if amount > ml_on_hand[color]}
+    if short:
+        detail = ", ".join(f"{color} (have {have}, need {need})" for color, (have, need) in short.items())
+        raise HTTPException(status_code=409, detail=f"Not enough ml to bottle: {detail}.")
+
+    with ledger.LedgerWriter(connection) as writer:
+        for potion_type, quantity in quantities.items():
+            writer.add('potion', skus[potion_type], quantity, 'bottling')
+        for color, amount in ml_used.items():
+            writer.add('ml', color, -amount, 'bottling')
+
+
+def plan_bottling(connection):
+    """
+    How many potions of each mix to bottle from the ml on hand, as
+    [{"potion_type", "quantity"}], loading every input once.
+    """
+    mixes = connection.execute(sqlalchemy.text("SELECT potion_composition, price FROM potion_mixes")).fetchall()
+    balances = ledger.get_balances(connection)
+    potion_capacity = connection.execute(sqlalchemy.text(
+        "SELECT potion_capacity FROM capacity_inventory WHERE id = 1"
+    )).scalar() or 0
+
+    ml_available = [balances.get('ml', {}).get(color, 0) for color in COLORS]
+    potions_in_stock = sum(max(0, quantity) for quantity in balances.get('potion', {}).values())
+    potion_types = [composition_to_potion_type(mix.potion_composition) for mix in mixes]
+
+    counts = plan_bottles(potion_types, [mix.price for mix in mixes], ml_available, potion_capacity - potions_in_stock)
+    return [
+        {"potion_type": potion_type, "quantity": int(count)}
+        for potion_type, count in zip(potion_types, counts)
+        if count > 0
+    ]
+
 
 @router.post("/deliver/{order_id}")
 def post_deliver_bottles(potions_delivered: list[PotionInventory], order_id: int):
     try:
+        # Aggregate the delivery by potion type before touching the database
+        quantities = Counter()
+        for potion in potions_delivered:
+            quantities[tuple(potion.potion_type)] += potion.quantity
+
+        response = {"status": f"Potions delivered and inventory updated for order_id {order_id}."}
         with db.engine.begin() as connection:
-            for potion in potions_delivered:
-                # Checking the composition directly against the database to find the matching SKU
-                potion_query = sqlalchemy.text("""
-                    SELECT sku FROM potion_mixes WHERE potion_composition = :composition
-                """)
-                potion_result = connection.execute(potion_query, {'composition': potion.potion_composition}).first()
-                
-                if potion_result:
-                    sku = potion_result['sku']
-                    # Insert a ledger entry to increase the inventory
-                    connection.execute(sqlalchemy.text("""
-                        INSERT INTO inventory_ledger (item_type, item_id, change_amount, description, date)
-                        VALUES ('potion', :sku, :quantity, 'bottling', :date)
-                    """), {'sku': sku, 'quantity': 1, 'date': datetime.datetime.now()})  # Assuming quantity 1 for simplification
-                else:
-                    raise HTTPException(status_code=404, detail=f"Potion mix with composition {potion.potion_composition} not found.")
+            payload = [potion.dict() for potion in potions_delivered]
+            previous = idempotency.claim_order(connection, 'bottles', order_id, payload, response)
+            if previous is not None:
+                return previous
+            bottle_potions(connection, quantities)
 
-        return {"status": f"Potions delivered and inventory updated for order_id {order_id}."}
+        catalog.invalidate_catalog()
+        return response
+    except HTTPException:
+        raise
+    except idempotency.OrderConflict as e:
+        raise HTTPException(status_code=409, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -43,27 +102,6 @@ def post_deliver_bottles(potions_delivered: list[PotionInventory], order_id: int
 def get_bottle_plan():
     try:
         with db.engine.begin() as connection:
-            # Fetch all potion mixes from the database
-            potion_mixes_query = sqlalchemy.text("SELECT * FROM potion_mixes")
-            potion_mixes_result = connection.execute(potion_mixes_query).fetchall()
-
-            bottling_plan = []
-            for mix in potion_mixes_result:
-                # Assuming each bottle requires a certain amount of ml which should be checked against the ledger
-                required_ml = 100  # Simplified assumption
-                current_inventory_query = sqlalchemy.text("""
-                    SELECT SUM(change_amount) AS total_ml
-                    FROM inventory_ledger
-                    WHERE item_id = :sku AND item_type = 'ml'
-                """)
-                current_inventory = connection.execute(current_inventory_query, {'sku': mix['sku']}).scalar()
-                
-                if current_inventory >= required_ml:
-                    # Calculate the quantity of each potion type based on the inventory and maximum capacity
-                    max_potions = current_inventory // required_ml
-                    if max_potions > 0:
-                        bottling_plan.append({"potion_type": mix['potion_composition'], "quantity": max_potions})
-
-            return bottling_plan
+            return plan_bottling(connection)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -1,9 +1,18 @@
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
+from enum import Enum
+import datetime
+import functools
+import json
 import sqlalchemy
+from src import cart_store
 from src import database as db
+from src import ledger
+from src import pagination
+from src import sales
+from src.game_time import game_clock
 from pydantic import BaseModel
-from src.api import auth
-import datetime
+from src.api import auth, catalog
 import logging
 
 router = APIRouter(
@@ -19,106 +28,393 @@ class CartItem(BaseModel):
 class CartCheckout(BaseModel):
     payment: str
 
+class Customer(BaseModel):
+    customer_name: str
+    character_class: str
+    level: int
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 
-# Search for cart items
-@router.get("/search/", tags=["search"])
-def search_orders(customer_name: str = None, item_sku: str = None, cart_id: int = None):
+RECORD_VISITS_QUERY = sqlalchemy.text("""
+    INSERT INTO customer_visits (game_visit_id, customer_name, character_class, level)
+    SELECT :visit_id, customer_name, character_class, level
+    FROM unnest(
+        CAST(:customer_names AS TEXT[]),
+        CAST(:character_classes AS TEXT[]),
+        CAST(:levels AS INTEGER[])
+    ) AS v(customer_name, character_class, level)
+""")
+
+
+def record_visits(connection, visit_id, customers):
+    """
+    Write every customer of a tick with one multi-row insert.
+    """
+    if not customers:
+        return 0
+    connection.execute(RECORD_VISITS_QUERY, {
+        'visit_id': visit_id,
+        'customer_names': [customer.customer_name for customer in customers],
+        'character_classes': [customer.character_class for customer in customers],
+        'levels': [customer.level for customer in customers],
+    })
+    return len(customers)
+
+
+# Shares the customers that visited the store on a tick
+@router.post("/visits/{visit_id}")
+async def post_visits(visit_id: int, customers: list[Customer]):
     try:
-        with db.engine.begin() as connection:
-            query = sqlalchemy.text("""
-                SELECT ci.cart_items_id, ci.item_sku, cv.customer_name, ci.quantity, cv.visit_timestamp
-                FROM cart_items ci
-                JOIN carts c ON ci.cart_id = c.cart_id
-                JOIN customer_visits cv ON c.visit_id = cv.visit_id
-                JOIN potion_mixes pm ON ci.item_sku = pm.sku
-                WHERE (:customer_name IS NULL OR cv.customer_name ILIKE :customer_name) 
-                AND (:item_sku IS NULL OR ci.item_sku = :item_sku)
-                AND (:cart_id IS NULL OR ci.cart_id = :cart_id)
-            """)
-            params = {
-                'customer_name': f"%{customer_name}%" if customer_name else None,
-                'item_sku': item_sku,
-                'cart_id': cart_id
-            }
-            results = connection.execute(query, params).fetchall()
-
-            formatted_results = [{
-                "line_item_id": result[0],
-                "item_sku": result[1],
-                "customer_name": result[2],
-                "quantity": result[3],
-                "timestamp": result[4].isoformat(),
-            } for result in results]
-
-            return formatted_results
+        count = await db.run_in_transaction(record_visits, visit_id, customers)
+        logging.info(f"Recorded {count} customers for visit {visit_id}")
+        return {"success": True}
 
     except Exception as e:
-        logging.error(f"Error searching orders: {str(e)}")
+        logging.error(f"Error recording visits: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.post("/{cart_id}/items/")
-def set_item_quantity(cart_id: int, cart_item: CartItem):
+
+# Reuses the customer's latest visit row, or records one if they never came through
+# /visits, and creates the cart in the same statement.
+CREATE_CART_QUERY = sqlalchemy.text("""
+    WITH existing AS (
+        SELECT visit_id FROM customer_visits
+        WHERE customer_name = :customer_name
+        AND character_class = :character_class
+        AND level = :level
+        ORDER BY visit_id DESC
+        LIMIT 1
+    ),
+    created AS (
+        INSERT INTO customer_visits (customer_name, character_class, level)
+        SELECT :customer_name, :character_class, :level
+        WHERE NOT EXISTS (SELECT 1 FROM existing)
+        RETURNING visit_id
+    )
+    INSERT INTO carts (visit_id)
+    SELECT visit_id FROM existing
+    UNION ALL
+    SELECT visit_id FROM created
+    RETURNING cart_id
+""")
+
+
+def create_cart(connection, customer):
+    return connection.execute(CREATE_CART_QUERY, {
+        'customer_name': customer.customer_name,
+        'character_class': customer.character_class,
+        'level': customer.level,
+    }).scalar_one()
+
+
+# Creates a new cart for a customer
+@router.post("/")
+async def new_cart(new_cart: Customer):
     try:
-        with db.engine.begin() as connection:
-            update_query = sqlalchemy.text("""
-                INSERT INTO cart_items (cart_id, item_sku, quantity)
-                VALUES (:cart_id, :item_sku, :quantity)
-                ON CONFLICT (cart_id, item_sku) DO UPDATE SET quantity = EXCLUDED.quantity
-            """)
-            connection.execute(update_query, {'cart_id': cart_id, 'item_sku': cart_item.item_sku, 'quantity': cart_item.quantity})
-            logging.info(f"Cart {cart_id} updated with item {cart_item.item_sku} quantity {cart_item.quantity}")
-            return {"status": "Cart updated successfully."}
+        cart_id = await db.run_in_transaction(create_cart, new_cart)
+        logging.info(f"Created cart {cart_id} for {new_cart.customer_name}")
+        return {"cart_id": cart_id}
 
     except Exception as e:
-        logging.error(f"Error updating cart: {str(e)}")
+        logging.error(f"Error creating cart: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.post("/{cart_id}/checkout")
-def checkout(cart_id: int, cart_checkout: CartCheckout):
+
+class search_sort_options(str, Enum):
+    customer_name = "customer_name"
+    item_sku = "item_sku"
+    line_item_total = "line_item_total"
+    timestamp = "timestamp"
+
+class search_sort_order(str, Enum):
+    asc = "asc"
+    desc = "desc"
+
+SEARCH_PAGE_SIZE = 5
+
+# Sort column -> (SQL expression, type used to cast the cursor value back)
+SEARCH_SORT_COLUMNS = {
+    search_sort_options.customer_name: ("cv.customer_name", "TEXT"),
+    search_sort_options.item_sku: ("ci.item_sku", "TEXT"),
+    search_sort_options.line_item_total: ("ci.line_item_total", "INTEGER"),
+    search_sort_options.timestamp: ("ci.sold_at", "TIMESTAMPTZ"),
+}
+
+
+def parse_cursor_value(value, cursor_type):
+    """
+    Check a cursor's sort value against the column type before it reaches the query.
+    Raises ValueError.
+    """
+    if cursor_type == "INTEGER" and isinstance(value, int) and not isinstance(value, bool):
+        return value
+    if cursor_type == "TEXT" and isinstance(value, str):
+        return value
+    if cursor_type == "TIMESTAMPTZ" and isinstance(value, str):
+        return datetime.datetime.fromisoformat(value)
+    raise ValueError(f"Invalid page token value: {value!r}")
+
+
+@functools.lru_cache(maxsize=None)
+def search_orders_query(sort_col, descending, has_cursor):
+    """
+    Keyset query for one page of sold line items. Paging compares (sort column,
+    line item id) against the cursor row, so every page is an index range scan
+    instead of an OFFSET over everything before it.
+    """
+    column, cursor_type = SEARCH_SORT_COLUMNS[sort_col]
+    direction = "DESC" if descending else "ASC"
+    cursor_filter = ""
+    if has_cursor:
+        comparison = "<" if descending else ">"
+        cursor_filter = f"AND ({column}, ci.cart_items_id) {comparison} (CAST(:cursor_value AS {cursor_type}), :cursor_id)"
+    return sqlalchemy.text(f"""
+        SELECT ci.cart_items_id, ci.item_sku, cv.customer_name, ci.line_item_total, ci.sold_at,
+               {column} AS sort_value
+        FROM cart_items ci
+        JOIN carts c ON ci.cart_id = c.cart_id
+        JOIN customer_visits cv ON c.visit_id = cv.visit_id
+        WHERE ci.sold_at IS NOT NULL
+        AND (CAST(:customer_name AS TEXT) IS NULL OR cv.customer_name ILIKE :customer_name)
+        AND (CAST(:item_sku AS TEXT) IS NULL OR ci.item_sku = :item_sku)
+        AND (CAST(:cart_id AS INTEGER) IS NULL OR ci.cart_id = :cart_id)
+        {cursor_filter}
+        ORDER BY {column} {direction}, ci.cart_items_id {direction}
+        LIMIT :limit
+    """)
+
+
+def find_orders(connection, customer_name, item_sku, cart_id, search_page, sort_col, sort_order):
+    """
+    One page of order line items plus the tokens for the pages either side of it.
+    """
+    cursor = pagination.decode_cursor(search_page, sort_col.value, sort_order.value) if search_page else None
+    cursor_value = parse_cursor_value(cursor[0], SEARCH_SORT_COLUMNS[sort_col][1]) if cursor else None
+    backwards = cursor is not None and cursor[2] == pagination.PREVIOUS
+    descending = (sort_order == search_sort_order.desc) != backwards
+
+    query = search_orders_query(sort_col, descending, cursor is not None)
+    rows = connection.execute(query, {
+        'customer_name': f"%{pagination.escape_like(customer_name)}%" if customer_name else None,
+        'item_sku': item_sku,
+        'cart_id': cart_id,
+        'cursor_value': cursor_value,
+        'cursor_id': cursor[1] if cursor else None,
+        'limit': SEARCH_PAGE_SIZE + 1,
+    }).fetchall()
+
+    more = len(rows) > SEARCH_PAGE_SIZE
+    rows = rows[:SEARCH_PAGE_SIZE]
+    if backwards:
+        rows.reverse()
+
+    has_previous = more if backwards else cursor is not None
+    has_next = cursor is not None if backwards else more
+    sort = (sort_col.value, sort_order.value)
+    return {
+        "previous": pagination.encode_cursor(*sort, rows[0].sort_value, rows[0].cart_items_id, pagination.PREVIOUS) if rows and has_previous else "",
+        "next": pagination.encode_cursor(*sort, rows[-1].sort_value, rows[-1].cart_items_id, pagination.NEXT) if rows and has_next else "",
+        "results": rows,
+    }
+
+
+def encode_search_page(page):
+    """
+    Stream the page as JSON one line item at a time.
+    """
+    yield b'{"previous":' + json.dumps(page["previous"]).encode() + b',"next":' + json.dumps(page["next"]).encode() + b',"results":['
+    for i, row in enumerate(page["results"]):
+        line_item = json.dumps({
+            "line_item_id": row.cart_items_id,
+            "item_sku": row.item_sku,
+            "customer_name": row.customer_name,
+            "line_item_total": row.line_item_total,
+            "timestamp": row.sold_at.isoformat(),
+        })
+        yield (b"," if i else b"") + line_item.encode()
+    yield b"]}"
+
+
+# Search for sold line items
+@router.get("/search/", tags=["search"])
+async def search_orders(
+    customer_name: str = "",
+    potion_sku: str = "",
+    cart_id: int = None,
+    search_page: str = "",
+    sort_col: search_sort_options = search_sort_options.timestamp,
+    sort_order: search_sort_order = search_sort_order.desc,
+):
     try:
-        with db.engine.begin() as connection:
-            items_query = sqlalchemy.text("""
-                SELECT item_sku, quantity FROM cart_items WHERE cart_id = :cart_id
-            """)
-            items = connection.execute(items_query, {'cart_id': cart_id}).fetchall()
+        page = await db.run_in_transaction(
+            find_orders, customer_name or None, potion_sku or None, cart_id, search_page, sort_col, sort_order
+        )
+        return StreamingResponse(encode_search_page(page), media_type="application/json")
 
-            if not items:
-                logging.info(f"No items in cart {cart_id} for checkout.")
-                raise HTTPException(status_code=404, detail="No items in cart.")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logging.error(f"Error searching orders: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
 
-            total_cost = 0
-            for item in items:
-                price_query = sqlalchemy.text("SELECT price FROM potion_mixes WHERE sku = :sku")
-                price = connection.execute(price_query, {'sku': item['item_sku']}).scalar()
-                total_cost += price * item['quantity']
-                logging.info(f"Item {item['item_sku']} quantity {item['quantity']} price {price}")
 
-                # Add ledger entry for each item sold
-                connection.execute(sqlalchemy.text("""
-                    INSERT INTO inventory_ledger (item_type, item_id, change_amount, description, date)
-                    VALUES ('potion', :item_id, -:quantity, 'sale', :date)
-                """), {'item_id': item['item_sku'], 'quantity': item['quantity'], 'date': datetime.datetime.now()})
+def upsert_cart_item(connection, cart_id, cart_item):
+    cart_store.upsert_items(connection, [(cart_id, cart_item.item_sku, cart_item.quantity)])
 
-            logging.info(f"Total cost for cart {cart_id}: {total_cost}")
 
-            # Update ledger for gold increase
-            connection.execute(sqlalchemy.text("""
-                INSERT INTO inventory_ledger (item_type, item_id, change_amount, description, date)
-                VALUES ('gold', 'N/A', :amount, 'sale income', :date)
-            """), {'amount': total_cost, 'date': datetime.datetime.now()})
+@router.post("/{cart_id}/items/")
+async def set_item_quantity(cart_id: int, cart_item: CartItem):
+    try:
+        await cart_store.get_store().set_item(cart_id, cart_item.item_sku, cart_item.quantity)
+        logging.info(f"Cart {cart_id} updated with item {cart_item.item_sku} quantity {cart_item.quantity}")
+        return {"status": "Cart updated successfully."}
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logging.error(f"Error updating cart: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+UNKNOWN_SKUS_QUERY = sqlalchemy.text("""
+    SELECT s.sku
+    FROM unnest(CAST(:skus AS TEXT[])) AS s(sku)
+    WHERE NOT EXISTS (SELECT 1 FROM potion_mixes pm WHERE pm.sku = s.sku)
+""")
+
+
+def set_cart_items(connection, cart_id, cart_items):
+    """
+    Set the quantity of several SKUs at once: one query checks every SKU exists,
+    one upsert writes them all. A SKU listed twice keeps its last quantity.
+    Raises 400 naming the unknown SKUs, 404 for a missing cart and 409 for one
+    already checked out, without writing anything.
+    """
+    items = {cart_item.item_sku: cart_item.quantity for cart_item in cart_items}
+    if not items:
+        return 0
+    unknown = connection.execute(UNKNOWN_SKUS_QUERY, {'skus': list(items)}).scalars().all()
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown SKUs: {', '.join(sorted(unknown))}.")
+    return cart_store.get_store().set_items(connection, cart_id, items)
+
+
+@router.post("/{cart_id}/items/batch")
+async def set_item_quantities(cart_id: int, cart_items: list[CartItem]):
+    try:
+        count = await db.run_in_transaction(set_cart_items, cart_id, cart_items)
+        logging.info(f"Cart {cart_id} updated with {count} items")
+        return {"status": "Cart updated successfully.", "items_updated": count}
 
-            logging.info(f"Gold updated with total cost: {total_cost}")
+    except HTTPException:
+        raise
+    except Exception as e:
+        logging.error(f"Error updating cart: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+# Prices and marks the cart's lines as sold, tagged with the game day and hour, in
+# one statement. Sold lines stay in cart_items as the order history. The potion balance rows are locked so concurrent
+# checkouts of the same SKU can't both pass the stock check. Each line's total is
+# rounded once here, and the gold credit and sales rollup add up those same totals.
+CHECKOUT_ITEMS_QUERY = sqlalchemy.text("""
+    WITH sold AS (
+        UPDATE cart_items ci
+        SET line_item_total = CAST(ROUND(ci.quantity * pm.price) AS INTEGER),
+            sold_at = now(),
+            game_day = CAST(:game_day AS TEXT),
+            game_hour = CAST(:game_hour AS INTEGER)
+        FROM potion_mixes pm
+        WHERE ci.cart_id = :cart_id
+        AND ci.sold_at IS NULL
+        AND ci.quantity > 0
+        AND pm.sku = ci.item_sku
+        RETURNING ci.item_sku, ci.quantity, ci.line_item_total
+    ),
+    stock AS (
+        SELECT item_id, balance
+        FROM inventory_balances
+        WHERE item_type = 'potion' AND item_id IN (SELECT item_sku FROM sold)
+        ORDER BY item_id
+        FOR UPDATE
+    )
+    SELECT so.item_sku, SUM(so.quantity) AS quantity, SUM(so.line_item_total) AS gold, COALESCE(st.balance, 0) AS stock
+    FROM sold so
+    LEFT JOIN stock st ON st.item_id = so.item_sku
+    GROUP BY so.item_sku, st.balance
+    ORDER BY so.item_sku
+""")
+
+
+# Held until checkout commits, so no cart line upsert can add to the cart meanwhile
+LOCK_CART_QUERY = sqlalchemy.text("""
+    SELECT checked_out_at FROM carts WHERE cart_id = :cart_id FOR UPDATE
+""")
+
+MARK_CHECKED_OUT_QUERY = sqlalchemy.text("""
+    UPDATE carts SET checked_out_at = now() WHERE cart_id = :cart_id
+""")
+
+
+def checkout_cart(connection, cart_id):
+    """
+    Sell everything in a cart: one priced read of the cart, one ledger write for the
+    potion debits and the gold credit, one upsert into the hourly sales rollup.
+    Raises 404 for a missing or empty cart, 409 for one already checked out and 409
+    if any line asks for more potions than are in stock.
+    """
+    cart = connection.execute(LOCK_CART_QUERY, {'cart_id': cart_id}).fetchone()
+    if cart is None:
+        raise HTTPException(status_code=404, detail=f"Cart {cart_id} not found.")
+    if cart.checked_out_at is not None:
+        raise HTTPException(status_code=409, detail=f"Cart {cart_id} has already been checked out.")
+    # Lines still held by an in-memory cart store are written first
+    cart_store.get_store().persist(connection, cart_id)
+    # Gold before the potion rows, the lock order every other ledger writer follows
+    ledger.lock_gold(connection)
+    game_time = game_clock.current(connection)
+    items = connection.execute(CHECKOUT_ITEMS_QUERY, {
+        'cart_id': cart_id,
+        'game_day': game_time.day if game_time else None,
+        'game_hour': game_time.hour if game_time else None,
+    }).fetchall()
+
+    if not items:
+        logging.info(f"No items in cart {cart_id} for checkout.")
+        raise HTTPException(status_code=404, detail="No items in cart.")
+
+    short = [item.item_sku for item in items if item.quantity > item.stock]
+    if short:
+        logging.info(f"Cart {cart_id} asks for more than is in stock: {short}")
+        raise HTTPException(status_code=409, detail=f"Not enough stock for {', '.join(short)}.")
+
+    connection.execute(MARK_CHECKED_OUT_QUERY, {'cart_id': cart_id})
+    total_potions = sum(item.quantity for item in items)
+    total_cost = int(sum(item.gold for item in items))
+
+    entries = [
+        {'item_type': 'potion', 'item_id': item.item_sku, 'change_amount': -item.quantity, 'description': 'sale'}
+        for item in items
+    ]
+    entries.append({'item_type': 'gold', 'item_id': 'N/A', 'change_amount': total_cost, 'description': 'sale income'})
+    ledger.record_entries(connection, entries)
+    # After the ledger write, so the rollup rows are always locked after the balances
+    sales.record_sales(connection, items, game_time)
+
+    logging.info(f"Cart {cart_id} checked out: {total_potions} potions for {total_cost} gold")
+    return {"total_potions_bought": total_potions, "total_gold_paid": total_cost}
 
-            # Clear the cart after successful transaction
-            delete_cart_items_query = sqlalchemy.text("DELETE FROM cart_items WHERE cart_id = :cart_id")
-            connection.execute(delete_cart_items_query, {'cart_id': cart_id})
 
-            logging.info(f"Cart {cart_id} cleared after checkout.")
+@router.post("/{cart_id}/checkout")
+async def checkout(cart_id: int, cart_checkout: CartCheckout):
+    try:
+        result = await db.run_in_transaction(checkout_cart, cart_id)
+        cart_store.get_store().discard(cart_id)
 
-            return {"total_items_bought": len(items), "total_gold_paid": total_cost}
+        catalog.invalidate_catalog()
+        return result
 
+    except HTTPException:
+        raise
     except Exception as e:
         logging.error(f"Error during checkout: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -127,75 +423,16 @@ def checkout(cart_id: int, cart_checkout: CartCheckout):
 def simulate_purchase():
     try:
         logging.info("Simulating purchase")
-        
-        with db.engine.connect() as connection:
-            trans = connection.begin()
-
-            try:
-                # Ensure visit_id exists
-                visit_id = 1
-                visit_query = sqlalchemy.text("SELECT visit_id FROM customer_visits WHERE visit_id = :visit_id")
-                visit_exists = connection.execute(visit_query, {'visit_id': visit_id}).fetchone()
-
-                if not visit_exists:
-                    logging.info("Creating new customer visit with visit_id = 1")
-                    connection.execute(sqlalchemy.text("""
-                        INSERT INTO customer_visits (visit_id, customer_name, visit_timestamp)
-                        VALUES (:visit_id, 'Test Customer', :visit_timestamp)
-                    """), {'visit_id': visit_id, 'visit_timestamp': datetime.datetime.now()})
-
-                # Ensure cart_id exists
-                cart_id = 1
-                cart_query = sqlalchemy.text("SELECT cart_id FROM carts WHERE cart_id = :cart_id")
-                cart_exists = connection.execute(cart_query, {'cart_id': cart_id}).fetchone()
-
-                if not cart_exists:
-                    logging.info("Creating new cart with cart_id = 1")
-                    connection.execute(sqlalchemy.text("""
-                        INSERT INTO carts (cart_id, visit_id, created_at)
-                        VALUES (:cart_id, :visit_id, :created_at)
-                    """), {'cart_id': cart_id, 'visit_id': visit_id, 'created_at': datetime.datetime.now()})
-
-                # Add item to cart
-                logging.info("Adding item to cart")
-                connection.execute(sqlalchemy.text("""
-                    INSERT INTO cart_items (cart_id, item_sku, quantity)
-                    VALUES (:cart_id, 'RP-001', 1)
-                    ON CONFLICT (cart_id, item_sku) DO UPDATE SET quantity = EXCLUDED.quantity
-                """), {'cart_id': cart_id})
-                
-                # Perform checkout
-                logging.info("Performing checkout")
-                items_query = sqlalchemy.text("SELECT item_sku, quantity FROM cart_items WHERE cart_id = :cart_id")
-                items = connection.execute(items_query, {'cart_id': cart_id}).fetchall()
-
-                total_cost = 0
-                for item in items:
-                    price_query = sqlalchemy.text("SELECT price FROM potion_mixes WHERE sku = :sku")
-                    price = connection.execute(price_query, {'sku': item[0]}).scalar()  # Use item[0] to access the first column 'item_sku'
-                    total_cost += price * item[1]  # Use item[1] to access the second column 'quantity'
-                    
-                    logging.info(f"Adding ledger entry for {item[0]}")
-                    connection.execute(sqlalchemy.text("""
-                        INSERT INTO inventory_ledger (item_type, item_id, change_amount, description, date)
-                        VALUES ('potion', :item_id, -:quantity, 'sale', :date)
-                    """), {'item_id': item[0], 'quantity': item[1], 'date': datetime.datetime.now()})
-
-                logging.info("Updating gold ledger")
-                connection.execute(sqlalchemy.text("""
-                    INSERT INTO inventory_ledger (item_type, item_id, change_amount, description, date)
-                    VALUES ('gold', 'N/A', :amount, 'sale income', :date)
-                """), {'amount': total_cost, 'date': datetime.datetime.now()})
-
-                logging.info("Clearing cart")
-                connection.execute(sqlalchemy.text("DELETE FROM cart_items WHERE cart_id = :cart_id"), {'cart_id': cart_id})
-
-                trans.commit()
-            except Exception as e:
-                trans.rollback()
-                raise e
 
+        with db.engine.begin() as connection:
+            cart_id = create_cart(connection, Customer(customer_name="Test Customer", character_class="Tester", level=1))
+            upsert_cart_item(connection, cart_id, CartItem(quantity=1, item_sku="RP-001"))
+            checkout_cart(connection, cart_id)
+
+        catalog.invalidate_catalog()
         return {"status": "Simulated purchase completed successfully"}
+    except HTTPException:
+        raise
     except sqlalchemy.exc.SQLAlchemyError as e:
         logging.error(f"Database error during simulated purchase: {e}")
         raise HTTPException(status_code=500, detail="Database error during simulated purchase.")
@@ -1,48 +1,68 @@
+import os
 import sqlalchemy
 from src import database as db
-from fastapi import APIRouter, HTTPException
+from src.cache import VersionedResponseCache
+from src.potions import composition_to_potion_type
+from fastapi import APIRouter, Header, HTTPException, Response
 
 router = APIRouter()
 
+# The APISpec allows at most 6 SKUs in the catalog and quantities between 1 and 10000
+MAX_CATALOG_SKUS = 6
+MAX_CATALOG_QUANTITY = 10000
+
+# Mixes in stock in catalog_ranking order (see src/ranking.py); unranked mixes, and
+# every mix before the first ranking, fall back to the largest stock first.
+CATALOG_QUERY = sqlalchemy.text("""
+    SELECT pm.sku, pm.name, pm.price, pm.potion_composition, b.balance AS quantity
+    FROM potion_mixes pm
+    JOIN inventory_balances b ON b.item_type = 'potion' AND b.item_id = pm.sku
+    LEFT JOIN catalog_ranking r ON r.sku = pm.sku
+    WHERE b.balance > 0
+    ORDER BY r.rank NULLS LAST, b.balance DESC, pm.sku
+    LIMIT :limit
+""")
+
+# Invalidated by bottling, checkout and reset; the TTL covers writes from other workers
+catalog_cache = VersionedResponseCache(ttl_seconds=float(os.environ.get("CATALOG_CACHE_TTL", "30")))
+
+
+def invalidate_catalog():
+    """
+    Drop the cached catalog. Call after committing any change to potion stock or potion_mixes.
+    """
+    catalog_cache.invalidate()
+
+
+def build_catalog(connection):
+    """
+    Build the APISpec catalog with a single query joining potion_mixes to the
+    running potion balances and the current ranking.
+    """
+    results = connection.execute(CATALOG_QUERY, {'limit': MAX_CATALOG_SKUS}).fetchall()
+    return [
+        {
+            "sku": result.sku,
+            "name": result.name,
+            "quantity": min(result.quantity, MAX_CATALOG_QUANTITY),
+            "price": int(result.price),
+            "potion_type": composition_to_potion_type(result.potion_composition),
+        }
+        for result in results
+    ]
+
+
+async def load_catalog():
+    return await db.run_in_transaction(build_catalog)
+
+
 @router.get("/catalog/", tags=["catalog"])
-def get_catalog():
+async def get_catalog(if_none_match: str = Header(default=None)):
     try:
-        with db.engine.begin() as connection:
-            # Retrieve potion details for all available potion types from the potion_mixes table
-            potion_details_query = sqlalchemy.text(
-                "SELECT name, sku, price, potion_composition FROM potion_mixes"
-            )
-            results = connection.execute(potion_details_query).fetchall()
-            
-            if not results:
-                raise HTTPException(status_code=404, detail="Potion details not found.")
-
-            # Initialize an empty catalog response
-            catalog_response = []
-
-            # Calculate inventory quantity for each potion from the ledger
-            for result in results:
-                name, sku, price, potion_composition = result
-
-                # Fetch the total quantity for the current potion SKU from the ledger
-                ledger_query = sqlalchemy.text(
-                    "SELECT SUM(change_amount) AS total_quantity FROM inventory_ledger WHERE item_id = :sku"
-                )
-                ledger_result = connection.execute(ledger_query, {'sku': sku}).scalar()
-
-                inventory_quantity = ledger_result if ledger_result is not None else 0
-
-                # Add to catalog only if the potion is available in inventory
-                if inventory_quantity > 0:
-                    catalog_response.append({
-                        "sku": sku,
-                        "name": name,
-                        "quantity": inventory_quantity,
-                        "price": price,
-                        "potion_composition": potion_composition
-                    })
-
-            return catalog_response
-
+        entry = await catalog_cache.get_async(load_catalog)
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+
+    if if_none_match == entry.etag:
+        return Response(status_code=304, headers={"ETag": entry.etag})
+    return Response(content=entry.body, media_type="application/json", headers={"ETag": entry.etag})
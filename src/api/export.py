@@ -0,0 +1,149 @@
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from enum import Enum
+import csv
+import datetime
+import io
+import itertools
+import json
+import logging
+import sqlalchemy
+from src import database as db
+from src.api import auth
+
+router = APIRouter(
+    prefix="/export",
+    tags=["export"],
+    dependencies=[Depends(auth.get_api_key)],
+)
+
+# Exports read through a server-side cursor and hand rows to the response this many
+# at a time, so memory stays bounded however large the ledger grows.
+EXPORT_CHUNK_ROWS = 5000
+
+class export_format(str, Enum):
+    ndjson = "ndjson"
+    csv = "csv"
+
+MEDIA_TYPES = {
+    export_format.ndjson: "application/x-ndjson",
+    export_format.csv: "text/csv",
+}
+
+LEDGER_COLUMNS = ("id", "item_type", "item_id", "change_amount", "description", "date")
+
+LEDGER_EXPORT_QUERY = sqlalchemy.text("""
+    SELECT id, item_type, item_id, change_amount, description, date
+    FROM inventory_ledger
+    WHERE (CAST(:start AS TIMESTAMP) IS NULL OR date >= :start)
+    AND (CAST(:end AS TIMESTAMP) IS NULL OR date < :end)
+    AND (CAST(:item_type AS TEXT) IS NULL OR item_type = :item_type)
+    AND (CAST(:item_id AS TEXT) IS NULL OR item_id = :item_id)
+    ORDER BY id
+""")
+
+ORDER_COLUMNS = ("line_item_id", "cart_id", "customer_name", "item_sku", "quantity", "line_item_total", "timestamp")
+
+ORDERS_EXPORT_QUERY = sqlalchemy.text("""
+    SELECT ci.cart_items_id AS line_item_id, ci.cart_id, cv.customer_name, ci.item_sku,
+           ci.quantity, ci.line_item_total, ci.sold_at AS timestamp
+    FROM cart_items ci
+    JOIN carts c ON ci.cart_id = c.cart_id
+    JOIN customer_visits cv ON c.visit_id = cv.visit_id
+    WHERE ci.sold_at IS NOT NULL
+    AND (CAST(:start AS TIMESTAMPTZ) IS NULL OR ci.sold_at >= :start)
+    AND (CAST(:end AS TIMESTAMPTZ) IS NULL OR ci.sold_at < :end)
+    AND (CAST(:item_sku AS TEXT) IS NULL OR ci.item_sku = :item_sku)
+    ORDER BY ci.sold_at, ci.cart_items_id
+""")
+
+
+def _json_value(value):
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    return value
+
+
+def encode_chunks(partitions, columns, fmt):
+    """
+    Encode partitions of rows as NDJSON lines or CSV, one bytes chunk per partition.
+    """
+    if fmt == export_format.csv:
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(columns)
+        yield buffer.getvalue().encode()
+        for rows in partitions:
+            buffer.seek(0)
+            buffer.truncate()
+            writer.writerows(rows)
+            yield buffer.getvalue().encode()
+    else:
+        for rows in partitions:
+            yield "".join(
+                json.dumps({column: _json_value(value) for column, value in zip(columns, row)}) + "\n"
+                for row in rows
+            ).encode()
+
+
+def stream_query(query, params, columns, fmt):
+    """
+    Run query on its own connection with a server-side cursor and yield encoded chunks.
+    REPEATABLE READ keeps the whole export on one snapshot while it streams.
+    """
+    with db.get_engine().connect() as connection:
+        connection = connection.execution_options(
+            isolation_level="REPEATABLE READ",
+            stream_results=True,
+            yield_per=EXPORT_CHUNK_ROWS,
+        )
+        with connection.begin():
+            result = connection.execute(query, params)
+            yield from encode_chunks(result.partitions(), columns, fmt)
+
+
+async def export_response(query, params, columns, fmt, filename):
+    chunks = stream_query(query, params, columns, fmt)
+    try:
+        # Start the query before answering so a database error is still a 500
+        first = await run_in_threadpool(next, chunks, b"")
+    except Exception as e:
+        logging.error(f"Error starting export: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+    return StreamingResponse(
+        itertools.chain([first], chunks),
+        media_type=MEDIA_TYPES[fmt],
+        headers={"Content-Disposition": f'attachment; filename="{filename}.{fmt.value}"'},
+    )
+
+
+@router.get("/ledger")
+async def export_ledger(
+    start: datetime.datetime = None,
+    end: datetime.datetime = None,
+    item_type: str = None,
+    item_id: str = None,
+    format: export_format = export_format.ndjson,
+):
+    """
+    Stream inventory_ledger rows in id order, optionally limited to [start, end)
+    and to one item_type / item_id.
+    """
+    params = {'start': start, 'end': end, 'item_type': item_type, 'item_id': item_id}
+    return await export_response(LEDGER_EXPORT_QUERY, params, LEDGER_COLUMNS, format, "ledger")
+
+
+@router.get("/orders")
+async def export_orders(
+    start: datetime.datetime = None,
+    end: datetime.datetime = None,
+    potion_sku: str = None,
+    format: export_format = export_format.ndjson,
+):
+    """
+    Stream sold line items in sale order, optionally limited to [start, end) and one SKU.
+    """
+    params = {'start': start, 'end': end, 'item_sku': potion_sku}
+    return await export_response(ORDERS_EXPORT_QUERY, params, ORDER_COLUMNS, format, "orders")
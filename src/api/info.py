@@ -3,6 +3,9 @@ import sqlalchemy
 from sqlalchemy.exc import SQLAlchemyError
 import logging
 from src import database as db
+from src import sales
+from src import scheduler
+from src.game_time import game_clock
 from pydantic import BaseModel
 from src.api import auth
 
@@ -21,10 +24,15 @@ def post_time(timestamp: Timestamp):
     try:
         with db.engine.begin() as connection:
             insert_query = sqlalchemy.text(
-                "INSERT INTO game_time (day, hour) VALUES (:day, :hour)"
+                "INSERT INTO game_time (day, hour) VALUES (:day, :hour) RETURNING tick_id"
             )
             # Make sure parameters are correctly passed as a dictionary
-            connection.execute(insert_query, {'day': timestamp.day, 'hour': timestamp.hour})
+            tick_id = connection.execute(insert_query, {'day': timestamp.day, 'hour': timestamp.hour}).scalar()
+
+        game_clock.set(tick_id, timestamp.day, timestamp.hour)
+
+        # Planning jobs run in the background once the tick is recorded
+        scheduler.on_tick(tick_id, timestamp.day, timestamp.hour)
         return {"status": "Current time logged successfully."}
     except SQLAlchemyError as e:
         logging.error(f"SQLAlchemy Error when logging time: {e}")
@@ -32,3 +40,37 @@ def post_time(timestamp: Timestamp):
     except Exception as e:
         logging.error(f"Unexpected error when logging time: {e}")
         raise HTTPException(status_code=500, detail="Failed to log time due to an unexpected error.")
+
+
+@router.get("/current_time")
+def get_time():
+    """
+    The latest posted game time, served from memory.
+    """
+    try:
+        current = game_clock.current()
+        if current is None:
+            with db.engine.begin() as connection:
+                current = game_clock.current(connection)
+        if current is None:
+            raise HTTPException(status_code=404, detail="No game time has been posted yet.")
+        return {"day": current.day, "hour": current.hour}
+    except HTTPException:
+        raise
+    except Exception as e:
+        logging.error(f"Unexpected error when reading time: {e}")
+        raise HTTPException(status_code=500, detail="Failed to read time due to an unexpected error.")
+
+
+@router.get("/sales")
+def get_sales(day: str = None, hour: int = None, potion_sku: str = None):
+    """
+    Potions sold and gold taken per SKU per game day and hour, from the rollup
+    maintained at checkout. Every filter is optional.
+    """
+    try:
+        with db.engine.begin() as connection:
+            return sales.get_sales(connection, day, hour, potion_sku)
+    except SQLAlchemyError as e:
+        logging.error(f"SQLAlchemy Error when reading sales: {e}")
+        raise HTTPException(status_code=500, detail="Failed to read sales due to database error.")
@@ -1,6 +1,8 @@
 from fastapi import APIRouter, HTTPException, Depends
 import sqlalchemy
 from src import database as db
+from src import idempotency
+from src import ledger
 from src.api import auth
 from pydantic import BaseModel
 from sqlalchemy.exc import SQLAlchemyError
@@ -22,29 +24,19 @@ class CapacityPurchase(BaseModel):
 def get_inventory():
     try:
         with db.engine.begin() as connection:
-            # Calculate current inventory totals from the ledger
-            ledger_query = sqlalchemy.text("""
-                SELECT item_type, item_id, SUM(change_amount) AS total
-                FROM inventory_ledger
-                GROUP BY item_type, item_id
-            """)
-            ledger_result = connection.execute(ledger_query).fetchall()
-            inventory_totals = {}
-            for item in ledger_result:
-                if item[0] not in inventory_totals:
-                    inventory_totals[item[0]] = {}
-                inventory_totals[item[0]][item[1]] = item[2]
+            # Current inventory totals from the running balances
+            inventory_totals = ledger.get_balances(connection)
 
             # Fetch initial values from global inventory
             global_inventory_query = sqlalchemy.text("SELECT * FROM global_inventory WHERE id = 1")
             global_inventory = connection.execute(global_inventory_query).fetchone()
 
             # Merge ledger results with global inventory
-            gold = (global_inventory['gold'] + inventory_totals.get('gold', {}).get('N/A', 0)) if global_inventory else inventory_totals.get('gold', {}).get('N/A', 0)
+            gold = (global_inventory.gold + inventory_totals.get('gold', {}).get('N/A', 0)) if global_inventory else inventory_totals.get('gold', {}).get('N/A', 0)
             ml = {
-                "red": (global_inventory['num_red_ml'] + inventory_totals.get('ml', {}).get('red', 0)) if global_inventory else inventory_totals.get('ml', {}).get('red', 0),
-                "green": (global_inventory['num_green_ml'] + inventory_totals.get('ml', {}).get('green', 0)) if global_inventory else inventory_totals.get('ml', {}).get('green', 0),
-                "blue": (global_inventory['num_blue_ml'] + inventory_totals.get('ml', {}).get('blue', 0)) if global_inventory else inventory_totals.get('ml', {}).get('blue', 0)
+                "red": (global_inventory.num_red_ml + inventory_totals.get('ml', {}).get('red', 0)) if global_inventory else inventory_totals.get('ml', {}).get('red', 0),
+                "green": (global_inventory.num_green_ml + inventory_totals.get('ml', {}).get('green', 0)) if global_inventory else inventory_totals.get('ml', {}).get('green', 0),
+                "blue": (global_inventory.num_blue_ml + inventory_totals.get('ml', {}).get('blue', 0)) if global_inventory else inventory_totals.get('ml', {}).get('blue', 0)
             }
 
             # Get details for each potion type
@@ -81,12 +73,11 @@ def get_capacity_plan():
     Each unit costs 1000 gold. Assumes no partial purchases are allowed.
     """
     with db.engine.begin() as connection:
-        gold_query = sqlalchemy.text("SELECT SUM(change_amount) FROM inventory_ledger WHERE item_type = 'gold'")
-        current_gold = connection.execute(gold_query).scalar()
+        current_gold = ledger.get_gold(connection)
         cost_query = sqlalchemy.text("SELECT gold_cost_per_unit FROM capacity_inventory WHERE id = 1")
         cost_per_unit = connection.execute(cost_query).scalar()
 
-        if current_gold is None or cost_per_unit is None:
+        if cost_per_unit is None:
             raise HTTPException(status_code=404, detail="Required inventory data not found.")
 
         additional_units = current_gold // cost_per_unit
@@ -100,49 +91,58 @@ def get_capacity_plan():
             "additional_ml_capacity": additional_ml_capacity
         }
 
+def buy_capacity(connection):
+    """
+    Spend as much gold as possible on capacity units; returns the number bought.
+    Each unit costs gold_cost_per_unit and provides 50 potion slots and 10000 ml.
+    """
+    # Fetch the cost per unit of capacity from the capacity_inventory table
+    cost_query = sqlalchemy.text("SELECT gold_cost_per_unit FROM capacity_inventory WHERE id = 1")
+    cost_per_unit = connection.execute(cost_query).scalar()
+
+    if cost_per_unit is None:
+        raise HTTPException(status_code=404, detail="Required inventory data not found.")
+
+    # Lock the gold balance so a concurrent purchase can't spend the same gold
+    current_gold = ledger.lock_gold(connection)
+
+    # Calculate how many additional units of capacity can be bought
+    additional_units = current_gold // cost_per_unit
+
+    # Deduct the cost of the capacity from the gold
+    ledger.spend_gold(connection, additional_units * cost_per_unit, 'Capacity purchase')
+
+    # Update the shop's capacity based on the additional units that can be afforded
+    connection.execute(sqlalchemy.text("""
+        UPDATE capacity_inventory SET
+        potion_capacity = potion_capacity + :additional_units * 50,
+        ml_capacity = ml_capacity + :additional_units * 10000
+        WHERE id = 1
+    """), {'additional_units': additional_units})
+    return additional_units
+
+
 @router.post("/deliver/{order_id}")
 def deliver_capacity_plan(order_id: int):
     """
     Automatically purchase additional capacity for potions and ml based on available gold.
     Each unit costs 1000 gold and provides 50 potion slots and 10000 ml.
     """
+    response = {"status": "OK", "message": f"Capacity purchased and inventory updated for order_id {order_id}"}
     try:
         with db.engine.begin() as connection:
-            # Fetch the current amount of gold from the inventory_ledger table
-            gold_query = sqlalchemy.text("SELECT SUM(change_amount) FROM inventory_ledger WHERE item_type = 'gold'")
-            current_gold = connection.execute(gold_query).scalar() or 0
-            
-            # Fetch the cost per unit of capacity from the capacity_inventory table
-            cost_query = sqlalchemy.text("SELECT gold_cost_per_unit FROM capacity_inventory WHERE id = 1")
-            cost_per_unit = connection.execute(cost_query).scalar()
-
-            if cost_per_unit is None:
-                raise HTTPException(status_code=404, detail="Required inventory data not found.")
-
-            # Calculate how many additional units of capacity can be bought
-            additional_units = current_gold // cost_per_unit
-
-            # Update the shop's capacity based on the additional units that can be afforded
-            connection.execute(sqlalchemy.text("""
-                UPDATE capacity_inventory SET
-                potion_capacity = potion_capacity + :additional_units * 50,
-                ml_capacity = ml_capacity + :additional_units * 10000
-                WHERE id = 1
-            """), {'additional_units': additional_units})
-
-            # Deduct the cost of the capacity from the gold
-            connection.execute(sqlalchemy.text("""
-                INSERT INTO inventory_ledger (item_type, item_id, change_amount, description, date)
-                VALUES ('gold', 'N/A', -:cost, 'Capacity purchase', :date)
-            """), {'cost': additional_units * cost_per_unit, 'date': datetime.datetime.now()})
-
-            # Sync global inventory with ledger
-            sync_global_inventory()
-
-            return {"status": "OK", "message": f"Capacity purchased and inventory updated for order_id {order_id}"}
-    
+            previous = idempotency.claim_order(connection, 'capacity', order_id, {}, response)
+            if previous is not None:
+                return previous
+            buy_capacity(connection)
+
+        return response
+
+    except HTTPException:
+        raise
+    except idempotency.OrderConflict as e:
+        raise HTTPException(status_code=409, detail=str(e))
     except SQLAlchemyError as e:
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {str(e)}")
-
@@ -1,13 +1,17 @@
 from fastapi import FastAPI, exceptions
 from fastapi.responses import JSONResponse
 from pydantic import ValidationError
-from src.api import carts, catalog, bottler, barrels, admin, info, inventory
+from src.api import carts, catalog, bottler, barrels, admin, info, inventory, export
 import json
 import logging
 import sys
+import time
 from starlette.middleware.cors import CORSMiddleware
 import sqlalchemy
+from src import cart_store
 from src import database as db
+from src import metrics
+from src import scheduler
 
 description = """
 Central Coast Cauldrons is the premier ecommerce site for all your alchemical desires.
@@ -34,6 +38,20 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def record_request_metrics(request, call_next):
+    stats, token = metrics.start_request()
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        metrics.end_request(token)
+        route = metrics.route_template(app, request.scope)
+        metrics.registry.observe(request.method, route, status, time.perf_counter() - start, stats)
+
 app.include_router(inventory.router)
 app.include_router(carts.router)
 app.include_router(catalog.router)
@@ -41,6 +59,15 @@ app.include_router(bottler.router)
 app.include_router(barrels.router)
 app.include_router(admin.router)
 app.include_router(info.router)
+app.include_router(export.router)
+
+@app.on_event("shutdown")
+def stop_scheduler():
+    scheduler.shutdown()
+
+@app.on_event("shutdown")
+def flush_carts():
+    cart_store.close_store()
 
 @app.exception_handler(exceptions.RequestValidationError)
 @app.exception_handler(ValidationError)
@@ -0,0 +1,79 @@
+import hashlib
+import json
+import threading
+import time
+from dataclasses import dataclass
+
+
+@dataclass(frozen=True)
+class CachedResponse:
+    version: int
+    body: bytes
+    etag: str
+    created_at: float
+
+
+class VersionedResponseCache:
+    """
+    Holds one pre-serialized JSON response together with its ETag.
+
+    Write paths call invalidate() after their transaction commits, which bumps the
+    version and drops the entry. A build that started before an invalidation is
+    returned to its caller but never stored, so a stale result can't be cached.
+    The TTL bounds staleness for writes made by other processes.
+    """
+
+    def __init__(self, ttl_seconds=30.0):
+        self.ttl_seconds = ttl_seconds
+        self.version = 0
+        self._entry = None
+        self._lock = threading.Lock()
+
+    def invalidate(self):
+        with self._lock:
+            self.version += 1
+            self._entry = None
+
+    def peek(self):
+        """
+        The cached entry if it is still fresh, without building anything.
+        """
+        entry = self._entry
+        if entry is None or entry.version != self.version:
+            return None
+        if time.monotonic() - entry.created_at > self.ttl_seconds:
+            return None
+        return entry
+
+    def get(self, build):
+        """
+        Return the cached entry, calling build() and serializing its result on a miss.
+        """
+        entry = self.peek()
+        if entry is not None:
+            return entry
+        version = self.version
+        return self._store(version, build())
+
+    async def get_async(self, build):
+        """
+        Same as get() for a build coroutine function.
+        """
+        entry = self.peek()
+        if entry is not None:
+            return entry
+        version = self.version
+        return self._store(version, await build())
+
+    def _store(self, version, value):
+        body = json.dumps(value, separators=(",", ":"), default=str).encode()
+        entry = CachedResponse(
+            version=version,
+            body=body,
+            etag='"' + hashlib.sha1(body).hexdigest() + '"',
+            created_at=time.monotonic(),
+        )
+        with self._lock:
+            if self.version == version:
+                self._entry = entry
+        return entry
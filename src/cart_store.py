@@ -0,0 +1,382 @@
+import json
+import logging
+import os
+import threading
+import time
+import sqlalchemy
+from fastapi import HTTPException
+from src import database as db
+
+# Where cart lines live until checkout, chosen by CART_STORE:
+#
+#   db      (default) every POST /carts/{id}/items/ upserts into cart_items; a line
+#           for a missing (404) or checked-out (409) cart is refused.
+#   memory  lines are kept in this process and reach cart_items when the cart is
+#           checked out, or earlier on the write-behind flush every CART_FLUSH_SECONDS
+#           (0 turns the flush off). Carts untouched for CART_TTL_SECONDS are dropped.
+#           With CART_JOURNAL set to a file path every change is also appended there
+#           (fsynced if CART_JOURNAL_FSYNC=1) and replayed on startup, so a crash
+#           doesn't lose lines that weren't flushed yet. SKUs, quantities and the
+#           cart itself are checked when a line is set, and each cart is flushed
+#           under its own savepoint, so one bad cart can't hold up the others.
+#
+# The memory store is per process: run a single worker, or route each cart to the
+# worker that created it.
+
+UPSERT_CART_ITEMS_QUERY = sqlalchemy.text("""
+    INSERT INTO cart_items (cart_id, item_sku, quantity)
+    SELECT i.cart_id, i.item_sku, i.quantity
+    FROM unnest(
+        CAST(:cart_ids AS INTEGER[]),
+        CAST(:item_skus AS TEXT[]),
+        CAST(:quantities AS INTEGER[])
+    ) AS i(cart_id, item_sku, quantity)
+    -- Lines for a missing or checked-out cart, or an unknown SKU, are skipped instead
+    -- of failing the statement; the short row count tells the caller
+    JOIN carts c ON c.cart_id = i.cart_id AND c.checked_out_at IS NULL
+    JOIN potion_mixes pm ON pm.sku = i.item_sku
+    -- Fixed row order, so a flush and a checkout touching the same lines can't deadlock
+    ORDER BY i.cart_id, i.item_sku
+    -- A checkout holds its cart row until it commits; waiting on it here means a
+    -- line can't slip into a cart that is being checked out
+    FOR SHARE OF c
+    ON CONFLICT (cart_id, item_sku) DO UPDATE SET quantity = EXCLUDED.quantity
+    WHERE cart_items.sold_at IS NULL
+""")
+
+
+def upsert_items(connection, lines):
+    """
+    Write (cart_id, item_sku, quantity) lines with one statement. Each (cart_id,
+    item_sku) may appear once. Returns how many lines were written: lines for a
+    missing or checked-out cart, or an unknown SKU, are not.
+    """
+    if not lines:
+        return 0
+    cart_ids, item_skus, quantities = (list(column) for column in zip(*lines))
+    result = connection.execute(UPSERT_CART_ITEMS_QUERY, {
+        'cart_ids': cart_ids,
+        'item_skus': item_skus,
+        'quantities': quantities,
+    })
+    return result.rowcount
+
+
+def check_quantity(quantity):
+    if quantity < 0:
+        raise HTTPException(status_code=400, detail="Quantity can't be negative.")
+
+
+KNOWN_SKUS_QUERY = sqlalchemy.text("SELECT sku FROM potion_mixes")
+
+CART_STATE_QUERY = sqlalchemy.text("""
+    SELECT checked_out_at IS NOT NULL AS checked_out FROM carts WHERE cart_id = :cart_id
+""")
+
+
+def check_cart(connection, cart_id):
+    """
+    Raise 404 if the cart doesn't exist and 409 if it has already been checked out.
+    """
+    checked_out = connection.execute(CART_STATE_QUERY, {'cart_id': cart_id}).scalar()
+    if checked_out is None:
+        raise HTTPException(status_code=404, detail=f"Cart {cart_id} not found.")
+    if checked_out:
+        raise HTTPException(status_code=409, detail=f"Cart {cart_id} has already been checked out.")
+
+
+def write_cart(connection, cart_id, items):
+    """
+    Upsert one cart's {sku: quantity} lines. When fewer lines were written than
+    given, finds out why and raises 404, 409 or 400 for the caller to roll back.
+    """
+    written = upsert_items(connection, [(cart_id, sku, quantity) for sku, quantity in items.items()])
+    if written < len(items):
+        check_cart(connection, cart_id)
+        unknown = sorted(set(items) - set(connection.execute(KNOWN_SKUS_QUERY).scalars().all()))
+        raise HTTPException(status_code=400, detail=f"Unknown SKUs: {', '.join(unknown)}.")
+    return written
+
+
+class DatabaseCartStore:
+    """
+    Cart lines go straight to cart_items.
+    """
+
+    async def set_item(self, cart_id, item_sku, quantity):
+        check_quantity(quantity)
+        await db.run_in_transaction(write_cart, cart_id, {item_sku: quantity})
+
+    def set_items(self, connection, cart_id, items):
+        for quantity in items.values():
+            check_quantity(quantity)
+        return write_cart(connection, cart_id, items)
+
+    def persist(self, connection, cart_id):
+        return 0
+
+    def discard(self, cart_id):
+        pass
+
+    def clear(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class _Cart:
+    __slots__ = ("lines", "touched")
+
+    def __init__(self, touched):
+        self.lines = {}
+        self.touched = touched
+
+
+class MemoryCartStore:
+    """
+    Cart lines held in memory and written to cart_items at checkout or on flush().
+    """
+
+    def __init__(self, ttl=3600, flush_seconds=5, journal_path=None, journal_fsync=False, clock=time.time):
+        self.ttl = ttl
+        self.flush_seconds = flush_seconds
+        self.journal_path = journal_path
+        self.journal_fsync = journal_fsync
+        self.clock = clock
+        self._carts = {}
+        self._dirty = set()
+        self._skus = frozenset()
+        self._lock = threading.Lock()
+        self._journal = None
+        self._stop = threading.Event()
+        self._thread = None
+        if journal_path:
+            self._replay()
+            self._journal = open(journal_path, "a")
+
+    def put(self, cart_id, item_sku, quantity):
+        now = self.clock()
+        with self._lock:
+            cart = self._carts.get(cart_id)
+            if cart is None:
+                cart = self._carts[cart_id] = _Cart(now)
+            cart.lines[item_sku] = quantity
+            cart.touched = now
+            self._dirty.add(cart_id)
+            if self._journal is not None:
+                self._append(cart_id, item_sku, quantity, now)
+
+    def _needs_check(self, cart_id, skus):
+        with self._lock:
+            return cart_id not in self._carts or not self._skus.issuperset(skus)
+
+    def check(self, connection, cart_id, skus):
+        """
+        Reject unknown SKUs (400), a cart that doesn't exist (404) and one that has
+        already been checked out (409) before any of its lines are held.
+        """
+        if not self._skus.issuperset(skus):
+            self._skus = frozenset(connection.execute(KNOWN_SKUS_QUERY).scalars().all())
+            unknown = sorted(set(skus) - self._skus)
+            if unknown:
+                raise HTTPException(status_code=400, detail=f"Unknown SKUs: {', '.join(unknown)}.")
+        with self._lock:
+            if cart_id in self._carts:
+                return
+        check_cart(connection, cart_id)
+
+    async def set_item(self, cart_id, item_sku, quantity):
+        check_quantity(quantity)
+        # Only a new cart or an unfamiliar SKU costs a query
+        if self._needs_check(cart_id, [item_sku]):
+            await db.run_in_transaction(self.check, cart_id, [item_sku])
+        self.put(cart_id, item_sku, quantity)
+
+    def set_items(self, connection, cart_id, items):
+        for quantity in items.values():
+            check_quantity(quantity)
+        if self._needs_check(cart_id, items):
+            self.check(connection, cart_id, list(items))
+        for sku, quantity in items.items():
+            self.put(cart_id, sku, quantity)
+        return len(items)
+
+    def items(self, cart_id):
+        with self._lock:
+            cart = self._carts.get(cart_id)
+            if cart is None or self._expired(cart, self.clock()):
+                return {}
+            return dict(cart.lines)
+
+    def persist(self, connection, cart_id):
+        """
+        Write the cart's lines in the caller's (checkout) transaction.
+        """
+        items = self.items(cart_id)
+        return upsert_items(connection, [(cart_id, sku, quantity) for sku, quantity in items.items()])
+
+    def discard(self, cart_id):
+        """
+        Forget a cart once its checkout has committed.
+        """
+        with self._lock:
+            self._carts.pop(cart_id, None)
+            self._dirty.discard(cart_id)
+
+    def clear(self):
+        """
+        Drop every cart, e.g. after a reset truncated carts and restarted their ids.
+        """
+        with self._lock:
+            self._carts = {}
+            self._dirty = set()
+            if self._journal is not None:
+                self._journal.truncate(0)
+
+    def _expired(self, cart, now):
+        return now - cart.touched > self.ttl
+
+    def evict_expired(self):
+        now = self.clock()
+        with self._lock:
+            expired = [cart_id for cart_id, cart in self._carts.items() if self._expired(cart, now)]
+            for cart_id in expired:
+                del self._carts[cart_id]
+                self._dirty.discard(cart_id)
+        return len(expired)
+
+    def flush(self):
+        """
+        Write every cart changed since the last flush to cart_items, one savepoint per
+        cart. A cart that fails is logged and retried on the next flush; the rest are
+        written.
+        """
+        with self._lock:
+            dirty, self._dirty = self._dirty, set()
+            carts = {
+                cart_id: [(cart_id, sku, quantity) for sku, quantity in self._carts[cart_id].lines.items()]
+                for cart_id in sorted(dirty) if cart_id in self._carts
+            }
+        written = 0
+        failed = set()
+        try:
+            with db.engine.begin() as connection:
+                for cart_id, lines in carts.items():
+                    try:
+                        with connection.begin_nested():
+                            written += upsert_items(connection, lines)
+                    except sqlalchemy.exc.DBAPIError as e:
+                        logging.warning(f"Could not flush cart {cart_id}: {e}")
+                        failed.add(cart_id)
+        except Exception:
+            failed = dirty
+            raise
+        finally:
+            if failed:
+                with self._lock:
+                    self._dirty |= {cart_id for cart_id in failed if cart_id in self._carts}
+        if self._journal is not None:
+            self._compact_journal()
+        return written
+
+    def _append(self, cart_id, item_sku, quantity, now):
+        self._journal.write(json.dumps([cart_id, item_sku, quantity, now]) + "\n")
+        self._journal.flush()
+        if self.journal_fsync:
+            os.fsync(self._journal.fileno())
+
+    def _replay(self):
+        if not os.path.exists(self.journal_path):
+            return
+        now = self.clock()
+        with open(self.journal_path) as journal:
+            for line in journal:
+                try:
+                    cart_id, item_sku, quantity, touched = json.loads(line)
+                except ValueError:
+                    # A torn last line from a crash mid-write
+                    continue
+                if now - touched > self.ttl:
+                    continue
+                cart = self._carts.setdefault(cart_id, _Cart(touched))
+                cart.lines[item_sku] = quantity
+                cart.touched = max(cart.touched, touched)
+                self._dirty.add(cart_id)
+        logging.info(f"Replayed {len(self._carts)} carts from {self.journal_path}")
+
+    def _compact_journal(self):
+        # Keep only the carts changed since the flush started
+        with self._lock:
+            tmp_path = self.journal_path + ".tmp"
+            with open(tmp_path, "w") as tmp:
+                for cart_id in self._dirty:
+                    cart = self._carts[cart_id]
+                    for sku, quantity in cart.lines.items():
+                        tmp.write(json.dumps([cart_id, sku, quantity, cart.touched]) + "\n")
+                tmp.flush()
+                os.fsync(tmp.fileno())
+            self._journal.close()
+            os.replace(tmp_path, self.journal_path)
+            self._journal = open(self.journal_path, "a")
+
+    def _run(self):
+        interval = self.flush_seconds or min(self.ttl, 60)
+        while not self._stop.wait(interval):
+            try:
+                self.evict_expired()
+                if self.flush_seconds:
+                    self.flush()
+            except Exception:
+                logging.exception("Cart write-behind flush failed")
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="cart-store", daemon=True)
+        self._thread.start()
+        return self
+
+    def close(self):
+        """
+        Stop the background thread and write whatever is left.
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        try:
+            self.flush()
+        finally:
+            if self._journal is not None:
+                self._journal.close()
+                self._journal = None
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                kind = os.environ.get("CART_STORE", "db")
+                if kind == "memory":
+                    _store = MemoryCartStore(
+                        ttl=float(os.environ.get("CART_TTL_SECONDS", "3600")),
+                        flush_seconds=float(os.environ.get("CART_FLUSH_SECONDS", "5")),
+                        journal_path=os.environ.get("CART_JOURNAL") or None,
+                        journal_fsync=os.environ.get("CART_JOURNAL_FSYNC") == "1",
+                    ).start()
+                elif kind == "db":
+                    _store = DatabaseCartStore()
+                else:
+                    raise ValueError(f"Unknown CART_STORE {kind!r}; use 'db' or 'memory'.")
+    return _store
+
+
+def close_store():
+    global _store
+    with _store_lock:
+        if _store is not None:
+            _store.close()
+            _store = None
@@ -1,35 +1,128 @@
 import os
+import threading
 import dotenv
-from sqlalchemy import create_engine, MetaData, Table
+from sqlalchemy import create_engine, MetaData, Table, Column, BigInteger, DateTime, Integer, Numeric, String, Text
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine
 from sqlalchemy.orm import Session
-import datetime
+from starlette.concurrency import run_in_threadpool
+from src import metrics
 
 def database_connection_url():
     dotenv.load_dotenv()
     return os.environ.get("POSTGRES_URI")
 
-engine = create_engine(database_connection_url(), pool_pre_ping=True)
+def async_database_connection_url():
+    """
+    The same database as POSTGRES_URI, reached through the asyncpg driver.
+    """
+    return make_url(database_connection_url()).set(drivername="postgresql+asyncpg")
+
+def async_enabled():
+    """
+    DB_ASYNC=1 serves the hot endpoints from the asyncpg engine instead of the thread pool.
+    """
+    dotenv.load_dotenv()
+    return os.environ.get("DB_ASYNC", "0").lower() in ("1", "true", "yes")
+
+def pool_options():
+    """
+    Connection pool settings shared by the sync and async engines.
+    """
+    dotenv.load_dotenv()
+    return {
+        "pool_pre_ping": True,
+        "pool_size": int(os.environ.get("DB_POOL_SIZE", "5")),
+        "max_overflow": int(os.environ.get("DB_MAX_OVERFLOW", "10")),
+        "pool_timeout": float(os.environ.get("DB_POOL_TIMEOUT", "30")),
+        "pool_recycle": int(os.environ.get("DB_POOL_RECYCLE", "1800")),
+    }
+
 metadata = MetaData()
 
-# Define the potion_mixes table
+# Engines are created on first use so importing the app does no I/O and works
+# without a reachable database.
+_engine = None
+_async_engine = None
+_engine_lock = threading.Lock()
+
+def get_engine():
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = create_engine(database_connection_url(), **pool_options())
+                metrics.instrument_engine(_engine)
+    return _engine
+
+def get_async_engine():
+    """
+    The asyncpg engine, or None when DB_ASYNC is not enabled.
+    """
+    global _async_engine
+    if _async_engine is None and async_enabled():
+        with _engine_lock:
+            if _async_engine is None:
+                _async_engine = create_async_engine(async_database_connection_url(), **pool_options())
+                metrics.instrument_engine(_async_engine)
+    return _async_engine
+
+def __getattr__(name):
+    # Keeps `db.engine` / `db.async_engine` working for callers while staying lazy
+    if name == "engine":
+        return get_engine()
+    if name == "async_engine":
+        return get_async_engine()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+async def run_in_transaction(fn, *args, **kwargs):
+    """
+    Run fn(connection, *args, **kwargs) inside a transaction without blocking the event loop.
+    With DB_ASYNC enabled fn runs on an asyncpg connection; otherwise it runs on the
+    sync engine in Starlette's thread pool. Either way fn is ordinary sync code.
+    """
+    async_engine = get_async_engine()
+    if async_engine is not None:
+        async with async_engine.begin() as connection:
+            return await connection.run_sync(fn, *args, **kwargs)
+
+    def run():
+        with get_engine().begin() as connection:
+            return fn(connection, *args, **kwargs)
+
+    return await run_in_threadpool(run)
+
+# Tables used through SQLAlchemy Core are declared to match schema.sql instead of
+# being reflected at import time.
 potion_mixes = Table(
     "potion_mixes",
     metadata,
-    autoload_with=engine,
+    Column("potion_id", Integer, primary_key=True),
+    Column("name", String(255), nullable=False),
+    Column("potion_composition", JSONB, nullable=False),
+    Column("sku", String(50), nullable=False, unique=True),
+    Column("price", Numeric(10, 2), nullable=False),
+    Column("inventory_quantity", Integer, nullable=False),
 )
 
-# Define the inventory_ledger table
 inventory_ledger = Table(
     "inventory_ledger",
     metadata,
-    autoload_with=engine,
+    Column("id", BigInteger, primary_key=True),
+    Column("item_type", String(50), nullable=False),
+    Column("item_id", String(50), nullable=False),
+    Column("change_amount", Integer, nullable=False),
+    Column("current_total", Integer),
+    Column("description", Text),
+    Column("date", DateTime, nullable=False),
 )
 
 def find_one_potion_mix(potion_composition):
     """
     Retrieve a potion mix by its composition from the potion_mixes table.
     """
-    with engine.connect() as conn:
+    with get_engine().connect() as conn:
         query = potion_mixes.select().where(potion_mixes.c.potion_composition == potion_composition)
         return conn.execute(query).fetchone()
 
@@ -37,7 +130,7 @@ def find_all_potion_mixes():
     """
     Retrieve all potion mixes from the potion_mixes table.
     """
-    with engine.connect() as conn:
+    with get_engine().connect() as conn:
         query = potion_mixes.select()
         return conn.execute(query).fetchall()
 
@@ -45,40 +138,34 @@ def update_potion_mix(sku, update_fields):
     """
     Record changes to a potion mix in the inventory_ledger instead of updating directly.
     """
-    with engine.begin() as conn:
+    from src import ledger
+    from src.api import catalog
+
+    with get_engine().begin() as conn:
         # Assuming update_fields contains 'inventory_quantity' and possibly 'price'
         if 'inventory_quantity' in update_fields:
-            quantity_change = update_fields['inventory_quantity']
-            current_quantity = conn.execute(
-                sqlalchemy.text("SELECT inventory_quantity FROM potion_mixes WHERE sku = :sku"),
-                {'sku': sku}
-            ).scalar()
-            conn.execute(inventory_ledger.insert(), {
+            ledger.record_entries(conn, [{
                 'item_type': 'potion',
                 'item_id': sku,
-                'change_amount': quantity_change,
-                'current_total': current_quantity + quantity_change,
+                'change_amount': update_fields['inventory_quantity'],
                 'description': 'Inventory update',
-                'date': datetime.datetime.now()
-            })
+            }])
         if 'price' in update_fields:
             conn.execute(
                 potion_mixes.update().where(potion_mixes.c.sku == sku).values(price=update_fields['price'])
             )
+    catalog.invalidate_catalog()
 
 def record_gold_transaction(change_amount, description):
     """
     Record a gold transaction in the inventory_ledger.
     """
-    with engine.begin() as conn:
-        current_gold = conn.execute(
-            sqlalchemy.text("SELECT SUM(change_amount) FROM inventory_ledger WHERE item_type = 'gold'")
-        ).scalar() or 0
-        conn.execute(inventory_ledger.insert(), {
+    from src import ledger
+
+    with get_engine().begin() as conn:
+        ledger.record_entries(conn, [{
             'item_type': 'gold',
             'item_id': 'N/A',
             'change_amount': change_amount,
-            'current_total': current_gold + change_amount,
             'description': description,
-            'date': datetime.datetime.now()
-        })
+        }])
@@ -0,0 +1,189 @@
+import io
+import json
+import logging
+import sqlalchemy
+from src import ledger
+
+# Whole-shop resets and named snapshots for /admin.
+#
+# reset() truncates the game tables in one TRUNCATE ... RESTART IDENTITY and reseeds
+# them with one statement per table. Snapshots dump inventory_balances, potion_mixes
+# and capacity_inventory with COPY into the game_snapshots table; restoring truncates
+# the same tables and COPYs the dumps back, so a load test can rewind in seconds.
+# Restored balances are written to the ledger as one entry per item, which keeps
+# inventory_balances consistent with it.
+
+# Everything a reset clears. Snapshots, the game clock and scheduler history survive.
+GAME_TABLES = (
+    "inventory_ledger",
+    "inventory_balances",
+    "ledger_checkpoint_balances",
+    "ledger_checkpoints",
+    "ledger_compacted_balances",
+    "cart_items",
+    "carts",
+    "customer_visits",
+    "sales_by_hour",
+    "catalog_ranking",
+    "processed_orders",
+    "potion_mixes",
+)
+
+INITIAL_GOLD = 100
+INITIAL_ML = 5000
+
+INITIAL_LEDGER = [
+    {'item_type': 'gold', 'item_id': 'N/A', 'change_amount': INITIAL_GOLD, 'description': 'Reset gold to initial state'},
+    {'item_type': 'potion', 'item_id': 'GP-001', 'change_amount': 0, 'description': 'Initial green potion stock'},
+    {'item_type': 'potion', 'item_id': 'RP-001', 'change_amount': 0, 'description': 'Initial red potion stock'},
+    {'item_type': 'potion', 'item_id': 'BP-001', 'change_amount': 0, 'description': 'Initial blue potion stock'},
+    {'item_type': 'ml', 'item_id': 'green', 'change_amount': INITIAL_ML, 'description': 'Initial green ml stock'},
+    {'item_type': 'ml', 'item_id': 'red', 'change_amount': INITIAL_ML, 'description': 'Initial red ml stock'},
+    {'item_type': 'ml', 'item_id': 'blue', 'change_amount': INITIAL_ML, 'description': 'Initial blue ml stock'},
+]
+
+INITIAL_POTION_MIXES = [
+    ('Green Potion', {"green": 100, "red": 0, "blue": 0, "dark": 0}, 'GP-001'),
+    ('Red Potion', {"red": 100, "blue": 0, "dark": 0, "green": 0}, 'RP-001'),
+    ('Blue Potion', {"blue": 100, "red": 0, "dark": 0, "green": 0}, 'BP-001'),
+    ('Purple Potion', {"green": 50, "red": 0, "blue": 50, "dark": 0}, 'PP-001'),
+]
+INITIAL_PRICE = 25
+
+SEED_POTION_MIXES_QUERY = sqlalchemy.text("""
+    INSERT INTO potion_mixes (name, potion_composition, sku, price, inventory_quantity)
+    SELECT name, CAST(composition AS JSONB), sku, :price, 0
+    FROM unnest(
+        CAST(:names AS TEXT[]),
+        CAST(:compositions AS TEXT[]),
+        CAST(:skus AS TEXT[])
+    ) AS m(name, composition, sku)
+""")
+
+RESET_GLOBAL_INVENTORY_QUERY = sqlalchemy.text("""
+    UPDATE global_inventory
+    SET gold = :gold,
+        num_green_potions = 0,
+        num_red_potions = 0,
+        num_blue_potions = 0,
+        num_green_ml = :ml,
+        num_red_ml = :ml,
+        num_blue_ml = :ml
+""")
+
+
+def truncate(connection, tables=GAME_TABLES):
+    connection.execute(sqlalchemy.text(f"TRUNCATE {', '.join(tables)} RESTART IDENTITY"))
+
+
+def reset(connection):
+    """
+    Clear the game tables and seed the starting gold, ml and potion mixes.
+    """
+    truncate(connection)
+    ledger.record_entries(connection, INITIAL_LEDGER)
+    connection.execute(RESET_GLOBAL_INVENTORY_QUERY, {'gold': INITIAL_GOLD, 'ml': INITIAL_ML})
+    names, compositions, skus = zip(*INITIAL_POTION_MIXES)
+    connection.execute(SEED_POTION_MIXES_QUERY, {
+        'names': list(names),
+        'compositions': [json.dumps(composition) for composition in compositions],
+        'skus': list(skus),
+        'price': INITIAL_PRICE,
+    })
+
+
+class SnapshotNotFound(LookupError):
+    def __init__(self, name):
+        super().__init__(f"No snapshot named {name}.")
+        self.name = name
+
+
+# Columns are listed so that a snapshot still restores after a table gains a column
+SNAPSHOT_TABLES = {
+    "potion_mixes": ("potion_id", "name", "potion_composition", "sku", "price", "inventory_quantity"),
+    "capacity_inventory": ("id", "potion_capacity", "ml_capacity", "gold_cost_per_unit"),
+}
+SERIAL_COLUMNS = {"potion_mixes": "potion_id", "capacity_inventory": "id"}
+
+SAVE_SNAPSHOT_QUERY = sqlalchemy.text("""
+    INSERT INTO game_snapshots (name, balances, potion_mixes, capacity_inventory, created_at)
+    VALUES (:name, :balances, :potion_mixes, :capacity_inventory, now())
+    ON CONFLICT (name) DO UPDATE
+    SET balances = EXCLUDED.balances,
+        potion_mixes = EXCLUDED.potion_mixes,
+        capacity_inventory = EXCLUDED.capacity_inventory,
+        created_at = EXCLUDED.created_at
+""")
+
+LOAD_SNAPSHOT_QUERY = sqlalchemy.text("""
+    SELECT balances, potion_mixes, capacity_inventory FROM game_snapshots WHERE name = :name
+""")
+
+LIST_SNAPSHOTS_QUERY = sqlalchemy.text("""
+    SELECT name, created_at, length(balances) + length(potion_mixes) + length(capacity_inventory) AS size
+    FROM game_snapshots
+    ORDER BY name
+""")
+
+
+def _copy_out(connection, sql):
+    buffer = io.StringIO()
+    with connection.connection.driver_connection.cursor() as cursor:
+        cursor.copy_expert(f"COPY {sql} TO STDOUT", buffer)
+    return buffer.getvalue()
+
+
+def _copy_in(connection, sql, data):
+    with connection.connection.driver_connection.cursor() as cursor:
+        cursor.copy_expert(f"COPY {sql} FROM STDIN", io.StringIO(data))
+
+
+def save_snapshot(connection, name):
+    """
+    Dump the balances, potion mixes and capacity under name, replacing any snapshot
+    of the same name. Run on a REPEATABLE READ connection so the dumps agree.
+    """
+    dumps = {
+        'balances': _copy_out(connection, "(SELECT item_type, item_id, balance FROM inventory_balances ORDER BY item_type, item_id)"),
+    }
+    for table, columns in SNAPSHOT_TABLES.items():
+        dumps[table] = _copy_out(connection, f"{table} ({', '.join(columns)})")
+    connection.execute(SAVE_SNAPSHOT_QUERY, {'name': name, **dumps})
+    logging.info(f"Saved game snapshot {name}")
+
+
+def restore_snapshot(connection, name):
+    """
+    Replace the game state with the snapshot saved under name. Orders, visits and
+    ledger history are cleared as by reset; each balance becomes one ledger entry.
+    Raises SnapshotNotFound.
+    """
+    snapshot = connection.execute(LOAD_SNAPSHOT_QUERY, {'name': name}).fetchone()
+    if snapshot is None:
+        raise SnapshotNotFound(name)
+
+    truncate(connection, GAME_TABLES + tuple(table for table in SNAPSHOT_TABLES if table not in GAME_TABLES))
+    for table, columns in SNAPSHOT_TABLES.items():
+        _copy_in(connection, f"{table} ({', '.join(columns)})", getattr(snapshot, table))
+        serial = SERIAL_COLUMNS[table]
+        connection.execute(sqlalchemy.text(
+            f"SELECT setval(pg_get_serial_sequence('{table}', '{serial}'), COALESCE(MAX({serial}), 0) + 1, false) FROM {table}"
+        ))
+
+    # Balances go through the ledger writer's staging table so the ledger and
+    # inventory_balances are written together
+    connection.execute(ledger.CREATE_STAGING_QUERY)
+    _copy_in(connection, "ledger_staging (item_type, item_id, change_amount)", snapshot.balances)
+    connection.execute(sqlalchemy.text("UPDATE ledger_staging SET description = :description"), {
+        'description': f"Restored from snapshot {name}",
+    })
+    connection.execute(ledger.RECORD_STAGED_QUERY)
+    connection.execute(sqlalchemy.text("TRUNCATE ledger_staging"))
+    logging.info(f"Restored game snapshot {name}")
+
+
+def list_snapshots(connection):
+    return [
+        {"name": row.name, "created_at": row.created_at, "size": row.size}
+        for row in connection.execute(LIST_SNAPSHOTS_QUERY)
+    ]
@@ -0,0 +1,67 @@
+import os
+import threading
+import time
+from dataclasses import dataclass
+import sqlalchemy
+
+# Seconds a worker trusts its cached game time before reading game_time again, so
+# ticks posted to another worker are picked up
+GAME_CLOCK_TTL = float(os.environ.get("GAME_CLOCK_TTL", "5"))
+
+
+@dataclass(frozen=True)
+class GameTime:
+    tick_id: int
+    day: str
+    hour: int
+
+
+class GameClock:
+    """
+    The latest game time posted to /info/current_time, kept in memory so checkout
+    and the catalog can tag and look up by game hour without reading game_time.
+
+    post_time sets it after every tick. Other workers reload the last posted row
+    when their copy is older than ttl seconds; until a tick has ever been posted
+    current() is None.
+    """
+
+    def __init__(self, ttl=GAME_CLOCK_TTL, clock=time.monotonic):
+        self.ttl = ttl
+        self.clock = clock
+        self._current = None
+        self._loaded_at = None
+        self._lock = threading.Lock()
+
+    def set(self, tick_id, day, hour):
+        with self._lock:
+            self._current = GameTime(tick_id, day, hour)
+            self._loaded_at = self.clock()
+        return self._current
+
+    def invalidate(self):
+        with self._lock:
+            self._current = None
+            self._loaded_at = None
+
+    def load(self, connection):
+        row = connection.execute(sqlalchemy.text(
+            "SELECT tick_id, day, hour FROM game_time ORDER BY tick_id DESC LIMIT 1"
+        )).fetchone()
+        with self._lock:
+            self._current = GameTime(row.tick_id, row.day, row.hour) if row else None
+            self._loaded_at = self.clock()
+        return self._current
+
+    def current(self, connection=None):
+        """
+        The cached game time. Given a connection, a copy that was never loaded or
+        has expired is read again from game_time.
+        """
+        loaded_at = self._loaded_at
+        if connection is not None and (loaded_at is None or self.clock() - loaded_at > self.ttl):
+            return self.load(connection)
+        return self._current
+
+
+game_clock = GameClock()
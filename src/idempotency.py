@@ -0,0 +1,63 @@
+import hashlib
+import json
+import sqlalchemy
+
+# Delivery endpoints are retried by the game server on timeouts. Each delivery
+# claims its (order_type, order_id) row in processed_orders inside its own
+# transaction, so a retry finds the committed row with one primary key lookup and
+# gets the stored response back instead of applying the delivery twice. A retry
+# racing the original blocks on the key until the original commits or rolls back.
+
+
+class OrderConflict(Exception):
+    """
+    Raised when an order id is reused with a different payload.
+    """
+
+    def __init__(self, order_type, order_id):
+        super().__init__(f"{order_type} order {order_id} was already processed with a different payload.")
+        self.order_type = order_type
+        self.order_id = order_id
+
+
+CLAIM_ORDER_QUERY = sqlalchemy.text("""
+    INSERT INTO processed_orders (order_type, order_id, request_hash, response, processed_at)
+    VALUES (:order_type, :order_id, :request_hash, CAST(:response AS JSONB), now())
+    ON CONFLICT (order_type, order_id) DO NOTHING
+    RETURNING order_id
+""")
+
+PROCESSED_ORDER_QUERY = sqlalchemy.text("""
+    SELECT request_hash, response FROM processed_orders
+    WHERE order_type = :order_type AND order_id = :order_id
+""")
+
+
+def request_hash(payload):
+    """
+    Stable hash of a JSON-serializable request payload.
+    """
+    return hashlib.sha1(json.dumps(payload, sort_keys=True, separators=(",", ":"), default=str).encode()).hexdigest()
+
+
+def claim_order(connection, order_type, order_id, payload, response):
+    """
+    Record the order as processed with the response it will return. Returns None
+    for a new order, which the caller then applies in the same transaction, or the
+    stored response for an order that was already processed.
+    Raises OrderConflict if the order id was used with a different payload.
+    """
+    digest = request_hash(payload)
+    claimed = connection.execute(CLAIM_ORDER_QUERY, {
+        'order_type': order_type,
+        'order_id': order_id,
+        'request_hash': digest,
+        'response': json.dumps(response),
+    }).scalar()
+    if claimed is not None:
+        return None
+
+    previous = connection.execute(PROCESSED_ORDER_QUERY, {'order_type': order_type, 'order_id': order_id}).fetchone()
+    if previous.request_hash != digest:
+        raise OrderConflict(order_type, order_id)
+    return previous.response
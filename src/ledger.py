@@ -0,0 +1,527 @@
+import argparse
+import datetime
+import io
+import logging
+import os
+import re
+import sqlalchemy
+from src import database as db
+
+# Every write to inventory_ledger goes through LedgerWriter (or record_entries) so
+# that inventory_balances always holds the running total for each (item_type, item_id).
+# Readers use the balance table instead of re-aggregating the whole ledger.
+#
+# Rows are stamped with now(), the transaction start time, so every entry written by
+# one request carries the same timestamp.
+#
+# inventory_ledger is partitioned by day on date. The "ledger" scheduler job creates
+# the partitions ahead of time and compacts the ones older than LEDGER_RETENTION_DAYS:
+# their totals are added to ledger_compacted_balances, one row per item, and the
+# partition is detached into the ledger_archive schema. Re-derived balances add the
+# compacted totals back, so they stay identical to the full history.
+
+# Flushes at least this large are sent with COPY instead of array parameters
+COPY_THRESHOLD = 5000
+
+APPLY_BALANCES_SQL = """
+    INSERT INTO inventory_balances (item_type, item_id, balance, updated_at)
+    SELECT item_type, item_id, SUM(change_amount), now()
+    FROM entries
+    GROUP BY item_type, item_id
+    ORDER BY item_type, item_id
+    ON CONFLICT (item_type, item_id) DO UPDATE
+    SET balance = inventory_balances.balance + EXCLUDED.balance,
+        updated_at = EXCLUDED.updated_at
+"""
+
+RECORD_ENTRIES_QUERY = sqlalchemy.text("""
+    WITH entries AS (
+        SELECT *
+        FROM unnest(
+            CAST(:item_types AS TEXT[]),
+            CAST(:item_ids AS TEXT[]),
+            CAST(:change_amounts AS INTEGER[]),
+            CAST(:descriptions AS TEXT[])
+        ) AS e(item_type, item_id, change_amount, description)
+    ),
+    inserted AS (
+        INSERT INTO inventory_ledger (item_type, item_id, change_amount, description, date)
+        SELECT item_type, item_id, change_amount, description, now()
+        FROM entries
+    )
+""" + APPLY_BALANCES_SQL)
+
+CREATE_STAGING_QUERY = sqlalchemy.text("""
+    CREATE TEMP TABLE IF NOT EXISTS ledger_staging (
+        item_type TEXT,
+        item_id TEXT,
+        change_amount INTEGER,
+        description TEXT
+    ) ON COMMIT DELETE ROWS
+""")
+
+RECORD_STAGED_QUERY = sqlalchemy.text("""
+    WITH entries AS (
+        SELECT item_type, item_id, change_amount, description FROM ledger_staging
+    ),
+    inserted AS (
+        INSERT INTO inventory_ledger (item_type, item_id, change_amount, description, date)
+        SELECT item_type, item_id, change_amount, description, now()
+        FROM entries
+    )
+""" + APPLY_BALANCES_SQL)
+
+
+class LedgerWriter:
+    """
+    Buffers ledger entries for one transaction and writes them, together with the
+    balance updates, in a single statement on flush(). Large flushes go through
+    COPY when the connection is psycopg2.
+
+        with ledger.LedgerWriter(connection) as writer:
+            writer.add('gold', 'N/A', -100, 'barrel purchase')
+            writer.add('ml', 'red', 2500, 'barrel delivery')
+    """
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.entries = []
+
+    def add(self, item_type, item_id, change_amount, description):
+        self.entries.append((item_type, item_id, int(change_amount), description))
+        return self
+
+    def extend(self, entries):
+        for entry in entries:
+            self.add(entry['item_type'], entry['item_id'], entry['change_amount'], entry['description'])
+        return self
+
+    def flush(self):
+        if not self.entries:
+            return 0
+        entries, self.entries = self.entries, []
+        if len(entries) >= COPY_THRESHOLD and self._supports_copy():
+            self._flush_copy(entries)
+        else:
+            item_types, item_ids, change_amounts, descriptions = (list(column) for column in zip(*entries))
+            self.connection.execute(RECORD_ENTRIES_QUERY, {
+                'item_types': item_types,
+                'item_ids': item_ids,
+                'change_amounts': change_amounts,
+                'descriptions': descriptions,
+            })
+        return len(entries)
+
+    def _supports_copy(self):
+        # COPY FROM STDIN needs psycopg2's copy_expert; asyncpg connections use arrays
+        driver_connection = self.connection.connection.driver_connection
+        return type(driver_connection).__module__.startswith("psycopg2")
+
+    def _flush_copy(self, entries):
+        self.connection.execute(CREATE_STAGING_QUERY)
+        buffer = io.StringIO()
+        for item_type, item_id, change_amount, description in entries:
+            buffer.write(f"{_copy_text(item_type)}\t{_copy_text(item_id)}\t{change_amount}\t{_copy_text(description)}\n")
+        buffer.seek(0)
+        with self.connection.connection.driver_connection.cursor() as cursor:
+            cursor.copy_expert("COPY ledger_staging (item_type, item_id, change_amount, description) FROM STDIN", buffer)
+        self.connection.execute(RECORD_STAGED_QUERY)
+        self.connection.execute(sqlalchemy.text("TRUNCATE ledger_staging"))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.flush()
+
+
+def _copy_text(value):
+    if value is None:
+        return "\\N"
+    return str(value).replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n").replace("\r", "\\r")
+
+
+def record_entries(connection, entries):
+    """
+    Insert ledger entries and apply them to inventory_balances in one statement.
+    Must be called inside the caller's transaction so both tables commit together.
+    Each entry is a dict with item_type, item_id, change_amount and description.
+    """
+    LedgerWriter(connection).extend(entries).flush()
+
+
+def get_balance(connection, item_type, item_id):
+    """
+    Current balance of a single item, 0 if it has never been recorded.
+    """
+    balance = connection.execute(sqlalchemy.text("""
+        SELECT balance FROM inventory_balances
+        WHERE item_type = :item_type AND item_id = :item_id
+    """), {'item_type': item_type, 'item_id': item_id}).scalar()
+    return balance or 0
+
+
+def get_gold(connection):
+    return get_balance(connection, 'gold', 'N/A')
+
+
+class InsufficientGold(Exception):
+    """
+    Raised by spend_gold when the balance can't cover the amount.
+    """
+
+    def __init__(self, balance, amount):
+        super().__init__(f"Not enough gold: have {balance}, need {amount}.")
+        self.balance = balance
+        self.amount = amount
+
+
+LOCK_GOLD_QUERY = sqlalchemy.text("""
+    SELECT balance FROM inventory_balances
+    WHERE item_type = 'gold' AND item_id = 'N/A'
+    FOR UPDATE
+""")
+
+
+def lock_gold(connection):
+    """
+    Current gold balance, with its balance row locked until the transaction ends so
+    no other transaction can spend the same gold in between. Gold sorts first in
+    (item_type, item_id) order, so take this lock before any other balance rows.
+    """
+    return connection.execute(LOCK_GOLD_QUERY).scalar() or 0
+
+
+LOCK_BALANCES_QUERY = sqlalchemy.text("""
+    SELECT item_id, balance FROM inventory_balances
+    WHERE item_type = :item_type AND item_id = ANY(:item_ids)
+    ORDER BY item_id
+    FOR UPDATE
+""")
+
+
+def lock_balances(connection, item_type, item_ids):
+    """
+    Current balances of item_ids keyed by item_id (0 for items with no row), their
+    rows locked in item_id order until the transaction ends. Call lock_gold first
+    when the transaction also needs gold.
+    """
+    balances = dict.fromkeys(item_ids, 0)
+    rows = connection.execute(LOCK_BALANCES_QUERY, {'item_type': item_type, 'item_ids': sorted(item_ids)})
+    for row in rows:
+        balances[row.item_id] = row.balance
+    return balances
+
+
+def spend_gold(connection, amount, description, writer=None):
+    """
+    Debit amount gold if the balance covers it, atomically with respect to every
+    other spender. The debit goes through writer when given (and is flushed with the
+    rest of its entries), otherwise it is written immediately.
+    Raises InsufficientGold without writing anything; returns the balance left.
+    """
+    amount = int(amount)
+    balance = lock_gold(connection)
+    if amount > balance:
+        raise InsufficientGold(balance, amount)
+    if amount:
+        if writer is None:
+            LedgerWriter(connection).add('gold', 'N/A', -amount, description).flush()
+        else:
+            writer.add('gold', 'N/A', -amount, description)
+    return balance - amount
+
+
+def get_balances(connection, item_type=None):
+    """
+    Current balances keyed by item_type then item_id, optionally limited to one item_type.
+    """
+    rows = connection.execute(sqlalchemy.text("""
+        SELECT item_type, item_id, balance FROM inventory_balances
+        WHERE (CAST(:item_type AS TEXT) IS NULL OR item_type = :item_type)
+    """), {'item_type': item_type}).fetchall()
+    balances = {}
+    for row in rows:
+        balances.setdefault(row.item_type, {})[row.item_id] = row.balance
+    if item_type is not None:
+        return balances.get(item_type, {})
+    return balances
+
+
+def create_checkpoint(connection):
+    """
+    Snapshot inventory_balances together with the last ledger id it covers, so balances
+    can be re-derived by replaying only the ledger rows written after the checkpoint.
+    """
+    # Writers update inventory_balances inside their transaction; this lock waits for
+    # them to commit and holds new ones off until the snapshot is taken.
+    connection.execute(sqlalchemy.text("LOCK TABLE inventory_balances IN EXCLUSIVE MODE"))
+    checkpoint_id = connection.execute(sqlalchemy.text("""
+        INSERT INTO ledger_checkpoints (last_ledger_id, created_at)
+        SELECT COALESCE(MAX(id), 0), now() FROM inventory_ledger
+        RETURNING checkpoint_id
+    """)).scalar()
+    connection.execute(sqlalchemy.text("""
+        INSERT INTO ledger_checkpoint_balances (checkpoint_id, item_type, item_id, balance)
+        SELECT :checkpoint_id, item_type, item_id, balance FROM inventory_balances
+    """), {'checkpoint_id': checkpoint_id})
+    logging.info(f"Created ledger checkpoint {checkpoint_id}")
+    return checkpoint_id
+
+
+# Ledger rows written since the last checkpoint before the scheduler takes another
+CHECKPOINT_EVERY = int(os.environ.get("LEDGER_CHECKPOINT_EVERY", "10000"))
+
+
+def checkpoint_if_due(connection, every=CHECKPOINT_EVERY):
+    """
+    Scheduler job: take a checkpoint once `every` ledger rows have been written
+    since the last one, so a checked replay never has to cover more than that.
+    Returns the new checkpoint id or None.
+    """
+    behind = connection.execute(sqlalchemy.text("""
+        SELECT COALESCE((SELECT MAX(id) FROM inventory_ledger), 0)
+             - COALESCE((SELECT MAX(last_ledger_id) FROM ledger_checkpoints), 0)
+    """)).scalar()
+    if behind < every:
+        return None
+    return create_checkpoint(connection)
+
+
+DERIVED_BALANCES_QUERY = sqlalchemy.text("""
+    WITH checkpoint AS (
+        SELECT checkpoint_id, last_ledger_id FROM ledger_checkpoints
+        WHERE :full_replay = FALSE
+        ORDER BY checkpoint_id DESC
+        LIMIT 1
+    ),
+    derived AS (
+        SELECT cb.item_type, cb.item_id, cb.balance AS amount
+        FROM ledger_checkpoint_balances cb
+        JOIN checkpoint c ON cb.checkpoint_id = c.checkpoint_id
+        UNION ALL
+        -- Compaction checkpoints first, so a checkpoint already includes compacted rows
+        SELECT item_type, item_id, balance
+        FROM ledger_compacted_balances
+        WHERE NOT EXISTS (SELECT 1 FROM checkpoint)
+        UNION ALL
+        SELECT item_type, item_id, change_amount
+        FROM inventory_ledger
+        WHERE id > COALESCE((SELECT last_ledger_id FROM checkpoint), 0)
+    )
+    SELECT item_type, item_id, SUM(amount) AS balance
+    FROM derived
+    GROUP BY item_type, item_id
+""")
+
+
+def derive_balances(connection, full_replay=False):
+    """
+    Re-derive balances from the raw ledger, starting from the latest checkpoint unless
+    full_replay is set. A full replay starts from the compacted totals.
+    """
+    rows = connection.execute(DERIVED_BALANCES_QUERY, {'full_replay': full_replay}).fetchall()
+    return {(row.item_type, row.item_id): row.balance for row in rows}
+
+
+def check_consistency(connection, full_replay=False):
+    """
+    Compare inventory_balances with balances re-derived from the ledger.
+    Returns a list of (item_type, item_id, stored, derived) for every mismatch.
+    """
+    derived = derive_balances(connection, full_replay)
+    stored = {
+        (row.item_type, row.item_id): row.balance
+        for row in connection.execute(sqlalchemy.text(
+            "SELECT item_type, item_id, balance FROM inventory_balances"
+        ))
+    }
+    mismatches = []
+    for key in sorted(set(derived) | set(stored)):
+        if (stored.get(key) or 0) != (derived.get(key) or 0):
+            mismatches.append((key[0], key[1], stored.get(key), derived.get(key)))
+    return mismatches
+
+
+def rebuild_balances(connection):
+    """
+    Replace inventory_balances with totals aggregated from the full ledger.
+    """
+    connection.execute(sqlalchemy.text("LOCK TABLE inventory_balances IN EXCLUSIVE MODE"))
+    connection.execute(sqlalchemy.text("DELETE FROM inventory_balances"))
+    connection.execute(sqlalchemy.text("""
+        INSERT INTO inventory_balances (item_type, item_id, balance, updated_at)
+        SELECT item_type, item_id, SUM(amount), now()
+        FROM (
+            SELECT item_type, item_id, balance AS amount FROM ledger_compacted_balances
+            UNION ALL
+            SELECT item_type, item_id, change_amount FROM inventory_ledger
+        ) history
+        GROUP BY item_type, item_id
+    """))
+
+
+# Days of ledger history kept in inventory_ledger; older partitions are compacted
+LEDGER_RETENTION_DAYS = int(os.environ.get("LEDGER_RETENTION_DAYS", "30"))
+# Days of partitions created ahead of today
+PARTITIONS_AHEAD = 3
+
+PARTITION_NAME = re.compile(r"^inventory_ledger_p(\d{8})$")
+
+LEDGER_PARTITIONS_QUERY = sqlalchemy.text("""
+    SELECT c.relname
+    FROM pg_inherits i
+    JOIN pg_class c ON c.oid = i.inhrelid
+    WHERE i.inhparent = 'inventory_ledger'::regclass
+""")
+
+COMPACT_PARTITION_SQL = """
+    INSERT INTO ledger_compacted_balances (item_type, item_id, balance, compacted_through, updated_at)
+    SELECT item_type, item_id, SUM(change_amount), CAST(:compacted_through AS DATE), now()
+    FROM {partition}
+    GROUP BY item_type, item_id
+    ORDER BY item_type, item_id
+    ON CONFLICT (item_type, item_id) DO UPDATE
+    SET balance = ledger_compacted_balances.balance + EXCLUDED.balance,
+        compacted_through = GREATEST(ledger_compacted_balances.compacted_through, EXCLUDED.compacted_through),
+        updated_at = EXCLUDED.updated_at
+"""
+
+
+def partition_name(day):
+    return f"inventory_ledger_p{day:%Y%m%d}"
+
+
+def ledger_partitions(connection):
+    """
+    Daily partitions currently attached to inventory_ledger, keyed by day.
+    """
+    partitions = {}
+    for row in connection.execute(LEDGER_PARTITIONS_QUERY):
+        match = PARTITION_NAME.match(row.relname)
+        if match:
+            partitions[datetime.datetime.strptime(match.group(1), "%Y%m%d").date()] = row.relname
+    return partitions
+
+
+def create_partition(connection, day):
+    """
+    Attach the partition for one day, moving in any of its rows that landed in the
+    default partition while it didn't exist.
+    """
+    name = partition_name(day)
+    bounds = {'start': day, 'end': day + datetime.timedelta(days=1)}
+    connection.execute(sqlalchemy.text(
+        f"CREATE TABLE IF NOT EXISTS {name} (LIKE inventory_ledger INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"
+    ))
+    connection.execute(sqlalchemy.text(f"""
+        WITH moved AS (
+            DELETE FROM inventory_ledger_default
+            WHERE date >= CAST(:start AS TIMESTAMP) AND date < CAST(:end AS TIMESTAMP)
+            RETURNING id, item_type, item_id, change_amount, current_total, description, date
+        )
+        INSERT INTO {name} (id, item_type, item_id, change_amount, current_total, description, date)
+        SELECT * FROM moved
+    """), bounds)
+    # Bounds are dates from the partition name, never user input
+    connection.execute(sqlalchemy.text(
+        f"ALTER TABLE inventory_ledger ATTACH PARTITION {name} "
+        f"FOR VALUES FROM ('{bounds['start']}') TO ('{bounds['end']}')"
+    ))
+    return name
+
+
+def ensure_partitions(connection, today=None, ahead=PARTITIONS_AHEAD):
+    """
+    Create the daily partitions from the oldest row in the default partition through
+    `ahead` days after today. Returns the names of the partitions created.
+    """
+    today = today or datetime.date.today()
+    oldest = connection.execute(sqlalchemy.text(
+        "SELECT CAST(MIN(date) AS DATE) FROM inventory_ledger_default"
+    )).scalar()
+    existing = ledger_partitions(connection)
+    day = min(oldest, today) if oldest else today
+    created = []
+    while day <= today + datetime.timedelta(days=ahead):
+        if day not in existing:
+            created.append(create_partition(connection, day))
+        day += datetime.timedelta(days=1)
+    return created
+
+
+def compact_ledger(connection, retention_days=LEDGER_RETENTION_DAYS, today=None):
+    """
+    Fold every daily partition older than retention_days into ledger_compacted_balances
+    and detach it into the ledger_archive schema. Returns the days compacted.
+    """
+    today = today or datetime.date.today()
+    cutoff = today - datetime.timedelta(days=retention_days)
+    expired = sorted((day, name) for day, name in ledger_partitions(connection).items() if day < cutoff)
+    if not expired:
+        return []
+
+    # Derived balances start from the latest checkpoint and replay the ledger after it,
+    # so the checkpoint must cover every row about to leave the ledger.
+    last_checkpointed = connection.execute(sqlalchemy.text(
+        "SELECT COALESCE(MAX(last_ledger_id), 0) FROM ledger_checkpoints"
+    )).scalar()
+    newest_expired = connection.execute(sqlalchemy.text(
+        "SELECT COALESCE(MAX(id), 0) FROM inventory_ledger WHERE date < CAST(:cutoff AS TIMESTAMP)"
+    ), {'cutoff': cutoff}).scalar()
+    if newest_expired > last_checkpointed:
+        create_checkpoint(connection)
+
+    for day, name in expired:
+        connection.execute(sqlalchemy.text(COMPACT_PARTITION_SQL.format(partition=name)), {'compacted_through': day})
+        connection.execute(sqlalchemy.text(f"ALTER TABLE inventory_ledger DETACH PARTITION {name}"))
+        connection.execute(sqlalchemy.text(f"ALTER TABLE {name} SET SCHEMA ledger_archive"))
+        logging.info(f"Compacted ledger partition {name} into ledger_compacted_balances")
+    return [day for day, _ in expired]
+
+
+def maintain_ledger(connection):
+    """
+    Scheduler job: create upcoming partitions and compact expired ones.
+    """
+    ensure_partitions(connection)
+    return len(compact_ledger(connection))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Maintain the inventory_balances table.")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    check = subcommands.add_parser("check", help="Compare balances against the ledger.")
+    check.add_argument("--full", action="store_true", help="Replay the whole ledger instead of starting at the last checkpoint.")
+    check.add_argument("--repair", action="store_true", help="Rebuild balances from the full ledger if they differ.")
+    subcommands.add_parser("checkpoint", help="Snapshot the current balances.")
+    compact = subcommands.add_parser("compact", help="Create partitions and compact ones past the retention window.")
+    compact.add_argument("--retention-days", type=int, default=LEDGER_RETENTION_DAYS)
+    args = parser.parse_args(argv)
+
+    with db.engine.begin() as connection:
+        if args.command == "checkpoint":
+            print(f"Created checkpoint {create_checkpoint(connection)}")
+            return 0
+        if args.command == "compact":
+            created = ensure_partitions(connection)
+            compacted = compact_ledger(connection, retention_days=args.retention_days)
+            print(f"Created {len(created)} partitions, compacted {len(compacted)}")
+            return 0
+
+        mismatches = check_consistency(connection, full_replay=args.full)
+        for item_type, item_id, stored, derived in mismatches:
+            print(f"{item_type}/{item_id}: stored={stored} derived={derived}")
+        if not mismatches:
+            print("Balances are consistent with the ledger.")
+            return 0
+        if args.repair:
+            rebuild_balances(connection)
+            print("Rebuilt balances from the full ledger.")
+            return 0
+        return 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
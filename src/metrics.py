@@ -0,0 +1,234 @@
+import contextvars
+import logging
+import os
+import threading
+import time
+from sqlalchemy import event
+
+# Per-request timing and query counts. The HTTP middleware in server.py opens a
+# RequestStats for each request; SQLAlchemy cursor events on the engines add every
+# statement run while it is current. Totals per route are kept in `registry` and
+# served in the Prometheus text format from /admin/metrics, together with the
+# run counts and durations of the scheduler's jobs.
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100)
+JOB_DURATION_BUCKETS = (0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0)
+
+
+def query_warn_threshold():
+    """
+    QUERY_WARN_THRESHOLD=n logs a warning for every request that runs more than n
+    queries, the usual sign of an N+1 loop. 0 (the default) turns the warning off.
+    """
+    return int(os.environ.get("QUERY_WARN_THRESHOLD", "0"))
+
+
+class RequestStats:
+    __slots__ = ("queries", "db_seconds", "rows")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.rows = 0
+
+
+_current_request = contextvars.ContextVar("current_request", default=None)
+
+
+def start_request():
+    """
+    Make a fresh RequestStats current; returns it with the token for end_request.
+    Starlette copies the context into the thread pool, so sync endpoints count too.
+    """
+    stats = RequestStats()
+    return stats, _current_request.set(stats)
+
+
+def end_request(token):
+    _current_request.reset(token)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current_request.get() is not None:
+        context._metrics_start = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _current_request.get()
+    start = getattr(context, "_metrics_start", None)
+    if stats is None or start is None:
+        return
+    stats.queries += 1
+    stats.db_seconds += time.perf_counter() - start
+    # rows returned by a SELECT, rows affected by DML; -1 (unknown) counts as 0
+    stats.rows += max(cursor.rowcount or 0, 0)
+
+
+def instrument_engine(engine):
+    """
+    Count and time every statement the engine runs. Async engines are instrumented
+    through their sync_engine.
+    """
+    engine = getattr(engine, "sync_engine", engine)
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    return engine
+
+
+def _histogram(buckets):
+    return [0] * (len(buckets) + 1)
+
+
+def _observe(counts, buckets, value):
+    for i, bound in enumerate(buckets):
+        if value <= bound:
+            counts[i] += 1
+            return
+    counts[-1] += 1
+
+
+class RouteMetrics:
+    def __init__(self):
+        self.statuses = {}
+        self.latency = _histogram(LATENCY_BUCKETS)
+        self.latency_sum = 0.0
+        self.query_counts = _histogram(QUERY_COUNT_BUCKETS)
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.rows = 0
+        self.warnings = 0
+
+
+class JobMetrics:
+    def __init__(self):
+        self.statuses = {}
+        self.duration = _histogram(JOB_DURATION_BUCKETS)
+        self.duration_sum = 0.0
+
+
+class MetricsRegistry:
+    """
+    Totals per (method, route template). Routes come from the app's route table,
+    so the number of series stays bounded. Scheduler jobs are kept per job name.
+    """
+
+    def __init__(self):
+        self._routes = {}
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def observe(self, method, route, status, seconds, stats):
+        threshold = query_warn_threshold()
+        warn = threshold > 0 and stats.queries > threshold
+        if warn:
+            logging.warning(
+                f"{method} {route} ran {stats.queries} queries (threshold {threshold}); possible N+1"
+            )
+        with self._lock:
+            metrics = self._routes.get((method, route))
+            if metrics is None:
+                metrics = self._routes[(method, route)] = RouteMetrics()
+            metrics.statuses[status] = metrics.statuses.get(status, 0) + 1
+            _observe(metrics.latency, LATENCY_BUCKETS, seconds)
+            metrics.latency_sum += seconds
+            _observe(metrics.query_counts, QUERY_COUNT_BUCKETS, stats.queries)
+            metrics.queries += stats.queries
+            metrics.db_seconds += stats.db_seconds
+            metrics.rows += stats.rows
+            metrics.warnings += warn
+
+    def observe_job(self, job, status, seconds):
+        with self._lock:
+            metrics = self._jobs.get(job)
+            if metrics is None:
+                metrics = self._jobs[job] = JobMetrics()
+            metrics.statuses[status] = metrics.statuses.get(status, 0) + 1
+            if status != "skipped":
+                _observe(metrics.duration, JOB_DURATION_BUCKETS, seconds)
+                metrics.duration_sum += seconds
+
+    def reset(self):
+        with self._lock:
+            self._routes = {}
+            self._jobs = {}
+
+    def render(self):
+        """
+        All metrics in the Prometheus text exposition format.
+        """
+        with self._lock:
+            routes = sorted(self._routes.items())
+            jobs = sorted(self._jobs.items())
+            lines = []
+
+            def header(name, kind, help_text):
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+
+            def histogram(name, labels, counts, buckets, total):
+                cumulative = 0
+                for bound, count in zip(buckets, counts):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+                cumulative += counts[-1]
+                lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {cumulative}')
+                lines.append(f"{name}_sum{{{labels}}} {total}")
+                lines.append(f"{name}_count{{{labels}}} {cumulative}")
+
+            header("http_requests_total", "counter", "Requests served, by route and status code.")
+            for (method, route), metrics in routes:
+                for status, count in sorted(metrics.statuses.items()):
+                    lines.append(f'http_requests_total{{{_labels(method, route)},status="{status}"}} {count}')
+
+            header("http_request_duration_seconds", "histogram", "Request latency, by route.")
+            for (method, route), metrics in routes:
+                histogram("http_request_duration_seconds", _labels(method, route), metrics.latency, LATENCY_BUCKETS, metrics.latency_sum)
+
+            header("db_queries_per_request", "histogram", "SQL statements run per request, by route.")
+            for (method, route), metrics in routes:
+                histogram("db_queries_per_request", _labels(method, route), metrics.query_counts, QUERY_COUNT_BUCKETS, metrics.queries)
+
+            for name, attribute, help_text in (
+                ("db_queries_total", "queries", "SQL statements run, by route."),
+                ("db_query_duration_seconds_total", "db_seconds", "Time spent executing SQL, by route."),
+                ("db_rows_total", "rows", "Rows returned or affected by SQL, by route."),
+                ("db_query_count_warnings_total", "warnings", "Requests over QUERY_WARN_THRESHOLD queries, by route."),
+            ):
+                header(name, "counter", help_text)
+                for (method, route), metrics in routes:
+                    lines.append(f"{name}{{{_labels(method, route)}}} {getattr(metrics, attribute)}")
+
+            header("scheduler_job_runs_total", "counter", "Scheduled job runs, by job and outcome.")
+            for job, metrics in jobs:
+                for status, count in sorted(metrics.statuses.items()):
+                    lines.append(f'scheduler_job_runs_total{{job="{_label_value(job)}",status="{status}"}} {count}')
+
+            header("scheduler_job_duration_seconds", "histogram", "Duration of scheduled jobs that ran, by job.")
+            for job, metrics in jobs:
+                histogram("scheduler_job_duration_seconds", f'job="{_label_value(job)}"', metrics.duration, JOB_DURATION_BUCKETS, metrics.duration_sum)
+
+        return "\n".join(lines) + "\n"
+
+
+def _label_value(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(method, route):
+    return f'method="{_label_value(method)}",route="{_label_value(route)}"'
+
+
+def route_template(app, scope):
+    """
+    The path template of the route that handled the request (e.g. /carts/{cart_id}/checkout),
+    found by the endpoint the router stored in the scope.
+    """
+    endpoint = scope.get("endpoint")
+    for route in app.routes:
+        if getattr(route, "endpoint", None) is endpoint and endpoint is not None:
+            return route.path
+    return "unmatched"
+
+
+registry = MetricsRegistry()
@@ -0,0 +1,41 @@
+import base64
+import datetime
+import json
+
+# Keyset pagination cursors: an opaque token holding the sort value and id of the
+# row at the edge of the current page, plus which way to page from there. The token
+# also records the sort it was issued for, so it can't be replayed under another.
+
+NEXT = "next"
+PREVIOUS = "prev"
+
+
+def encode_cursor(sort_col, sort_order, sort_value, row_id, direction):
+    if isinstance(sort_value, (datetime.datetime, datetime.date)):
+        sort_value = sort_value.isoformat()
+    payload = json.dumps([sort_col, sort_order, sort_value, row_id, direction], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip("=")
+
+
+def decode_cursor(token, sort_col, sort_order):
+    """
+    Returns (sort_value, row_id, direction). Raises ValueError for a malformed token
+    or one issued for a different sort column or order.
+    """
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        token_col, token_order, sort_value, row_id, direction = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except Exception as e:
+        raise ValueError(f"Invalid page token: {token!r}") from e
+    if direction not in (NEXT, PREVIOUS) or not isinstance(row_id, int) or isinstance(row_id, bool):
+        raise ValueError(f"Invalid page token: {token!r}")
+    if (token_col, token_order) != (sort_col, sort_order):
+        raise ValueError(f"Page token was issued for sort {token_col} {token_order}, not {sort_col} {sort_order}.")
+    return sort_value, row_id, direction
+
+
+def escape_like(value):
+    """
+    Escape LIKE wildcards so user input only matches literally.
+    """
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
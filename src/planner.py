@@ -0,0 +1,115 @@
+import numpy as np
+
+# Pure planning functions: callers load the inputs from the database once and
+# pass them in as arrays, so these can be tested and benchmarked without Postgres.
+
+
+def max_producible(compositions, ml_available):
+    """
+    How many potions of each mix could be bottled from ml_available on its own.
+    compositions is an (n, 4) array of [r, g, b, d] ml per potion.
+    """
+    compositions = np.asarray(compositions, dtype=np.int64)
+    ml_available = np.maximum(np.asarray(ml_available, dtype=np.int64), 0)
+    uses = compositions > 0
+    per_color = np.where(uses, ml_available // np.maximum(compositions, 1), np.iinfo(np.int64).max)
+    producible = per_color.min(axis=1)
+    # A mix that uses no liquid at all can't be bottled
+    producible[~uses.any(axis=1)] = 0
+    return producible
+
+
+def plan_bottles(compositions, prices, ml_available, max_potions):
+    """
+    Decide how many potions of each mix to bottle without using more ml of any
+    color than is available or more potions than max_potions.
+
+    Greedy in rounds: every round hands the remaining potion slots to the mixes
+    that can still be made, in proportion to their price and highest price first,
+    so expensive mixes get more bottles while cheaper ones still get some.
+    Returns an integer array of bottle counts, one per mix.
+    """
+    compositions = np.asarray(compositions, dtype=np.int64).reshape(-1, 4)
+    prices = np.maximum(np.asarray(prices, dtype=float), 0)
+    remaining = np.maximum(np.asarray(ml_available, dtype=np.int64), 0)
+    counts = np.zeros(len(compositions), dtype=np.int64)
+    slots = max(0, int(max_potions))
+    order = np.argsort(-prices, kind="stable")
+
+    while slots > 0:
+        producible = max_producible(compositions, remaining)
+        feasible = order[producible[order] > 0]
+        if feasible.size == 0:
+            break
+
+        weights = prices[feasible] + 1
+        shares = np.maximum(1, (slots * weights / weights.sum()).astype(np.int64))
+        progress = False
+        for mix, share in zip(feasible, shares):
+            quantity = min(int(share), slots, int(max_producible(compositions[mix:mix + 1], remaining)[0]))
+            if quantity <= 0:
+                continue
+            counts[mix] += quantity
+            remaining -= quantity * compositions[mix]
+            slots -= quantity
+            progress = True
+            if slots == 0:
+                break
+        if not progress:
+            break
+
+    return counts
+
+
+def color_demand(compositions, ml_available, ml_capacity):
+    """
+    How much ml of each color to buy: the ml capacity is split across colors in
+    proportion to how much of each color the potion mixes use, minus what's on hand.
+    """
+    usage = np.asarray(compositions, dtype=float).reshape(-1, 4).sum(axis=0)
+    if usage.sum() == 0:
+        usage = np.ones(4)
+    targets = np.floor(max(0, ml_capacity) * usage / usage.sum())
+    return np.maximum(targets - np.asarray(ml_available, dtype=float), 0).astype(np.int64)
+
+
+def plan_barrels(ml_per_barrel, prices, quantities, colors, gold, ml_capacity_free, demand):
+    """
+    Pick how many of each offered barrel to buy in one pass, cheapest price per ml
+    first, without spending more than gold, storing more than ml_capacity_free,
+    buying more than is offered, or buying a color past its demand by more than
+    one barrel. colors holds the color index (0-3) of each barrel.
+    Returns an integer array of barrel counts, one per offered barrel.
+    """
+    ml_per_barrel = np.asarray(ml_per_barrel, dtype=np.int64)
+    prices = np.asarray(prices, dtype=np.int64)
+    quantities = np.maximum(np.asarray(quantities, dtype=np.int64), 0)
+    colors = np.asarray(colors, dtype=np.int64)
+    demand = np.asarray(demand, dtype=np.int64).copy()
+    counts = np.zeros(len(prices), dtype=np.int64)
+
+    valid = (ml_per_barrel > 0) & (prices > 0) & (quantities > 0)
+    price_per_ml = np.where(valid, prices / np.maximum(ml_per_barrel, 1), np.inf)
+    order = np.argsort(price_per_ml, kind="stable")
+
+    gold = max(0, int(gold))
+    capacity = max(0, int(ml_capacity_free))
+    for i in order:
+        if not valid[i]:
+            break
+        color = colors[i]
+        if demand[color] <= 0:
+            continue
+        ml = int(ml_per_barrel[i])
+        wanted = -(-int(demand[color]) // ml)
+        count = min(int(quantities[i]), gold // int(prices[i]), capacity // ml, wanted)
+        if count <= 0:
+            continue
+        counts[i] = count
+        gold -= count * int(prices[i])
+        capacity -= count * ml
+        demand[color] -= count * ml
+        if gold <= 0 or capacity <= 0:
+            break
+
+    return counts
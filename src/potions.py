@@ -0,0 +1,76 @@
+import json
+import threading
+import sqlalchemy
+
+# Order of the colors in the APISpec potion_type array: [r, g, b, d]
+COLORS = ("red", "green", "blue", "dark")
+
+
+def composition_to_potion_type(potion_composition):
+    """
+    Convert a potion_mixes.potion_composition value (dict or JSON string) into [r, g, b, d].
+    """
+    if isinstance(potion_composition, str):
+        potion_composition = json.loads(potion_composition)
+    return [int(potion_composition.get(color, 0)) for color in COLORS]
+
+
+def potion_type_to_composition(potion_type):
+    """
+    Convert an APISpec [r, g, b, d] array into a potion_composition dict.
+    """
+    return {color: int(amount) for color, amount in zip(COLORS, potion_type)}
+
+
+class CompositionIndex:
+    """
+    In-memory map from normalized (r, g, b, d) tuples to potion_mixes SKUs.
+
+    Loaded from the database on first use and dropped by invalidate() whenever
+    potion_mixes changes. A lookup miss reloads once, so mixes added by another
+    process are still found.
+    """
+
+    def __init__(self):
+        self._index = None
+        self._lock = threading.Lock()
+
+    def invalidate(self):
+        with self._lock:
+            self._index = None
+
+    def load(self, connection):
+        rows = connection.execute(sqlalchemy.text(
+            "SELECT sku, potion_composition FROM potion_mixes"
+        )).fetchall()
+        index = {tuple(composition_to_potion_type(row.potion_composition)): row.sku for row in rows}
+        with self._lock:
+            self._index = index
+        return index
+
+    def get(self, connection):
+        index = self._index
+        if index is None:
+            index = self.load(connection)
+        return index
+
+    def resolve(self, connection, potion_types):
+        """
+        Map every potion type to its SKU, reloading once if any are unknown.
+        Returns (skus_by_type, missing_types).
+        """
+        index = self.get(connection)
+        if any(tuple(potion_type) not in index for potion_type in potion_types):
+            index = self.load(connection)
+        found = {}
+        missing = []
+        for potion_type in potion_types:
+            key = tuple(potion_type)
+            if key in index:
+                found[key] = index[key]
+            else:
+                missing.append(list(potion_type))
+        return found, missing
+
+
+composition_index = CompositionIndex()
@@ -0,0 +1,108 @@
+import logging
+import os
+import numpy as np
+import sqlalchemy
+from src.game_time import game_clock
+
+# Decides which mixes the catalog offers. Once per tick the scheduler's "catalog" job
+# scores every mix from its stock, margin and sell-through (read from the
+# inventory_balances and sales_by_hour aggregates, never the raw history) and stores
+# the order in catalog_ranking. The catalog shows the first 6 ranked mixes in stock
+# and is served from the in-memory catalog cache between rebuilds.
+
+# Estimated gold per ml of liquid, used to turn a price into a margin
+ML_COST = float(os.environ.get("ML_COST", "0.1"))
+
+MARGIN_WEIGHT = 0.4
+HOUR_DEMAND_WEIGHT = 0.3
+SELL_THROUGH_WEIGHT = 0.2
+STOCK_WEIGHT = 0.1
+
+
+def _normalize(values):
+    top = values.max() if values.size else 0
+    return values / top if top > 0 else np.zeros_like(values)
+
+
+def score_mixes(stock, prices, ml_per_potion, sold_this_hour, sold_total, ml_cost=ML_COST):
+    """
+    Score each mix; higher sells first. Combines the margin per potion, how much of
+    the mix sold at this game hour on earlier days, the share of its supply that
+    has sold overall, and how much is in stock. Mixes with no stock score -inf.
+    """
+    stock = np.maximum(np.asarray(stock, dtype=float), 0)
+    margin = np.maximum(np.asarray(prices, dtype=float) - np.asarray(ml_per_potion, dtype=float) * ml_cost, 0)
+    sold_this_hour = np.asarray(sold_this_hour, dtype=float)
+    sold_total = np.asarray(sold_total, dtype=float)
+    sell_through = np.divide(sold_total, sold_total + stock, out=np.zeros_like(stock), where=(sold_total + stock) > 0)
+
+    scores = (
+        MARGIN_WEIGHT * _normalize(margin)
+        + HOUR_DEMAND_WEIGHT * _normalize(sold_this_hour)
+        + SELL_THROUGH_WEIGHT * sell_through
+        + STOCK_WEIGHT * _normalize(stock)
+    )
+    scores[stock <= 0] = -np.inf
+    return scores
+
+
+RANKING_INPUTS_QUERY = sqlalchemy.text("""
+    SELECT pm.sku, pm.price,
+           COALESCE(b.balance, 0) AS stock,
+           COALESCE(s.sold_this_hour, 0) AS sold_this_hour,
+           COALESCE(s.sold_total, 0) AS sold_total
+    FROM potion_mixes pm
+    LEFT JOIN inventory_balances b ON b.item_type = 'potion' AND b.item_id = pm.sku
+    LEFT JOIN (
+        SELECT item_sku,
+               SUM(quantity) FILTER (WHERE game_hour = CAST(:game_hour AS INTEGER)) AS sold_this_hour,
+               SUM(quantity) AS sold_total
+        FROM sales_by_hour
+        GROUP BY item_sku
+    ) s ON s.item_sku = pm.sku
+    ORDER BY pm.sku
+""")
+
+STORE_RANKING_QUERY = sqlalchemy.text("""
+    INSERT INTO catalog_ranking (sku, rank, score, tick_id, ranked_at)
+    SELECT sku, rank, score, CAST(:tick_id AS INTEGER), now()
+    FROM unnest(
+        CAST(:skus AS TEXT[]),
+        CAST(:ranks AS INTEGER[]),
+        CAST(:scores AS DOUBLE PRECISION[])
+    ) AS r(sku, rank, score)
+""")
+
+
+def rank_catalog(connection):
+    """
+    Score every mix for the current game hour and replace catalog_ranking with the
+    result. Returns the SKUs in rank order.
+    """
+    game_time = game_clock.current(connection)
+    rows = connection.execute(RANKING_INPUTS_QUERY, {
+        'game_hour': game_time.hour if game_time else None,
+    }).fetchall()
+
+    # Every mix is 100 ml of liquid
+    scores = score_mixes(
+        [row.stock for row in rows],
+        [row.price for row in rows],
+        [100] * len(rows),
+        [row.sold_this_hour for row in rows],
+        [row.sold_total for row in rows],
+    )
+    order = np.argsort(-scores, kind="stable")
+    skus = [rows[i].sku for i in order]
+
+    connection.execute(sqlalchemy.text("DELETE FROM catalog_ranking"))
+    if skus:
+        connection.execute(STORE_RANKING_QUERY, {
+            'skus': skus,
+            'ranks': list(range(1, len(skus) + 1)),
+            # Out-of-stock mixes are stored last with no score
+            'scores': [float(scores[i]) if np.isfinite(scores[i]) else None for i in order],
+            'tick_id': game_time.tick_id if game_time else None,
+        })
+    logging.info(f"Ranked catalog: {skus[:6]}")
+    return skus
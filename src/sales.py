@@ -0,0 +1,59 @@
+import sqlalchemy
+
+# Sales rolled up by SKU and game day/hour, updated at every checkout so pricing
+# and catalog decisions can read per-hour sell-through without scanning cart_items.
+
+RECORD_SALES_QUERY = sqlalchemy.text("""
+    INSERT INTO sales_by_hour (item_sku, game_day, game_hour, quantity, gold, orders)
+    SELECT item_sku, :game_day, :game_hour, quantity, gold, 1
+    FROM unnest(
+        CAST(:item_skus AS TEXT[]),
+        CAST(:quantities AS INTEGER[]),
+        CAST(:golds AS INTEGER[])
+    ) AS s(item_sku, quantity, gold)
+    ORDER BY item_sku
+    ON CONFLICT (item_sku, game_day, game_hour) DO UPDATE
+    SET quantity = sales_by_hour.quantity + EXCLUDED.quantity,
+        gold = sales_by_hour.gold + EXCLUDED.gold,
+        orders = sales_by_hour.orders + 1
+""")
+
+
+def record_sales(connection, items, game_time):
+    """
+    Add one checkout's lines (item_sku, quantity, gold) to the rollup for its game
+    hour. Sales made before any tick has been posted have no hour and are skipped.
+    """
+    if game_time is None or not items:
+        return
+    connection.execute(RECORD_SALES_QUERY, {
+        'game_day': game_time.day,
+        'game_hour': game_time.hour,
+        'item_skus': [item.item_sku for item in items],
+        'quantities': [int(item.quantity) for item in items],
+        'golds': [int(item.gold) for item in items],
+    })
+
+
+SALES_QUERY = sqlalchemy.text("""
+    SELECT item_sku, game_day, game_hour, quantity, gold, orders
+    FROM sales_by_hour
+    WHERE (CAST(:game_day AS TEXT) IS NULL OR game_day = :game_day)
+    AND (CAST(:game_hour AS INTEGER) IS NULL OR game_hour = :game_hour)
+    AND (CAST(:item_sku AS TEXT) IS NULL OR item_sku = :item_sku)
+    ORDER BY game_day, game_hour, quantity DESC, item_sku
+""")
+
+
+def get_sales(connection, game_day=None, game_hour=None, item_sku=None):
+    rows = connection.execute(SALES_QUERY, {
+        'game_day': game_day, 'game_hour': game_hour, 'item_sku': item_sku,
+    }).fetchall()
+    return [{
+        "item_sku": row.item_sku,
+        "day": row.game_day,
+        "hour": row.game_hour,
+        "quantity": row.quantity,
+        "gold": row.gold,
+        "orders": row.orders,
+    } for row in rows]
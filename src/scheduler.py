@@ -1,7 +1,175 @@
-from apscheduler.schedulers.background import BackgroundScheduler
+import logging
+import os
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+import sqlalchemy
+from src import database as db
+from src import ledger
+from src import metrics
+from src import ranking
+from src.api import bottler, catalog, inventory
 from src.utils import purchase_barrels_if_needed
 
-def start_scheduler():
-    scheduler = BackgroundScheduler()
-    scheduler.add_job(purchase_barrels_if_needed, 'interval', hours=2)
-    scheduler.start()
+# Planning jobs run off the game clock: every POST /info/current_time calls on_tick(),
+# which hands the jobs due at that hour to a small worker pool and returns at once.
+#
+# A job never overlaps itself. Inside one process a per-job lock skips the tick if the
+# previous run is still going; across uvicorn workers and hosts the run takes a
+# Postgres advisory lock and claims its (job, tick) row in scheduler_runs, so each
+# tick's job runs once no matter which process the tick was posted to.
+
+
+def bottle_from_plan(connection):
+    """
+    Bottle whatever the bottler plan says can be made from the ml on hand.
+    """
+    plan = bottler.plan_bottling(connection)
+    if plan:
+        bottler.bottle_potions(connection, {tuple(item["potion_type"]): item["quantity"] for item in plan})
+    return len(plan)
+
+
+class Job:
+    def __init__(self, name, fn, hours=None, invalidates_catalog=False):
+        self.name = name
+        self.fn = fn
+        # Game hours the job runs at; None runs it on every tick
+        self.hours = hours
+        # Drop the catalog cache once the job's transaction has committed
+        self.invalidates_catalog = invalidates_catalog
+        self.lock = threading.Lock()
+        self.lock_key = zlib.crc32(f"scheduler:{name}".encode())
+
+    def due(self, hour):
+        return self.hours is None or hour in self.hours
+
+
+JOBS = {
+    job.name: job for job in (
+        Job("catalog", ranking.rank_catalog, invalidates_catalog=True),
+        Job("barrels", purchase_barrels_if_needed),
+        Job("bottling", bottle_from_plan, invalidates_catalog=True),
+        # Spends all available gold, so at most once a game day
+        Job("capacity", inventory.buy_capacity, hours={0}),
+        # Partitions are per calendar day; once a game day is plenty
+        Job("ledger", ledger.maintain_ledger, hours={0}),
+        # Cheap unless LEDGER_CHECKPOINT_EVERY rows have piled up since the last one
+        Job("checkpoint", ledger.checkpoint_if_due),
+    )
+}
+
+
+def enabled_jobs():
+    """
+    SCHEDULER_JOBS is a comma-separated list of job names; "catalog,ledger,checkpoint"
+    by default. The barrels job buys on top of what the game server delivers through
+    /barrels/deliver, so it has to be turned on explicitly.
+    """
+    names = os.environ.get("SCHEDULER_JOBS", "catalog,ledger,checkpoint")
+    return [JOBS[name.strip()] for name in names.split(",") if name.strip()]
+
+
+CLAIM_RUN_QUERY = sqlalchemy.text("""
+    INSERT INTO scheduler_runs (job_name, tick_id, day, hour, status)
+    VALUES (:job_name, :tick_id, :day, :hour, 'running')
+    ON CONFLICT (job_name, tick_id) DO NOTHING
+    RETURNING run_id
+""")
+
+FINISH_RUN_QUERY = sqlalchemy.text("""
+    UPDATE scheduler_runs
+    SET status = :status, duration_ms = :duration_ms, error = :error
+    WHERE run_id = :run_id
+""")
+
+RECORD_FAILURE_QUERY = sqlalchemy.text("""
+    INSERT INTO scheduler_runs (job_name, tick_id, day, hour, status, duration_ms, error)
+    VALUES (:job_name, :tick_id, :day, :hour, 'failed', :duration_ms, :error)
+    ON CONFLICT (job_name, tick_id) DO UPDATE
+    SET status = 'failed', duration_ms = EXCLUDED.duration_ms, error = EXCLUDED.error
+""")
+
+
+def run_job(job, tick_id, day, hour):
+    """
+    Run one job for one tick unless it is already running or has already run for it.
+    Returns "ok", "skipped" or "failed".
+    """
+    if not job.lock.acquire(blocking=False):
+        logging.info(f"Skipping {job.name} for tick {tick_id}: previous run still in progress")
+        metrics.registry.observe_job(job.name, "skipped", 0)
+        return "skipped"
+
+    start = time.perf_counter()
+    status = "skipped"
+    try:
+        with db.engine.begin() as connection:
+            # Held until this transaction ends; another process running the job skips
+            leader = connection.execute(
+                sqlalchemy.text("SELECT pg_try_advisory_xact_lock(:key)"), {'key': job.lock_key}
+            ).scalar()
+            run_id = None
+            if leader:
+                run_id = connection.execute(CLAIM_RUN_QUERY, {
+                    'job_name': job.name, 'tick_id': tick_id, 'day': day, 'hour': hour,
+                }).scalar()
+            if run_id is not None:
+                job.fn(connection)
+                status = "ok"
+                connection.execute(FINISH_RUN_QUERY, {
+                    'run_id': run_id, 'status': status,
+                    'duration_ms': (time.perf_counter() - start) * 1000, 'error': None,
+                })
+        # After the commit, so a catalog rebuilt in between can't cache the old state
+        if status == "ok" and job.invalidates_catalog:
+            catalog.invalidate_catalog()
+    except Exception as e:
+        status = "failed"
+        logging.exception(f"Scheduled job {job.name} failed for tick {tick_id}")
+        try:
+            with db.engine.begin() as connection:
+                connection.execute(RECORD_FAILURE_QUERY, {
+                    'job_name': job.name, 'tick_id': tick_id, 'day': day, 'hour': hour,
+                    'duration_ms': (time.perf_counter() - start) * 1000, 'error': str(e),
+                })
+        except Exception:
+            logging.exception(f"Could not record the failure of {job.name}")
+    finally:
+        job.lock.release()
+        metrics.registry.observe_job(job.name, status, time.perf_counter() - start)
+
+    if status == "ok":
+        logging.info(f"Scheduled job {job.name} finished for tick {tick_id} in {time.perf_counter() - start:.3f}s")
+    return status
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                workers = int(os.environ.get("SCHEDULER_WORKERS", "2"))
+                _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="scheduler")
+    return _executor
+
+
+def on_tick(tick_id, day, hour):
+    """
+    Queue the jobs due at this game hour and return without waiting for them.
+    """
+    jobs = [job for job in enabled_jobs() if job.due(hour)]
+    return [get_executor().submit(run_job, job, tick_id, day, hour) for job in jobs]
+
+
+def shutdown(wait=True):
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=wait)
+            _executor = None
@@ -0,0 +1,96 @@
+import contextlib
+import pytest
+from src import database as db
+
+
+class FakeResult:
+    """The result of one statement run on a FakeConnection."""
+
+    def __init__(self, value=None, rowcount=0):
+        self.value = value
+        self.rowcount = rowcount
+
+    def scalar(self):
+        return self.value
+
+    def fetchone(self):
+        return self.value
+
+    def fetchall(self):
+        return list(self.value or [])
+
+    def all(self):
+        return self.fetchall()
+
+    def scalars(self):
+        return self
+
+    def __iter__(self):
+        return iter(self.fetchall())
+
+
+class FakeConnection:
+    """
+    Records executed statements instead of talking to Postgres. answers maps a query
+    to what its result holds, or to a function of the params returning that (or a
+    FakeResult, or raising). Queries not in answers take the next of in_order.
+    """
+
+    def __init__(self, answers=None, in_order=()):
+        self.executed = []
+        self.answers = dict(answers or {})
+        self.in_order = list(in_order)
+
+    def execute(self, query, params=None):
+        answer = self.answers.get(query)
+        if callable(answer):
+            answer = answer(params)
+        elif query not in self.answers and self.in_order:
+            answer = self.in_order.pop(0)
+        self.executed.append((query, params))
+        return answer if isinstance(answer, FakeResult) else FakeResult(answer)
+
+    @contextlib.contextmanager
+    def begin_nested(self):
+        yield
+
+    def queries(self):
+        return [query for query, _ in self.executed]
+
+    def params(self, query):
+        return [params for executed, params in self.executed if executed is query]
+
+
+class FakeEngine:
+    def __init__(self, connection):
+        self.connection = connection
+
+    @contextlib.contextmanager
+    def begin(self):
+        yield self.connection
+
+
+@pytest.fixture
+def fake_connection():
+    """FakeConnection, for tests to build with their own answers."""
+    return FakeConnection
+
+
+@pytest.fixture
+def connection():
+    return FakeConnection()
+
+
+@pytest.fixture
+def fake_engine(monkeypatch):
+    """Point db.engine at the given FakeConnection, or a new one; returns the connection."""
+    def use(connection=None):
+        connection = connection or FakeConnection()
+        monkeypatch.setattr(db, "_engine", FakeEngine(connection))
+        return connection
+    return use
+
+
+@pytest.fixture
+def fake_result():
+    return FakeResult
@@ -0,0 +1,105 @@
+import asyncio
+import httpx
+from fastapi import Depends, FastAPI
+from src.api import auth
+
+
+class Clock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_bucket_allows_a_burst_then_refills_at_the_rate():
+    clock = Clock()
+    bucket = auth.TokenBucket(rate=2, burst=3, clock=clock)
+    assert [bucket.take() for _ in range(3)] == [0, 0, 0]
+    assert bucket.take() == 0.5
+
+    clock.now += 0.5
+    assert bucket.take() == 0
+    assert bucket.take() > 0
+
+
+def test_zero_rate_is_unlimited():
+    bucket = auth.TokenBucket(rate=0, burst=0)
+    assert all(bucket.take() == 0 for _ in range(1000))
+
+
+def test_keys_can_carry_their_own_limits():
+    keys = auth.load_api_keys("main", "game:5:10, admin", rate=50, burst=100)
+    assert set(keys) == {"main", "game", "admin"}
+    assert (keys["game"].rate, keys["game"].burst) == (5, 10)
+    assert (keys["admin"].rate, keys["admin"].burst) == (50, 100)
+
+
+def test_admission_refuses_past_the_limit():
+    admission = auth.AdmissionControl(2)
+    assert admission.enter() and admission.enter()
+    assert not admission.enter()
+    admission.leave()
+    assert admission.enter()
+
+
+def make_app(monkeypatch, keys, limit, gate=None):
+    monkeypatch.setattr(auth, "api_keys", keys)
+    monkeypatch.setattr(auth, "admission", auth.AdmissionControl(limit))
+    app = FastAPI(dependencies=[Depends(auth.get_api_key)])
+
+    @app.get("/")
+    async def root():
+        if gate is not None:
+            await gate.wait()
+        return {"ok": True}
+
+    return app
+
+
+async def get(app, key, count=1):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        return await asyncio.gather(*(client.get("/", headers={"access_token": key}) for _ in range(count)))
+
+
+def test_unknown_and_missing_keys_are_rejected(monkeypatch):
+    app = make_app(monkeypatch, auth.load_api_keys("secret"), 0)
+    assert asyncio.run(get(app, "wrong"))[0].status_code == 401
+
+    async def no_header():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.get("/")
+
+    assert asyncio.run(no_header()).status_code == 401
+
+
+def test_a_key_over_its_rate_gets_429_with_retry_after(monkeypatch):
+    app = make_app(monkeypatch, auth.load_api_keys(None, "slow:1:2, other"), 0)
+    responses = asyncio.run(get(app, "slow", 3))
+    assert [r.status_code for r in responses] == [200, 200, 429]
+    assert responses[2].headers["Retry-After"] == "1"
+    # Other keys have their own bucket
+    assert asyncio.run(get(app, "other"))[0].status_code == 200
+
+
+def test_requests_past_the_in_flight_cap_are_shed(monkeypatch):
+    async def scenario():
+        gate = asyncio.Event()
+        app = make_app(monkeypatch, auth.load_api_keys("k", rate=0), 2, gate)
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            held = [asyncio.ensure_future(client.get("/", headers={"access_token": "k"})) for _ in range(2)]
+            while auth.admission.in_flight < 2:
+                await asyncio.sleep(0)
+            shed = await client.get("/", headers={"access_token": "k"})
+            gate.set()
+            done = await asyncio.gather(*held)
+        return shed, done
+
+    shed, done = asyncio.run(scenario())
+    assert shed.status_code == 503
+    assert shed.headers["Retry-After"] == "1"
+    assert [r.status_code for r in done] == [200, 200]
+    assert auth.admission.in_flight == 0
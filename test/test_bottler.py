@@ -0,0 +1,63 @@
+from collections import namedtuple
+import pytest
+from fastapi import HTTPException
+from src import ledger
+from src.api import bottler
+
+Balance = namedtuple("Balance", "item_id balance")
+
+
+class FakeIndex:
+    def resolve(self, connection, potion_types):
+        skus = {(0, 100, 0, 0): "GP-001", (0, 50, 50, 0): "PP-001"}
+        return {potion_type: skus[potion_type] for potion_type in potion_types}, []
+
+
+@pytest.fixture
+def bottling_connection(fake_connection):
+    """Answers the gold and ml locks from fixed balances."""
+    def make(ml):
+        return fake_connection({
+            ledger.LOCK_GOLD_QUERY: 100,
+            ledger.LOCK_BALANCES_QUERY: lambda params: [
+                Balance(color, ml[color]) for color in params['item_ids'] if color in ml
+            ],
+        })
+    return make
+
+
+@pytest.fixture(autouse=True)
+def fake_index(monkeypatch):
+    monkeypatch.setattr(bottler, "composition_index", FakeIndex())
+
+
+def test_bottling_locks_gold_then_ml_then_writes(bottling_connection):
+    connection = bottling_connection({'green': 1000, 'blue': 1000})
+    bottler.bottle_potions(connection, {(0, 100, 0, 0): 2, (0, 50, 50, 0): 4})
+
+    assert connection.queries() == [ledger.LOCK_GOLD_QUERY, ledger.LOCK_BALANCES_QUERY, ledger.RECORD_ENTRIES_QUERY]
+    assert connection.executed[1][1] == {'item_type': 'ml', 'item_ids': ['blue', 'green']}
+    written = connection.executed[2][1]
+    assert list(zip(written['item_types'], written['item_ids'], written['change_amounts'])) == [
+        ('potion', 'GP-001', 2),
+        ('potion', 'PP-001', 4),
+        ('ml', 'green', -400),
+        ('ml', 'blue', -200),
+    ]
+
+
+def test_bottling_more_than_the_ml_on_hand_is_a_conflict(bottling_connection):
+    connection = bottling_connection({'green': 399, 'blue': 1000})
+    with pytest.raises(HTTPException) as e:
+        bottler.bottle_potions(connection, {(0, 100, 0, 0): 2, (0, 50, 50, 0): 4})
+
+    assert e.value.status_code == 409
+    assert "green (have 399, need 400)" in e.value.detail
+    assert ledger.RECORD_ENTRIES_QUERY not in connection.queries()
+
+
+def test_a_color_with_no_balance_row_counts_as_empty(bottling_connection):
+    connection = bottling_connection({})
+    with pytest.raises(HTTPException) as e:
+        bottler.bottle_potions(connection, {(0, 100, 0, 0): 1})
+    assert e.value.status_code == 409
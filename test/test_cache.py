@@ -0,0 +1,49 @@
+from src.cache import VersionedResponseCache
+
+
+def test_cache_builds_once_until_invalidated():
+    calls = []
+
+    def build():
+        calls.append(1)
+        return [{"sku": "GP-001", "quantity": len(calls)}]
+
+    cache = VersionedResponseCache(ttl_seconds=60)
+    first = cache.get(build)
+    second = cache.get(build)
+    assert first is second
+    assert len(calls) == 1
+
+    cache.invalidate()
+    third = cache.get(build)
+    assert len(calls) == 2
+    assert third.etag != first.etag
+    assert third.body == b'[{"sku":"GP-001","quantity":2}]'
+
+
+def test_build_racing_an_invalidation_is_not_stored():
+    cache = VersionedResponseCache(ttl_seconds=60)
+
+    def build():
+        cache.invalidate()
+        return []
+
+    cache.get(build)
+    assert cache.peek() is None
+
+
+def test_expired_entry_is_rebuilt():
+    cache = VersionedResponseCache(ttl_seconds=0)
+    cache.get(lambda: [])
+    assert cache.peek() is None
+
+
+def test_get_async_shares_the_cached_entry():
+    import asyncio
+
+    async def build():
+        return {"ok": True}
+
+    cache = VersionedResponseCache(ttl_seconds=60)
+    entry = asyncio.run(cache.get_async(build))
+    assert cache.get(lambda: {"ok": False}) is entry
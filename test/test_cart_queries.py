@@ -0,0 +1,140 @@
+"""
+Cart and checkout queries against a real Postgres. Runs only when TEST_POSTGRES_URI
+points at a scratch database with schema.sql and the migrations loaded; the tests
+commit carts, two test potion mixes and ledger rows there.
+"""
+import json
+import os
+import threading
+import pytest
+import sqlalchemy
+from fastapi import HTTPException
+from src import cart_store
+from src import database as db
+from src import ledger
+from src.game_time import GameClock
+from src.api import carts
+
+TEST_URI = os.environ.get("TEST_POSTGRES_URI")
+
+pytestmark = pytest.mark.skipif(not TEST_URI, reason="TEST_POSTGRES_URI is not set")
+
+TEST_SKUS = {"TEST-ROUND": 33.33, "TEST-EXTRA": 10}
+TEST_SKU = "TEST-ROUND"
+TEST_DAY = "Testday"
+
+
+@pytest.fixture
+def engine(monkeypatch):
+    engine = sqlalchemy.create_engine(TEST_URI)
+    monkeypatch.setattr(db, "_engine", engine)
+    monkeypatch.setattr(cart_store, "_store", cart_store.DatabaseCartStore())
+    with engine.begin() as connection:
+        for i, (sku, price) in enumerate(TEST_SKUS.items()):
+            connection.execute(sqlalchemy.text("""
+                INSERT INTO potion_mixes (name, potion_composition, sku, price, inventory_quantity)
+                VALUES (:sku, CAST(:composition AS JSONB), :sku, :price, 0)
+                ON CONFLICT (sku) DO UPDATE SET price = EXCLUDED.price
+            """), {'composition': json.dumps({"red": 1, "green": 1, "blue": 1 + i, "dark": 97 - i}), 'sku': sku, 'price': price})
+        connection.execute(sqlalchemy.text("DELETE FROM sales_by_hour WHERE game_day = :day"), {'day': TEST_DAY})
+        ledger.record_entries(connection, [
+            {'item_type': 'potion', 'item_id': sku, 'change_amount': 100, 'description': 'cart query test'}
+            for sku in TEST_SKUS
+        ])
+    yield engine
+    engine.dispose()
+
+
+def new_cart(connection, quantity=None):
+    cart_id = carts.create_cart(connection, carts.Customer(customer_name="Cart Query", character_class="Tester", level=1))
+    if quantity:
+        carts.upsert_cart_item(connection, cart_id, carts.CartItem(item_sku=TEST_SKU, quantity=quantity))
+    return cart_id
+
+
+def unsold_lines(engine, cart_id):
+    with engine.begin() as connection:
+        return connection.execute(sqlalchemy.text(
+            "SELECT item_sku, quantity FROM cart_items WHERE cart_id = :cart_id AND sold_at IS NULL"
+        ), {'cart_id': cart_id}).fetchall()
+
+
+def test_checkout_gold_matches_the_order_history_and_rollup(engine, monkeypatch):
+    clock = GameClock()
+    clock.set(1, TEST_DAY, 3)
+    monkeypatch.setattr(carts, "game_clock", clock)
+
+    with engine.begin() as connection:
+        cart_id = new_cart(connection, 3)
+        gold_before = ledger.get_gold(connection)
+    with engine.begin() as connection:
+        result = carts.checkout_cart(connection, cart_id)
+
+    with engine.begin() as connection:
+        line_total = connection.execute(sqlalchemy.text(
+            "SELECT line_item_total FROM cart_items WHERE cart_id = :cart_id"
+        ), {'cart_id': cart_id}).scalar()
+        rollup = connection.execute(sqlalchemy.text(
+            "SELECT gold FROM sales_by_hour WHERE item_sku = :sku AND game_day = :day"
+        ), {'sku': TEST_SKU, 'day': TEST_DAY}).scalar()
+        gold_after = ledger.get_gold(connection)
+
+    # 3 x 33.33 = 99.99, rounded once for the line
+    assert line_total == rollup == result["total_gold_paid"] == gold_after - gold_before == 100
+
+
+def test_upsert_skips_a_checked_out_cart(engine):
+    with engine.begin() as connection:
+        cart_id = new_cart(connection, 2)
+    with engine.begin() as connection:
+        carts.checkout_cart(connection, cart_id)
+
+    with engine.begin() as connection:
+        # Neither the sold line nor a new SKU is written
+        assert cart_store.upsert_items(connection, [(cart_id, TEST_SKU, 5), (cart_id, "TEST-EXTRA", 1)]) == 0
+        assert connection.execute(sqlalchemy.text(
+            "SELECT quantity FROM cart_items WHERE cart_id = :cart_id"
+        ), {'cart_id': cart_id}).scalars().all() == [2]
+
+    with pytest.raises(HTTPException) as error:
+        with engine.begin() as connection:
+            carts.checkout_cart(connection, cart_id)
+    assert error.value.status_code == 409
+
+
+def test_flush_racing_a_checkout_adds_nothing_to_the_sold_cart(engine, monkeypatch):
+    store = cart_store.MemoryCartStore(flush_seconds=0)
+    monkeypatch.setattr(cart_store, "_store", store)
+    with engine.begin() as connection:
+        cart_id = new_cart(connection)
+    store.put(cart_id, TEST_SKU, 1)
+
+    flushed = []
+    with engine.begin() as connection:
+        carts.checkout_cart(connection, cart_id)
+        # A line added after checkout read the store; the flush must wait for the
+        # checkout to commit and then leave the cart alone
+        store.put(cart_id, "TEST-EXTRA", 2)
+        flusher = threading.Thread(target=lambda: flushed.append(store.flush()))
+        flusher.start()
+        flusher.join(timeout=1)
+        assert flusher.is_alive()
+    flusher.join(timeout=10)
+
+    assert flushed == [0]
+    assert unsold_lines(engine, cart_id) == []
+
+
+def test_flush_after_checkout_commits_adds_nothing(engine, monkeypatch):
+    store = cart_store.MemoryCartStore(flush_seconds=0)
+    monkeypatch.setattr(cart_store, "_store", store)
+    with engine.begin() as connection:
+        cart_id = new_cart(connection)
+    store.put(cart_id, TEST_SKU, 1)
+    with engine.begin() as connection:
+        carts.checkout_cart(connection, cart_id)
+    # Not yet discarded, as between the checkout's commit and discard()
+    store.put(cart_id, "TEST-EXTRA", 2)
+
+    assert store.flush() == 0
+    assert unsold_lines(engine, cart_id) == []
@@ -0,0 +1,188 @@
+import asyncio
+import pytest
+import sqlalchemy
+from fastapi import HTTPException
+from src import cart_store
+from src import database as db
+
+
+SKUS = ["GP-001", "RP-001", "BP-001"]
+
+
+def cart_connection(fake_connection, fake_result, cart_state=False, failing_carts=()):
+    """
+    A connection that knows SKUS and one cart state (False open, True checked out,
+    None missing); the upsert writes lines of an open cart for a known SKU and
+    fails for any cart in failing_carts.
+    """
+    def upsert(params):
+        if set(params['cart_ids']) & connection.failing_carts:
+            raise sqlalchemy.exc.IntegrityError("INSERT", params, Exception("violates foreign key constraint"))
+        return fake_result(rowcount=sum(cart_state is False and sku in SKUS for sku in params['item_skus']))
+
+    connection = fake_connection({
+        cart_store.KNOWN_SKUS_QUERY: SKUS,
+        cart_store.CART_STATE_QUERY: cart_state,
+        cart_store.UPSERT_CART_ITEMS_QUERY: upsert,
+    })
+    connection.failing_carts = set(failing_carts)
+    return connection
+
+
+@pytest.fixture
+def carts_db(fake_connection, fake_result, fake_engine):
+    """Route db.engine to a cart_connection built with the given options."""
+    def use(**options):
+        return fake_engine(cart_connection(fake_connection, fake_result, **options))
+    return use
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_memory_store_writes_nothing_until_checkout(carts_db, fake_connection, fake_result):
+    checks = carts_db()
+    store = cart_store.MemoryCartStore(flush_seconds=0)
+    asyncio.run(store.set_item(7, "GP-001", 2))
+    asyncio.run(store.set_item(7, "RP-001", 1))
+    asyncio.run(store.set_item(7, "GP-001", 3))
+    # The cart and the SKUs are checked once, on the first line
+    assert checks.queries() == [cart_store.KNOWN_SKUS_QUERY, cart_store.CART_STATE_QUERY]
+
+    connection = cart_connection(fake_connection, fake_result)
+    assert store.persist(connection, 7) == 2
+    assert connection.params(cart_store.UPSERT_CART_ITEMS_QUERY) == [{'cart_ids': [7, 7], 'item_skus': ["GP-001", "RP-001"], 'quantities': [3, 1]}]
+
+    store.discard(7)
+    assert store.items(7) == {}
+
+
+BAD_LINES = [
+    (False, "NOPE", 1, 400),
+    (False, "GP-001", -1, 400),
+    (None, "GP-001", 1, 404),
+    (True, "GP-001", 1, 409),
+]
+
+
+@pytest.mark.parametrize("cart_state, item_sku, quantity, status_code", BAD_LINES)
+def test_bad_lines_are_rejected_before_they_are_held(carts_db, cart_state, item_sku, quantity, status_code):
+    carts_db(cart_state=cart_state)
+    store = cart_store.MemoryCartStore(flush_seconds=0)
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(store.set_item(7, item_sku, quantity))
+    assert error.value.status_code == status_code
+    assert store.items(7) == {}
+
+
+def test_flush_writes_each_changed_cart_once(carts_db):
+    connection = carts_db()
+    store = cart_store.MemoryCartStore(flush_seconds=0)
+    store.put(1, "GP-001", 1)
+    store.put(2, "BP-001", 4)
+
+    assert store.flush() == 2
+    assert len(connection.params(cart_store.UPSERT_CART_ITEMS_QUERY)) == 2
+    # Nothing changed since, so the next flush has nothing to write
+    assert store.flush() == 0
+    assert len(connection.params(cart_store.UPSERT_CART_ITEMS_QUERY)) == 2
+
+
+def test_one_failing_cart_does_not_block_the_others(carts_db):
+    connection = carts_db(failing_carts={1})
+    store = cart_store.MemoryCartStore(flush_seconds=0)
+    store.put(1, "GP-001", 1)
+    store.put(2, "BP-001", 4)
+
+    assert store.flush() == 1
+    assert connection.params(cart_store.UPSERT_CART_ITEMS_QUERY) == [{'cart_ids': [2], 'item_skus': ["BP-001"], 'quantities': [4]}]
+
+    # The failed cart is retried, and written once the database takes it
+    connection.failing_carts = set()
+    assert store.flush() == 1
+    assert connection.params(cart_store.UPSERT_CART_ITEMS_QUERY)[-1] == {'cart_ids': [1], 'item_skus': ["GP-001"], 'quantities': [1]}
+    assert store.flush() == 0
+
+
+def test_failed_flush_keeps_carts_dirty(monkeypatch, carts_db):
+    class BrokenEngine:
+        def begin(self):
+            raise RuntimeError("database is down")
+
+    monkeypatch.setattr(db, "_engine", BrokenEngine())
+    store = cart_store.MemoryCartStore(flush_seconds=0)
+    store.put(1, "GP-001", 1)
+    with pytest.raises(RuntimeError):
+        store.flush()
+
+    carts_db()
+    assert store.flush() == 1
+
+
+def test_idle_carts_expire():
+    clock = Clock()
+    store = cart_store.MemoryCartStore(ttl=60, flush_seconds=0, clock=clock)
+    store.put(1, "GP-001", 1)
+    clock.now += 30
+    store.put(2, "RP-001", 1)
+    clock.now += 45
+
+    assert store.items(1) == {}
+    assert store.items(2) == {"RP-001": 1}
+    assert store.evict_expired() == 1
+
+
+def test_journal_replays_unflushed_carts(tmp_path, carts_db):
+    journal = str(tmp_path / "carts.jsonl")
+    store = cart_store.MemoryCartStore(flush_seconds=0, journal_path=journal)
+    store.put(1, "GP-001", 1)
+    store.put(1, "GP-001", 5)
+    store.put(2, "RP-001", 2)
+    with open(journal, "a") as f:
+        f.write('[3, "BP-0')  # torn write
+
+    # A new process after a crash
+    recovered = cart_store.MemoryCartStore(flush_seconds=0, journal_path=journal)
+    assert recovered.items(1) == {"GP-001": 5}
+    assert recovered.items(2) == {"RP-001": 2}
+
+    carts_db()
+    recovered.flush()
+    # Flushed lines are compacted out of the journal
+    assert open(journal).read() == ""
+
+
+def test_unknown_store_is_rejected(monkeypatch):
+    monkeypatch.setattr(cart_store, "_store", None)
+    monkeypatch.setenv("CART_STORE", "redis")
+    with pytest.raises(ValueError):
+        cart_store.get_store()
+
+
+@pytest.mark.parametrize("cart_state, item_sku, quantity, status_code", BAD_LINES)
+def test_database_store_reports_lines_it_could_not_write(carts_db, cart_state, item_sku, quantity, status_code):
+    carts_db(cart_state=cart_state)
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(cart_store.DatabaseCartStore().set_item(7, item_sku, quantity))
+    assert error.value.status_code == status_code
+
+
+def test_database_store_checks_nothing_when_every_line_was_written(carts_db):
+    connection = carts_db()
+    asyncio.run(cart_store.DatabaseCartStore().set_item(7, "GP-001", 2))
+    assert connection.queries() == [cart_store.UPSERT_CART_ITEMS_QUERY]
+
+
+def test_memory_store_refuses_a_cart_checked_out_since_it_was_discarded(carts_db):
+    carts_db(cart_state=True)
+    store = cart_store.MemoryCartStore(flush_seconds=0)
+    store.put(7, "GP-001", 1)
+    store.discard(7)
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(store.set_item(7, "GP-001", 2))
+    assert error.value.status_code == 409
@@ -0,0 +1,144 @@
+from collections import namedtuple
+import pytest
+from fastapi import HTTPException
+from src import cart_store
+from src import ledger
+from src.game_time import GameClock
+from src.api import carts
+
+
+def test_visits_are_written_in_one_insert(connection):
+    customers = [
+        carts.Customer(customer_name="Ada", character_class="Wizard", level=7),
+        carts.Customer(customer_name="Bo", character_class="Rogue", level=3),
+    ]
+    assert carts.record_visits(connection, 42, customers) == 2
+
+    assert len(connection.executed) == 1
+    query, params = connection.executed[0]
+    assert query is carts.RECORD_VISITS_QUERY
+    assert params == {
+        'visit_id': 42,
+        'customer_names': ["Ada", "Bo"],
+        'character_classes': ["Wizard", "Rogue"],
+        'levels': [7, 3],
+    }
+
+
+def test_no_customers_writes_nothing(connection):
+    assert carts.record_visits(connection, 42, []) == 0
+    assert connection.executed == []
+
+
+@pytest.fixture
+def batch_connection(fake_connection, fake_result):
+    """Answers the SKU check with unknown SKUs and the cart state with cart_state."""
+    def make(unknown=(), cart_state=False):
+        return fake_connection({
+            carts.UNKNOWN_SKUS_QUERY: list(unknown),
+            cart_store.CART_STATE_QUERY: cart_state,
+            cart_store.UPSERT_CART_ITEMS_QUERY: lambda params: fake_result(
+                rowcount=len(params['item_skus']) if cart_state is False else 0
+            ),
+        })
+    return make
+
+
+def test_batch_validates_once_and_upserts_once(batch_connection):
+    connection = batch_connection()
+    items = [
+        carts.CartItem(item_sku="GP-001", quantity=2),
+        carts.CartItem(item_sku="RP-001", quantity=1),
+        carts.CartItem(item_sku="GP-001", quantity=4),
+    ]
+    assert carts.set_cart_items(connection, 9, items) == 2
+
+    assert connection.queries() == [carts.UNKNOWN_SKUS_QUERY, cart_store.UPSERT_CART_ITEMS_QUERY]
+    assert connection.executed[0][1] == {'skus': ["GP-001", "RP-001"]}
+    assert connection.executed[1][1] == {'cart_ids': [9, 9], 'item_skus': ["GP-001", "RP-001"], 'quantities': [4, 1]}
+
+
+def test_batch_with_an_unknown_sku_writes_nothing(batch_connection):
+    connection = batch_connection(unknown=["NOPE"])
+    with pytest.raises(HTTPException) as error:
+        carts.set_cart_items(connection, 9, [carts.CartItem(item_sku="NOPE", quantity=1)])
+    assert error.value.status_code == 400
+    assert len(connection.executed) == 1
+
+
+@pytest.mark.parametrize("cart_state, status_code", [(None, 404), (True, 409)])
+def test_batch_for_a_missing_or_checked_out_cart_is_refused(monkeypatch, batch_connection, cart_state, status_code):
+    monkeypatch.setattr(cart_store, "_store", cart_store.DatabaseCartStore())
+    connection = batch_connection(cart_state=cart_state)
+    with pytest.raises(HTTPException) as error:
+        carts.set_cart_items(connection, 9, [carts.CartItem(item_sku="GP-001", quantity=1)])
+    assert error.value.status_code == status_code
+    assert connection.queries()[-1] is cart_store.CART_STATE_QUERY
+
+
+CartRow = namedtuple("CartRow", "checked_out_at")
+
+
+@pytest.fixture
+def checkout_connection(fake_connection):
+    """Answers the cart lock, the gold lock and the priced cart read with canned rows."""
+    def make(items, gold=1000, cart=CartRow(None)):
+        return fake_connection({
+            carts.LOCK_CART_QUERY: cart,
+            ledger.LOCK_GOLD_QUERY: gold,
+            carts.CHECKOUT_ITEMS_QUERY: items,
+        })
+    return make
+
+
+CheckoutLine = namedtuple("CheckoutLine", "item_sku quantity gold stock")
+
+
+def ticked_clock():
+    clock = GameClock()
+    clock.set(1, "Edgeday", 3)
+    return clock
+
+
+def test_checkout_locks_gold_before_the_potion_rows(monkeypatch, checkout_connection):
+    monkeypatch.setattr(carts, "game_clock", ticked_clock())
+    connection = checkout_connection([CheckoutLine("GP-001", 2, 100, 10)])
+    assert carts.checkout_cart(connection, 5) == {"total_potions_bought": 2, "total_gold_paid": 100}
+
+    queries = connection.queries()
+    assert queries[0] is carts.LOCK_CART_QUERY
+    assert queries.index(ledger.LOCK_GOLD_QUERY) < queries.index(carts.CHECKOUT_ITEMS_QUERY)
+    assert carts.MARK_CHECKED_OUT_QUERY in queries
+
+
+@pytest.mark.parametrize("cart, status_code", [(None, 404), (CartRow("2024-01-01T00:00:00+00:00"), 409)])
+def test_checkout_of_a_missing_or_checked_out_cart_sells_nothing(checkout_connection, cart, status_code):
+    connection = checkout_connection([CheckoutLine("GP-001", 2, 100, 10)], cart=cart)
+    with pytest.raises(HTTPException) as error:
+        carts.checkout_cart(connection, 5)
+    assert error.value.status_code == status_code
+    assert connection.queries() == [carts.LOCK_CART_QUERY]
+
+
+def test_checkout_credits_the_sum_of_the_line_totals(monkeypatch, checkout_connection):
+    monkeypatch.setattr(carts, "game_clock", ticked_clock())
+    # 3 x 33.33 and 2 x 12.50, rounded per line by the checkout query
+    connection = checkout_connection([CheckoutLine("GP-001", 3, 100, 10), CheckoutLine("RP-001", 2, 25, 10)])
+    assert carts.checkout_cart(connection, 5)["total_gold_paid"] == 125
+
+    [ledger_write] = connection.params(ledger.RECORD_ENTRIES_QUERY)
+    assert ledger_write['change_amounts'][-1] == 125
+    [rollup] = connection.params(carts.sales.RECORD_SALES_QUERY)
+    assert rollup['golds'] == [100, 25]
+
+
+def test_checkout_refuses_to_oversell(monkeypatch, checkout_connection):
+    monkeypatch.setattr(carts, "game_clock", ticked_clock())
+    connection = checkout_connection([CheckoutLine("GP-001", 2, 100, 10), CheckoutLine("RP-001", 5, 375, 3)])
+    with pytest.raises(HTTPException) as error:
+        carts.checkout_cart(connection, 5)
+
+    assert error.value.status_code == 409
+    assert "RP-001" in error.value.detail
+    # Nothing reaches the ledger; the caller's transaction rolls the cart update back
+    assert ledger.RECORD_ENTRIES_QUERY not in connection.queries()
@@ -0,0 +1,39 @@
+import csv
+import datetime
+import io
+import json
+from src.api import export
+
+COLUMNS = ("id", "item_type", "change_amount", "date")
+DATE = datetime.datetime(2024, 1, 1, 12, 0)
+PARTITIONS = [
+    [(1, "gold", 100, DATE), (2, "ml", -50, DATE)],
+    [(3, "potion", 2, DATE)],
+]
+
+
+def test_ndjson_yields_one_chunk_per_partition():
+    chunks = list(export.encode_chunks(iter(PARTITIONS), COLUMNS, export.export_format.ndjson))
+    assert len(chunks) == 2
+    lines = b"".join(chunks).decode().splitlines()
+    assert [json.loads(line) for line in lines][0] == {
+        "id": 1, "item_type": "gold", "change_amount": 100, "date": "2024-01-01T12:00:00",
+    }
+    assert len(lines) == 3
+
+
+def test_csv_has_a_header_and_every_row():
+    chunks = list(export.encode_chunks(iter(PARTITIONS), COLUMNS, export.export_format.csv))
+    assert len(chunks) == 3
+    rows = list(csv.reader(io.StringIO(b"".join(chunks).decode())))
+    assert rows[0] == list(COLUMNS)
+    assert rows[3] == ["3", "potion", "2", "2024-01-01 12:00:00"]
+
+
+def test_partitions_are_consumed_lazily():
+    def partitions():
+        yield PARTITIONS[0]
+        raise AssertionError("read past the first partition")
+
+    chunks = export.encode_chunks(partitions(), COLUMNS, export.export_format.ndjson)
+    assert next(chunks).count(b"\n") == 2
@@ -0,0 +1,82 @@
+from types import SimpleNamespace
+import pytest
+from src import game_state
+from src import ledger
+
+
+class DriverCursor:
+    def __init__(self, connection):
+        self.connection = connection
+
+    def copy_expert(self, sql, buffer):
+        if "TO STDOUT" in sql:
+            buffer.write(self.connection.dumps.get(sql, ""))
+        else:
+            self.connection.copied.append((sql, buffer.read()))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class SnapshotConnection:
+    """Records statements and COPYs; answers the snapshot lookup."""
+
+    def __init__(self, snapshot=None, dumps=None):
+        self.snapshot = snapshot
+        self.dumps = dumps or {}
+        self.executed = []
+        self.copied = []
+        self.connection = SimpleNamespace(driver_connection=SimpleNamespace(cursor=lambda: DriverCursor(self)))
+
+    def execute(self, query, params=None):
+        self.executed.append((query, params))
+        return self
+
+    def fetchone(self):
+        return self.snapshot
+
+
+def test_reset_truncates_once_and_reseeds_in_bulk():
+    connection = SnapshotConnection()
+    game_state.reset(connection)
+
+    statements = [str(query) for query, _ in connection.executed]
+    assert len(statements) == 4
+    assert statements[0] == f"TRUNCATE {', '.join(game_state.GAME_TABLES)} RESTART IDENTITY"
+    assert connection.executed[1][0] is ledger.RECORD_ENTRIES_QUERY
+    seed = connection.executed[3]
+    assert seed[0] is game_state.SEED_POTION_MIXES_QUERY
+    assert seed[1]['skus'] == ['GP-001', 'RP-001', 'BP-001', 'PP-001']
+
+
+def test_save_snapshot_stores_one_copy_per_table():
+    connection = SnapshotConnection(dumps={"COPY potion_mixes (potion_id, name, potion_composition, sku, price, inventory_quantity) TO STDOUT": "1\tGreen\n"})
+    game_state.save_snapshot(connection, "warm")
+
+    query, params = connection.executed[-1]
+    assert query is game_state.SAVE_SNAPSHOT_QUERY
+    assert params['name'] == "warm"
+    assert params['potion_mixes'] == "1\tGreen\n"
+    assert set(params) == {'name', 'balances', 'potion_mixes', 'capacity_inventory'}
+
+
+def test_restore_copies_tables_back_and_rebuilds_the_ledger():
+    snapshot = SimpleNamespace(balances="gold\tN/A\t500\n", potion_mixes="1\tGreen\n", capacity_inventory="1\t100\t10000\t1000\n")
+    connection = SnapshotConnection(snapshot)
+    game_state.restore_snapshot(connection, "warm")
+
+    truncate = str(connection.executed[1][0])
+    assert truncate.startswith("TRUNCATE") and "capacity_inventory" in truncate and "inventory_ledger" in truncate
+    assert [data for _, data in connection.copied] == [snapshot.potion_mixes, snapshot.capacity_inventory, snapshot.balances]
+    assert connection.copied[-1][0] == "COPY ledger_staging (item_type, item_id, change_amount) FROM STDIN"
+    assert any(query is ledger.RECORD_STAGED_QUERY for query, _ in connection.executed)
+
+
+def test_restoring_an_unknown_snapshot_changes_nothing():
+    connection = SnapshotConnection(None)
+    with pytest.raises(game_state.SnapshotNotFound):
+        game_state.restore_snapshot(connection, "missing")
+    assert len(connection.executed) == 1
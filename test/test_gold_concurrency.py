@@ -0,0 +1,80 @@
+"""
+Concurrent gold spending against a real Postgres. Runs only when TEST_POSTGRES_URI
+points at a scratch database with schema.sql and the migrations loaded; the test
+commits ledger rows there.
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+import sqlalchemy
+from fastapi import HTTPException
+from src import database as db
+from src import ledger
+from src.api import barrels
+
+TEST_URI = os.environ.get("TEST_POSTGRES_URI")
+
+pytestmark = pytest.mark.skipif(not TEST_URI, reason="TEST_POSTGRES_URI is not set")
+
+WORKERS = 16
+ATTEMPTS = 64
+PRICE = 100
+
+
+@pytest.fixture
+def engine(monkeypatch):
+    engine = sqlalchemy.create_engine(TEST_URI, pool_size=WORKERS, max_overflow=0)
+    monkeypatch.setattr(db, "_engine", engine)
+    # Deliveries are idempotent by order id; forget the ones an earlier run made
+    with engine.begin() as connection:
+        connection.execute(sqlalchemy.text("DELETE FROM processed_orders WHERE order_type = 'barrels'"))
+    yield engine
+    engine.dispose()
+
+
+def set_gold(engine, amount):
+    with engine.begin() as connection:
+        current = ledger.lock_gold(connection)
+        ledger.record_entries(connection, [
+            {'item_type': 'gold', 'item_id': 'N/A', 'change_amount': amount - current, 'description': 'gold stress test'}
+        ])
+
+
+def test_parallel_spends_never_overdraw(engine):
+    set_gold(engine, PRICE * 10)
+
+    def spend(_):
+        with engine.begin() as connection:
+            try:
+                ledger.spend_gold(connection, PRICE, 'gold stress test')
+                return True
+            except ledger.InsufficientGold:
+                return False
+
+    with ThreadPoolExecutor(WORKERS) as pool:
+        results = list(pool.map(spend, range(ATTEMPTS)))
+
+    with engine.begin() as connection:
+        assert ledger.get_gold(connection) == 0
+    assert results.count(True) == 10
+
+
+def test_parallel_barrel_deliveries_never_overdraw(engine):
+    set_gold(engine, PRICE * 10)
+    barrel = barrels.Barrel(sku="SMALL_RED_BARREL", ml_per_barrel=500, potion_type=[1, 0, 0, 0], price=PRICE, quantity=3)
+
+    def deliver(order_id):
+        try:
+            barrels.post_deliver_barrels([barrel], order_id)
+            return True
+        except HTTPException as e:
+            assert e.status_code == 400
+            return False
+
+    with ThreadPoolExecutor(WORKERS) as pool:
+        results = list(pool.map(deliver, range(ATTEMPTS)))
+
+    with engine.begin() as connection:
+        assert ledger.get_gold(connection) == PRICE * 10 - results.count(True) * PRICE * 3
+    # 1000 gold covers three deliveries of 300; the 100 left can't buy a fourth
+    assert results.count(True) == 3
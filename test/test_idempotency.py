@@ -0,0 +1,106 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+import pytest
+import sqlalchemy
+from fastapi import HTTPException
+from src import database as db
+from src import idempotency
+from src import ledger
+from src.api import barrels
+
+
+class OrderConnection:
+    """Stands in for processed_orders: the claim inserts unless the key is taken."""
+
+    def __init__(self, stored=None):
+        self.stored = dict(stored or {})
+        self.executed = []
+        self._result = None
+
+    def execute(self, query, params=None):
+        self.executed.append(query)
+        key = (params['order_type'], params['order_id'])
+        if query is idempotency.CLAIM_ORDER_QUERY:
+            if key in self.stored:
+                self._result = None
+            else:
+                self.stored[key] = SimpleNamespace(request_hash=params['request_hash'], response=params['response'])
+                self._result = params['order_id']
+        else:
+            self._result = self.stored[key]
+        return self
+
+    def scalar(self):
+        return self._result
+
+    def fetchone(self):
+        return self._result
+
+
+def test_new_order_is_claimed_with_a_single_insert():
+    connection = OrderConnection()
+    assert idempotency.claim_order(connection, 'barrels', 7, [{'sku': 'RED'}], {'status': 'ok'}) is None
+    assert connection.executed == [idempotency.CLAIM_ORDER_QUERY]
+    assert ('barrels', 7) in connection.stored
+
+
+def test_duplicate_order_returns_the_stored_response():
+    stored = {('barrels', 7): SimpleNamespace(request_hash=idempotency.request_hash([{'sku': 'RED'}]), response={'status': 'ok'})}
+    connection = OrderConnection(stored)
+    assert idempotency.claim_order(connection, 'barrels', 7, [{'sku': 'RED'}], {'status': 'other'}) == {'status': 'ok'}
+
+
+def test_reused_order_id_with_another_payload_conflicts():
+    stored = {('barrels', 7): SimpleNamespace(request_hash=idempotency.request_hash([{'sku': 'RED'}]), response={'status': 'ok'})}
+    connection = OrderConnection(stored)
+    with pytest.raises(idempotency.OrderConflict):
+        idempotency.claim_order(connection, 'barrels', 7, [{'sku': 'BLUE'}], {'status': 'ok'})
+
+
+def test_order_ids_are_scoped_by_order_type():
+    connection = OrderConnection()
+    assert idempotency.claim_order(connection, 'barrels', 7, [], {'status': 'ok'}) is None
+    assert idempotency.claim_order(connection, 'bottles', 7, [], {'status': 'ok'}) is None
+
+
+def test_request_hash_ignores_key_order():
+    assert idempotency.request_hash({'a': 1, 'b': 2}) == idempotency.request_hash({'b': 2, 'a': 1})
+    assert idempotency.request_hash({'a': 1}) != idempotency.request_hash({'a': 2})
+
+
+# Duplicate submissions against a real Postgres; runs only when TEST_POSTGRES_URI points
+# at a scratch database with schema.sql and the migrations loaded.
+TEST_URI = os.environ.get("TEST_POSTGRES_URI")
+ORDER_ID = 990001
+WORKERS = 8
+
+
+@pytest.mark.skipif(not TEST_URI, reason="TEST_POSTGRES_URI is not set")
+def test_concurrent_duplicate_deliveries_apply_once(monkeypatch):
+    engine = sqlalchemy.create_engine(TEST_URI, pool_size=WORKERS, max_overflow=0)
+    monkeypatch.setattr(db, "_engine", engine)
+    try:
+        with engine.begin() as connection:
+            connection.execute(sqlalchemy.text(
+                "DELETE FROM processed_orders WHERE order_type = 'barrels' AND order_id = :order_id"
+            ), {'order_id': ORDER_ID})
+            gold = ledger.lock_gold(connection)
+            ledger.record_entries(connection, [
+                {'item_type': 'gold', 'item_id': 'N/A', 'change_amount': 1000 - gold, 'description': 'idempotency test'}
+            ])
+
+        barrel = barrels.Barrel(sku="SMALL_RED_BARREL", ml_per_barrel=500, potion_type=[1, 0, 0, 0], price=100, quantity=1)
+        with ThreadPoolExecutor(WORKERS) as pool:
+            responses = list(pool.map(lambda _: barrels.post_deliver_barrels([barrel], ORDER_ID), range(WORKERS)))
+
+        with engine.begin() as connection:
+            assert ledger.get_gold(connection) == 900
+        assert all(response == responses[0] for response in responses)
+
+        # Same order id, different barrels
+        with pytest.raises(HTTPException) as error:
+            barrels.post_deliver_barrels([barrel.copy(update={'quantity': 2})], ORDER_ID)
+        assert error.value.status_code == 409
+    finally:
+        engine.dispose()
@@ -0,0 +1,100 @@
+from collections import namedtuple
+from src import ledger
+
+
+def test_writer_flushes_everything_in_one_statement(connection):
+    with ledger.LedgerWriter(connection) as writer:
+        writer.add('gold', 'N/A', -100, 'barrel purchase')
+        writer.add('ml', 'red', 2500, 'barrel delivery')
+        assert connection.executed == []
+
+    assert len(connection.executed) == 1
+    query, params = connection.executed[0]
+    assert query is ledger.RECORD_ENTRIES_QUERY
+    assert params == {
+        'item_types': ['gold', 'ml'],
+        'item_ids': ['N/A', 'red'],
+        'change_amounts': [-100, 2500],
+        'descriptions': ['barrel purchase', 'barrel delivery'],
+    }
+
+
+def test_writer_does_not_flush_after_an_error(connection):
+    try:
+        with ledger.LedgerWriter(connection) as writer:
+            writer.add('gold', 'N/A', 5, 'sale income')
+            raise ValueError("checkout failed")
+    except ValueError:
+        pass
+    assert connection.executed == []
+
+
+def test_empty_flush_is_a_no_op(connection):
+    ledger.record_entries(connection, [])
+    assert connection.executed == []
+
+
+def test_copy_text_escapes_copy_specials():
+    assert ledger._copy_text("a\tb\nc\\d") == "a\\tb\\nc\\\\d"
+    assert ledger._copy_text(None) == "\\N"
+
+
+def test_spend_gold_locks_then_debits(fake_connection):
+    connection = fake_connection({ledger.LOCK_GOLD_QUERY: 500})
+    assert ledger.spend_gold(connection, 200, 'barrel purchase') == 300
+    assert connection.executed[0][0] is ledger.LOCK_GOLD_QUERY
+    assert connection.executed[1][1]['change_amounts'] == [-200]
+
+
+def test_spend_gold_refuses_to_overspend(fake_connection):
+    connection = fake_connection({ledger.LOCK_GOLD_QUERY: 100})
+    with ledger.LedgerWriter(connection) as writer:
+        try:
+            ledger.spend_gold(connection, 200, 'barrel purchase', writer)
+        except ledger.InsufficientGold as e:
+            assert (e.balance, e.amount) == (100, 200)
+        else:
+            raise AssertionError("spent more gold than the balance")
+    assert [query for query, _ in connection.executed] == [ledger.LOCK_GOLD_QUERY]
+
+
+def test_record_entries_writes_the_ledger_and_balances_in_one_statement(connection):
+    ledger.record_entries(connection, [
+        {'item_type': 'potion', 'item_id': 'GP-001', 'change_amount': -2, 'description': 'sale'},
+        {'item_type': 'gold', 'item_id': 'N/A', 'change_amount': 100, 'description': 'sale income'},
+    ])
+    assert len(connection.executed) == 1
+    query, params = connection.executed[0]
+    assert query is ledger.RECORD_ENTRIES_QUERY
+    assert params['change_amounts'] == [-2, 100]
+
+
+def test_balance_upsert_adds_to_the_running_total():
+    sql = str(ledger.RECORD_ENTRIES_QUERY)
+    assert "INSERT INTO inventory_ledger" in sql
+    assert "ON CONFLICT (item_type, item_id) DO UPDATE" in sql
+    assert "balance = inventory_balances.balance + EXCLUDED.balance" in sql
+    # Rows are locked in key order, the order lock_gold relies on
+    assert sql.index("GROUP BY item_type, item_id") < sql.index("ORDER BY item_type, item_id")
+
+
+def test_consistency_check_reports_only_mismatches(fake_connection):
+    Row = namedtuple("Row", "item_type item_id balance")
+    derived = [Row('gold', 'N/A', 100), Row('ml', 'red', 500), Row('potion', 'GP-001', 3)]
+    stored = [Row('gold', 'N/A', 100), Row('ml', 'red', 400), Row('ml', 'blue', 0)]
+    connection = fake_connection(in_order=[derived, stored])
+
+    assert ledger.check_consistency(connection) == [
+        ('ml', 'red', 400, 500),
+        ('potion', 'GP-001', None, 3),
+    ]
+
+
+def test_checkpoint_waits_until_enough_rows_piled_up(fake_connection):
+    connection = fake_connection(in_order=[99])
+    assert ledger.checkpoint_if_due(connection, every=100) is None
+    assert len(connection.executed) == 1
+
+    connection = fake_connection(in_order=[100, None, 7, None])
+    assert ledger.checkpoint_if_due(connection, every=100) == 7
+    assert any("INSERT INTO ledger_checkpoints" in str(query) for query, _ in connection.executed)
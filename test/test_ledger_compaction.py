@@ -0,0 +1,138 @@
+import datetime
+import os
+from types import SimpleNamespace
+import pytest
+import sqlalchemy
+from src import ledger
+
+TODAY = datetime.date(2024, 6, 30)
+
+
+class PartitionConnection:
+    """Answers the partition catalog and id lookups; records everything else."""
+
+    def __init__(self, partitions, last_checkpointed=0, newest_expired=0, oldest_default=None):
+        self.partitions = list(partitions)
+        self.last_checkpointed = last_checkpointed
+        self.newest_expired = newest_expired
+        self.oldest_default = oldest_default
+        self.executed = []
+        self._result = None
+
+    def execute(self, query, params=None):
+        sql = str(query)
+        self.executed.append((sql, params))
+        if query is ledger.LEDGER_PARTITIONS_QUERY:
+            return [SimpleNamespace(relname=name) for name in self.partitions]
+        if "FROM ledger_checkpoints" in sql:
+            self._result = self.last_checkpointed
+        elif "MAX(id)" in sql:
+            self._result = self.newest_expired
+        elif "inventory_ledger_default" in sql and "MIN(date)" in sql:
+            self._result = self.oldest_default
+        elif "ATTACH PARTITION" in sql:
+            self.partitions.append(sql.split()[5])
+        return self
+
+    def scalar(self):
+        return self._result
+
+    def statements(self, fragment):
+        return [sql for sql, _ in self.executed if fragment in sql]
+
+
+def test_partition_names_round_trip():
+    connection = PartitionConnection([ledger.partition_name(TODAY), "inventory_ledger_default"])
+    assert ledger.ledger_partitions(connection) == {TODAY: "inventory_ledger_p20240630"}
+
+
+def test_ensure_partitions_creates_the_missing_days_ahead():
+    connection = PartitionConnection([ledger.partition_name(TODAY)])
+    created = ledger.ensure_partitions(connection, today=TODAY, ahead=2)
+    assert created == ["inventory_ledger_p20240701", "inventory_ledger_p20240702"]
+    assert len(connection.statements("ATTACH PARTITION")) == 2
+
+
+def test_ensure_partitions_moves_old_rows_out_of_the_default():
+    connection = PartitionConnection([], oldest_default=TODAY - datetime.timedelta(days=2))
+    created = ledger.ensure_partitions(connection, today=TODAY, ahead=0)
+    assert created == ["inventory_ledger_p20240628", "inventory_ledger_p20240629", "inventory_ledger_p20240630"]
+    assert len(connection.statements("DELETE FROM inventory_ledger_default")) == 3
+
+
+def test_compaction_folds_and_detaches_only_expired_days():
+    days = [TODAY - datetime.timedelta(days=n) for n in (40, 31, 30, 1)]
+    connection = PartitionConnection([ledger.partition_name(day) for day in days], last_checkpointed=500, newest_expired=100)
+    compacted = ledger.compact_ledger(connection, retention_days=30, today=TODAY)
+
+    assert compacted == days[:2]
+    assert connection.statements("DETACH PARTITION") == [
+        f"ALTER TABLE inventory_ledger DETACH PARTITION {ledger.partition_name(day)}" for day in days[:2]
+    ]
+    assert len(connection.statements("INSERT INTO ledger_compacted_balances")) == 2
+    # The existing checkpoint already covers every compacted row
+    assert connection.statements("INSERT INTO ledger_checkpoints") == []
+
+
+def test_compaction_checkpoints_rows_newer_than_the_last_checkpoint():
+    day = TODAY - datetime.timedelta(days=45)
+    connection = PartitionConnection([ledger.partition_name(day)], last_checkpointed=10, newest_expired=100)
+    ledger.compact_ledger(connection, retention_days=30, today=TODAY)
+
+    checkpoint = connection.executed.index(next(e for e in connection.executed if "INSERT INTO ledger_checkpoints" in e[0]))
+    detach = connection.executed.index(next(e for e in connection.executed if "DETACH PARTITION" in e[0]))
+    assert checkpoint < detach
+
+
+def test_nothing_to_compact_runs_no_ddl():
+    connection = PartitionConnection([ledger.partition_name(TODAY)])
+    assert ledger.compact_ledger(connection, retention_days=30, today=TODAY) == []
+    assert connection.statements("ALTER TABLE") == []
+
+
+# Totals before and after compaction against a real Postgres. Runs only when
+# TEST_POSTGRES_URI points at a scratch database with schema.sql and the migrations
+# loaded; the test resets the ledger there.
+TEST_URI = os.environ.get("TEST_POSTGRES_URI")
+
+
+@pytest.mark.skipif(not TEST_URI, reason="TEST_POSTGRES_URI is not set")
+def test_totals_match_before_and_after_compaction():
+    engine = sqlalchemy.create_engine(TEST_URI)
+    today = datetime.date.today()
+    try:
+        with engine.begin() as connection:
+            connection.execute(sqlalchemy.text(
+                "TRUNCATE inventory_ledger, inventory_balances, ledger_checkpoint_balances, ledger_checkpoints, ledger_compacted_balances"
+            ))
+            # Ten days of history, the oldest five past a five-day retention window
+            for age in range(10, 0, -1):
+                ledger.record_entries(connection, [
+                    {'item_type': 'gold', 'item_id': 'N/A', 'change_amount': 100 * age, 'description': 'compaction test'},
+                    {'item_type': 'ml', 'item_id': 'red', 'change_amount': -age, 'description': 'compaction test'},
+                    {'item_type': 'potion', 'item_id': f'P-{age % 3}', 'change_amount': age, 'description': 'compaction test'},
+                ])
+                connection.execute(sqlalchemy.text(
+                    "UPDATE inventory_ledger SET date = now() - make_interval(days => :age) WHERE date = now()"
+                ), {'age': age})
+            ledger.ensure_partitions(connection, today=today)
+            before = ledger.derive_balances(connection, full_replay=True)
+            balances = ledger.get_balances(connection)
+
+        with engine.begin() as connection:
+            compacted = ledger.compact_ledger(connection, retention_days=5, today=today)
+            assert len(compacted) == 5
+
+        with engine.begin() as connection:
+            assert ledger.derive_balances(connection, full_replay=True) == before
+            assert ledger.derive_balances(connection) == before
+            assert ledger.get_balances(connection) == balances
+            assert ledger.check_consistency(connection, full_replay=True) == []
+            remaining = connection.execute(sqlalchemy.text("SELECT COUNT(*) FROM inventory_ledger")).scalar()
+            assert remaining == 15
+            ledger.rebuild_balances(connection)
+            assert ledger.get_balances(connection) == balances
+            connection.execute(sqlalchemy.text("DROP SCHEMA ledger_archive CASCADE"))
+            connection.execute(sqlalchemy.text("CREATE SCHEMA ledger_archive"))
+    finally:
+        engine.dispose()
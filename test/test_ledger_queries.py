@@ -0,0 +1,90 @@
+"""
+Ledger writes and the consistency check against a real Postgres. Runs only when
+TEST_POSTGRES_URI points at a scratch database with schema.sql and the migrations
+loaded; the tests commit ledger rows for throwaway item ids there.
+"""
+import os
+import uuid
+import pytest
+import sqlalchemy
+from src import ledger
+
+TEST_URI = os.environ.get("TEST_POSTGRES_URI")
+
+pytestmark = pytest.mark.skipif(not TEST_URI, reason="TEST_POSTGRES_URI is not set")
+
+
+@pytest.fixture
+def engine():
+    engine = sqlalchemy.create_engine(TEST_URI)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def item_id():
+    return f"test-{uuid.uuid4().hex[:12]}"
+
+
+def entries(item_id, *amounts):
+    return [
+        {'item_type': 'ml', 'item_id': item_id, 'change_amount': amount, 'description': 'ledger query test'}
+        for amount in amounts
+    ]
+
+
+def ledger_rows(connection, item_id):
+    return connection.execute(sqlalchemy.text(
+        "SELECT change_amount FROM inventory_ledger WHERE item_type = 'ml' AND item_id = :item_id ORDER BY id"
+    ), {'item_id': item_id}).scalars().all()
+
+
+def test_balance_upsert_adds_every_entry_to_the_running_total(engine, item_id):
+    with engine.begin() as connection:
+        # Two entries for a new item in one statement, then one for an existing item
+        ledger.record_entries(connection, entries(item_id, 5, 7))
+        ledger.record_entries(connection, entries(item_id, -2))
+
+    with engine.begin() as connection:
+        assert ledger.get_balance(connection, 'ml', item_id) == 10
+        assert ledger_rows(connection, item_id) == [5, 7, -2]
+
+
+def test_copy_path_writes_the_same_ledger_and_balance(engine, item_id, monkeypatch):
+    monkeypatch.setattr(ledger, "COPY_THRESHOLD", 2)
+    with engine.begin() as connection:
+        ledger.record_entries(connection, entries(item_id, 5, 7, -2))
+
+    with engine.begin() as connection:
+        assert ledger.get_balance(connection, 'ml', item_id) == 10
+        assert ledger_rows(connection, item_id) == [5, 7, -2]
+
+
+def test_consistency_check_finds_a_balance_written_around_the_ledger(engine, item_id):
+    with engine.begin() as connection:
+        ledger.record_entries(connection, entries(item_id, 40))
+
+    with engine.connect() as connection:
+        with connection.begin() as transaction:
+            assert [m for m in ledger.check_consistency(connection) if m[1] == item_id] == []
+            connection.execute(sqlalchemy.text(
+                "UPDATE inventory_balances SET balance = balance + 1 WHERE item_type = 'ml' AND item_id = :item_id"
+            ), {'item_id': item_id})
+            assert [m for m in ledger.check_consistency(connection) if m[1] == item_id] == [('ml', item_id, 41, 40)]
+            transaction.rollback()
+
+
+def test_checkpoint_replay_agrees_with_a_full_replay(engine, item_id):
+    with engine.begin() as connection:
+        ledger.record_entries(connection, entries(item_id, 30))
+        assert ledger.checkpoint_if_due(connection, every=1) is not None
+        # Nothing written since, so the next one isn't due
+        assert ledger.checkpoint_if_due(connection, every=1) is None
+    with engine.begin() as connection:
+        ledger.record_entries(connection, entries(item_id, -12))
+
+    with engine.begin() as connection:
+        from_checkpoint = ledger.derive_balances(connection)
+        full = ledger.derive_balances(connection, full_replay=True)
+        assert from_checkpoint[('ml', item_id)] == full[('ml', item_id)] == 18
+        assert [m for m in ledger.check_consistency(connection) if m[1] == item_id] == []
@@ -0,0 +1,65 @@
+"""
+Checkouts, barrel deliveries and bottling running at once against a real Postgres.
+Each takes the gold row before any ml or potion row, so none of them can deadlock.
+Runs only when TEST_POSTGRES_URI points at a scratch database with schema.sql and
+the migrations loaded; the test commits carts and ledger rows there.
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+import sqlalchemy
+from fastapi import HTTPException
+from src import database as db
+from src import ledger
+from src.api import barrels, bottler, carts
+
+TEST_URI = os.environ.get("TEST_POSTGRES_URI")
+
+pytestmark = pytest.mark.skipif(not TEST_URI, reason="TEST_POSTGRES_URI is not set")
+
+WORKERS = 12
+ROUNDS = 30
+
+
+def test_checkout_barrels_and_bottling_do_not_deadlock(monkeypatch):
+    engine = sqlalchemy.create_engine(TEST_URI, pool_size=WORKERS, max_overflow=0)
+    monkeypatch.setattr(db, "_engine", engine)
+    try:
+        with engine.begin() as connection:
+            ledger.record_entries(connection, [
+                {'item_type': 'gold', 'item_id': 'N/A', 'change_amount': 1_000_000, 'description': 'lock order test'},
+                {'item_type': 'ml', 'item_id': 'green', 'change_amount': 1_000_000, 'description': 'lock order test'},
+                {'item_type': 'potion', 'item_id': 'GP-001', 'change_amount': 10_000, 'description': 'lock order test'},
+            ])
+            cart_ids = []
+            for _ in range(ROUNDS):
+                cart_id = carts.create_cart(connection, carts.Customer(customer_name="Lock Order", character_class="Tester", level=1))
+                carts.upsert_cart_item(connection, cart_id, carts.CartItem(item_sku="GP-001", quantity=1))
+                cart_ids.append(cart_id)
+
+        barrel = barrels.Barrel(sku="SMALL_GREEN_BARREL", ml_per_barrel=500, potion_type=[0, 1, 0, 0], price=1, quantity=1)
+
+        def checkout(cart_id):
+            with engine.begin() as connection:
+                carts.checkout_cart(connection, cart_id)
+
+        def deliver(_):
+            with engine.begin() as connection:
+                barrels.deliver_barrels(connection, [barrel])
+
+        def bottle(_):
+            with engine.begin() as connection:
+                bottler.bottle_potions(connection, {(0, 100, 0, 0): 1})
+
+        with ThreadPoolExecutor(WORKERS) as pool:
+            futures = []
+            for i, cart_id in enumerate(cart_ids):
+                futures += [pool.submit(checkout, cart_id), pool.submit(deliver, i), pool.submit(bottle, i)]
+            # A deadlock surfaces as an OperationalError from one of the futures
+            for future in futures:
+                try:
+                    future.result()
+                except HTTPException as e:
+                    assert e.status_code == 409
+    finally:
+        engine.dispose()
@@ -0,0 +1,48 @@
+import logging
+import sqlalchemy
+from src import metrics
+
+
+def test_engine_events_count_queries_of_the_current_request():
+    engine = metrics.instrument_engine(sqlalchemy.create_engine("sqlite://"))
+    with engine.connect() as connection:
+        connection.execute(sqlalchemy.text("SELECT 1"))  # outside a request: not counted
+        stats, token = metrics.start_request()
+        try:
+            connection.execute(sqlalchemy.text("CREATE TABLE t (x INTEGER)"))
+            connection.execute(sqlalchemy.text("INSERT INTO t VALUES (1), (2), (3)"))
+            connection.execute(sqlalchemy.text("SELECT x FROM t")).fetchall()
+        finally:
+            metrics.end_request(token)
+
+    assert stats.queries == 3
+    assert stats.rows >= 3
+    assert stats.db_seconds > 0
+
+
+def test_render_is_prometheus_text():
+    registry = metrics.MetricsRegistry()
+    stats = metrics.RequestStats()
+    stats.queries, stats.db_seconds, stats.rows = 4, 0.002, 10
+    registry.observe("GET", "/catalog/", 200, 0.03, stats)
+    registry.observe("GET", "/catalog/", 304, 0.001, metrics.RequestStats())
+
+    text = registry.render()
+    assert 'http_requests_total{method="GET",route="/catalog/",status="200"} 1' in text
+    assert 'http_requests_total{method="GET",route="/catalog/",status="304"} 1' in text
+    assert 'http_request_duration_seconds_bucket{method="GET",route="/catalog/",le="0.05"} 2' in text
+    assert 'http_request_duration_seconds_count{method="GET",route="/catalog/"} 2' in text
+    assert 'db_queries_total{method="GET",route="/catalog/"} 4' in text
+    assert 'db_rows_total{method="GET",route="/catalog/"} 10' in text
+    assert "# TYPE http_request_duration_seconds histogram" in text
+
+
+def test_query_threshold_logs_a_warning(monkeypatch, caplog):
+    monkeypatch.setenv("QUERY_WARN_THRESHOLD", "5")
+    registry = metrics.MetricsRegistry()
+    stats = metrics.RequestStats()
+    stats.queries = 6
+    with caplog.at_level(logging.WARNING):
+        registry.observe("POST", "/bottler/deliver/{order_id}", 200, 0.1, stats)
+    assert "possible N+1" in caplog.text
+    assert 'db_query_count_warnings_total{method="POST",route="/bottler/deliver/{order_id}"} 1' in registry.render()
@@ -0,0 +1,123 @@
+import asyncio
+import datetime
+from collections import namedtuple
+import pytest
+from fastapi import HTTPException
+from src import pagination
+from src.api import carts
+
+Row = namedtuple("Row", "cart_items_id item_sku customer_name line_item_total sold_at sort_value")
+
+
+class FakeConnection:
+    """Returns canned rows and records the parameters of each query."""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.params = []
+
+    def execute(self, query, params=None):
+        self.params.append(params)
+        return self
+
+    def fetchall(self):
+        return list(self.rows)
+
+
+def fake_run_in_transaction(connection):
+    async def run_in_transaction(fn, *args, **kwargs):
+        return fn(connection, *args, **kwargs)
+    return run_in_transaction
+
+
+def make_rows(ids):
+    sold_at = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+    return [Row(i, "GP-001", "Customer A", 50, sold_at, sold_at) for i in ids]
+
+
+def test_cursor_round_trip():
+    sold_at = datetime.datetime(2024, 1, 1, 12, 30, tzinfo=datetime.timezone.utc)
+    token = pagination.encode_cursor("timestamp", "desc", sold_at, 42, pagination.NEXT)
+    assert pagination.decode_cursor(token, "timestamp", "desc") == (sold_at.isoformat(), 42, pagination.NEXT)
+
+
+@pytest.mark.parametrize("token", [
+    "not a token",
+    pagination.encode_cursor("timestamp", "desc", "a", "b", pagination.NEXT),
+    "W10",
+    # A token from before the sort was recorded
+    "WyJhIiw1LCJuZXh0Il0",
+])
+def test_decode_rejects_malformed_tokens(token):
+    with pytest.raises(ValueError):
+        pagination.decode_cursor(token, "timestamp", "desc")
+
+
+@pytest.mark.parametrize("sort_col, sort_order", [("line_item_total", "desc"), ("timestamp", "asc")])
+def test_decode_rejects_a_token_from_another_sort(sort_col, sort_order):
+    token = pagination.encode_cursor("timestamp", "desc", "2024-01-01T00:00:00+00:00", 5, pagination.NEXT)
+    with pytest.raises(ValueError, match="issued for sort timestamp desc"):
+        pagination.decode_cursor(token, sort_col, sort_order)
+
+
+def test_escape_like():
+    assert pagination.escape_like("50%_off\\") == "50\\%\\_off\\\\"
+
+
+def test_first_page_has_only_a_next_token():
+    connection = FakeConnection(make_rows(range(10, 4, -1)))
+    page = carts.find_orders(connection, "100%", None, None, "", carts.search_sort_options.timestamp, carts.search_sort_order.desc)
+
+    assert [row.cart_items_id for row in page["results"]] == [10, 9, 8, 7, 6]
+    assert page["previous"] == ""
+    assert pagination.decode_cursor(page["next"], "timestamp", "desc")[1:] == (6, pagination.NEXT)
+    assert connection.params[0]["customer_name"] == "%100\\%%"
+    assert connection.params[0]["limit"] == carts.SEARCH_PAGE_SIZE + 1
+
+
+def test_previous_page_is_read_backwards_and_reversed():
+    token = pagination.encode_cursor("timestamp", "desc", "2024-01-01T00:00:00+00:00", 5, pagination.PREVIOUS)
+    # The previous page is fetched in ascending order and flipped back
+    connection = FakeConnection(make_rows([6, 7, 8, 9, 10]))
+    page = carts.find_orders(connection, None, None, None, token, carts.search_sort_options.timestamp, carts.search_sort_order.desc)
+
+    assert [row.cart_items_id for row in page["results"]] == [10, 9, 8, 7, 6]
+    assert page["previous"] == ""
+    assert pagination.decode_cursor(page["next"], "timestamp", "desc")[1:] == (6, pagination.NEXT)
+    assert connection.params[0]["cursor_id"] == 5
+    assert connection.params[0]["cursor_value"] == datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+@pytest.mark.parametrize("sort_col, value", [
+    (carts.search_sort_options.line_item_total, "fifty"),
+    (carts.search_sort_options.line_item_total, True),
+    (carts.search_sort_options.timestamp, "yesterday"),
+    (carts.search_sort_options.timestamp, 5),
+    (carts.search_sort_options.customer_name, None),
+])
+def test_cursor_value_that_doesnt_fit_the_column_never_reaches_the_query(sort_col, value):
+    token = pagination.encode_cursor(sort_col.value, "desc", value, 5, pagination.NEXT)
+    connection = FakeConnection([])
+    with pytest.raises(ValueError):
+        carts.find_orders(connection, None, None, None, token, sort_col, carts.search_sort_order.desc)
+    assert connection.params == []
+
+
+def test_search_rejects_bad_tokens_with_400(monkeypatch):
+    monkeypatch.setattr(carts.db, "run_in_transaction", fake_run_in_transaction(FakeConnection([])))
+    token = pagination.encode_cursor("timestamp", "desc", "2024-01-01T00:00:00+00:00", 5, pagination.NEXT)
+    for search_page, sort_col in [("garbage", "timestamp"), (token, "line_item_total")]:
+        with pytest.raises(HTTPException) as e:
+            asyncio.run(carts.search_orders(
+                search_page=search_page,
+                sort_col=carts.search_sort_options(sort_col),
+                sort_order=carts.search_sort_order.desc,
+            ))
+        assert e.value.status_code == 400
+
+
+def test_search_query_compares_against_the_cursor_in_sort_direction():
+    query = str(carts.search_orders_query(carts.search_sort_options.line_item_total, True, True))
+    assert "(ci.line_item_total, ci.cart_items_id) < (CAST(:cursor_value AS INTEGER), :cursor_id)" in query
+    assert "ORDER BY ci.line_item_total DESC, ci.cart_items_id DESC" in query
+    assert "potion_mixes" not in query
@@ -0,0 +1,67 @@
+import numpy as np
+from src.planner import color_demand, max_producible, plan_barrels, plan_bottles
+
+
+def test_max_producible_ignores_unused_colors():
+    compositions = [[100, 0, 0, 0], [50, 0, 50, 0], [0, 0, 0, 0]]
+    assert max_producible(compositions, [1000, 0, 200, 0]).tolist() == [10, 4, 0]
+
+
+def test_single_mix_uses_everything_it_can():
+    counts = plan_bottles([[0, 100, 0, 0]], [30], [0, 1050, 0, 0], max_potions=50)
+    assert counts.tolist() == [10]
+
+
+def test_plan_respects_potion_capacity():
+    counts = plan_bottles([[100, 0, 0, 0], [0, 100, 0, 0]], [50, 40], [10_000, 10_000, 0, 0], max_potions=7)
+    assert counts.sum() == 7
+    assert counts[0] >= counts[1]
+
+
+def test_plan_never_overdraws_any_color():
+    rng = np.random.default_rng(7)
+    for _ in range(200):
+        mixes = rng.integers(1, 40)
+        compositions = rng.multinomial(100, [0.25] * 4, size=mixes)
+        prices = rng.integers(1, 500, size=mixes)
+        ml_available = rng.integers(0, 20_000, size=4)
+        capacity = int(rng.integers(0, 500))
+
+        counts = plan_bottles(compositions, prices, ml_available, capacity)
+
+        assert (counts >= 0).all()
+        assert counts.sum() <= capacity
+        assert (counts @ compositions <= ml_available).all()
+
+
+def test_nothing_planned_without_ml_or_capacity():
+    assert plan_bottles([[100, 0, 0, 0]], [50], [0, 0, 0, 0], 50).tolist() == [0]
+    assert plan_bottles([[100, 0, 0, 0]], [50], [500, 0, 0, 0], 0).tolist() == [0]
+    assert plan_bottles([[100, 0, 0, 0]], [50], [500, 0, 0, 0], -10).tolist() == [0]
+
+
+def test_barrels_cheapest_per_ml_first():
+    # Same color, the large barrel is cheaper per ml
+    counts = plan_barrels([2500, 10000], [100, 250], [10, 10], [0, 0], gold=1000, ml_capacity_free=20_000, demand=[20_000, 0, 0, 0])
+    assert counts.tolist() == [0, 2]
+
+
+def test_barrels_respect_gold_capacity_and_stock():
+    ml_per_barrel = [500, 2500, 2500, 10000]
+    prices = [50, 100, 120, 250]
+    quantities = [3, 2, 1, 1]
+    colors = [0, 1, 2, 3]
+    counts = plan_barrels(ml_per_barrel, prices, quantities, colors, gold=300, ml_capacity_free=6000, demand=[10_000] * 4)
+    assert (counts <= quantities).all()
+    assert counts @ prices <= 300
+    assert counts @ ml_per_barrel <= 6000
+
+
+def test_barrels_skip_colors_without_demand():
+    counts = plan_barrels([2500, 2500], [100, 100], [5, 5], [0, 1], gold=1000, ml_capacity_free=100_000, demand=[0, 4000, 0, 0])
+    assert counts.tolist() == [0, 2]
+
+
+def test_color_demand_follows_mix_usage():
+    demand = color_demand([[100, 0, 0, 0], [50, 50, 0, 0]], [1000, 0, 0, 0], ml_capacity=10_000)
+    assert demand.tolist() == [6500, 2500, 0, 0]
@@ -0,0 +1,55 @@
+from src.potions import CompositionIndex, composition_to_potion_type, potion_type_to_composition
+
+
+def test_composition_to_potion_type_orders_colors():
+    assert composition_to_potion_type({"green": 50, "red": 0, "blue": 50, "dark": 0}) == [0, 50, 50, 0]
+
+
+def test_composition_to_potion_type_accepts_json():
+    assert composition_to_potion_type('{"red": 100}') == [100, 0, 0, 0]
+
+
+def test_potion_type_round_trip():
+    assert composition_to_potion_type(potion_type_to_composition([25, 25, 25, 25])) == [25, 25, 25, 25]
+
+
+class FakeConnection:
+    """Returns a fixed potion_mixes result and counts how often it was queried."""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.queries = 0
+
+    def execute(self, query, params=None):
+        self.queries += 1
+        return self
+
+    def fetchall(self):
+        return self.rows
+
+
+class Row:
+    def __init__(self, sku, potion_composition):
+        self.sku = sku
+        self.potion_composition = potion_composition
+
+
+def test_composition_index_resolves_from_memory():
+    connection = FakeConnection([Row("GP-001", {"green": 100}), Row("PP-001", {"green": 50, "blue": 50})])
+    index = CompositionIndex()
+    found, missing = index.resolve(connection, [(0, 100, 0, 0), (0, 50, 50, 0)])
+    assert found == {(0, 100, 0, 0): "GP-001", (0, 50, 50, 0): "PP-001"}
+    assert missing == []
+
+    index.resolve(connection, [(0, 100, 0, 0)])
+    assert connection.queries == 1
+
+
+def test_composition_index_reloads_once_on_miss():
+    connection = FakeConnection([Row("GP-001", {"green": 100})])
+    index = CompositionIndex()
+    index.get(connection)
+    found, missing = index.resolve(connection, [(100, 0, 0, 0)])
+    assert found == {}
+    assert missing == [[100, 0, 0, 0]]
+    assert connection.queries == 2
@@ -0,0 +1,26 @@
+import numpy as np
+from src.ranking import score_mixes
+
+
+def test_out_of_stock_mixes_rank_last():
+    scores = score_mixes([0, 5, 5], [500, 50, 40], [100] * 3, [10, 0, 0], [10, 0, 0])
+    assert scores[0] == -np.inf
+    assert list(np.argsort(-scores, kind="stable")) == [1, 2, 0]
+
+
+def test_hour_demand_can_outweigh_a_small_margin_gap():
+    # Same stock; the cheaper mix sells a lot at this hour
+    scores = score_mixes([20, 20], [60, 50], [100, 100], [0, 30], [0, 30])
+    assert scores[1] > scores[0]
+
+
+def test_margin_decides_without_sales_history():
+    scores = score_mixes([10, 10, 10], [30, 90, 60], [100] * 3, [0] * 3, [0] * 3)
+    assert list(np.argsort(-scores, kind="stable")) == [1, 2, 0]
+
+
+def test_scores_are_finite_for_everything_in_stock():
+    rng = np.random.default_rng(3)
+    stock = rng.integers(1, 100, size=50)
+    scores = score_mixes(stock, rng.integers(1, 500, size=50), [100] * 50, rng.integers(0, 20, size=50), rng.integers(0, 200, size=50))
+    assert np.isfinite(scores).all()
@@ -0,0 +1,54 @@
+from collections import namedtuple
+from src import sales
+from src.game_time import GameClock, GameTime
+
+Item = namedtuple("Item", "item_sku quantity gold")
+
+
+def test_clock_serves_the_posted_time_from_memory(connection):
+    clock = GameClock()
+    assert clock.current() is None
+    clock.set(12, "Bloomday", 14)
+    assert clock.current(connection) == GameTime(12, "Bloomday", 14)
+    assert connection.executed == []
+
+
+def test_clock_loads_the_last_tick_once(fake_connection):
+    clock = GameClock()
+    connection = fake_connection(in_order=[GameTime(3, "Edgeday", 4)])
+    assert clock.current(connection) == GameTime(3, "Edgeday", 4)
+    assert clock.current(connection) == GameTime(3, "Edgeday", 4)
+    assert len(connection.executed) == 1
+
+
+def test_checkout_lines_go_into_one_rollup_upsert(connection):
+    items = [Item("GP-001", 2, 100), Item("RP-001", 1, 75)]
+    sales.record_sales(connection, items, GameTime(3, "Edgeday", 4))
+
+    assert len(connection.executed) == 1
+    query, params = connection.executed[0]
+    assert query is sales.RECORD_SALES_QUERY
+    assert params == {
+        'game_day': "Edgeday",
+        'game_hour': 4,
+        'item_skus': ["GP-001", "RP-001"],
+        'quantities': [2, 1],
+        'golds': [100, 75],
+    }
+
+
+def test_sales_without_a_game_time_are_not_rolled_up(connection):
+    sales.record_sales(connection, [Item("GP-001", 2, 100)], None)
+    assert connection.executed == []
+
+
+def test_clock_rereads_a_tick_posted_to_another_worker(fake_connection):
+    now = [0.0]
+    clock = GameClock(ttl=5, clock=lambda: now[0])
+    clock.set(3, "Edgeday", 4)
+    connection = fake_connection(in_order=[GameTime(4, "Edgeday", 5)])
+    now[0] = 4
+    assert clock.current(connection) == GameTime(3, "Edgeday", 4)
+    now[0] = 6
+    assert clock.current(connection) == GameTime(4, "Edgeday", 5)
+    assert len(connection.executed) == 1
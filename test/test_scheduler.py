@@ -0,0 +1,109 @@
+import contextlib
+from src import database as db
+from src import metrics
+from src import scheduler
+from src import utils
+from src.api import barrels
+
+
+class ScriptedConnection:
+    """Answers scalar() calls in order and records the statements."""
+
+    def __init__(self, answers):
+        self.answers = list(answers)
+        self.executed = []
+
+    def execute(self, query, params=None):
+        self.executed.append((str(query), params))
+        return self
+
+    def scalar(self):
+        return self.answers.pop(0)
+
+
+class FakeEngine:
+    def __init__(self, connection):
+        self.connection = connection
+
+    @contextlib.contextmanager
+    def begin(self):
+        yield self.connection
+
+
+def make_job(calls):
+    return scheduler.Job("test", lambda connection: calls.append(connection))
+
+
+def test_jobs_are_due_at_their_hours():
+    assert scheduler.JOBS["barrels"].due(14)
+    assert scheduler.JOBS["capacity"].due(0)
+    assert not scheduler.JOBS["capacity"].due(2)
+
+
+def test_enabled_jobs_come_from_the_environment(monkeypatch):
+    monkeypatch.setenv("SCHEDULER_JOBS", "bottling, capacity")
+    assert [job.name for job in scheduler.enabled_jobs()] == ["bottling", "capacity"]
+
+
+def test_leader_runs_the_job_and_records_it(monkeypatch):
+    connection = ScriptedConnection([True, 7])
+    monkeypatch.setattr(db, "_engine", FakeEngine(connection))
+    calls = []
+    assert scheduler.run_job(make_job(calls), 3, "Edgeday", 2) == "ok"
+    assert calls == [connection]
+    assert connection.executed[-1][1]["run_id"] == 7
+    assert connection.executed[-1][1]["status"] == "ok"
+
+
+def test_another_leader_or_an_earlier_run_skips_the_job(monkeypatch):
+    calls = []
+    for answers in ([False], [True, None]):
+        monkeypatch.setattr(db, "_engine", FakeEngine(ScriptedConnection(answers)))
+        assert scheduler.run_job(make_job(calls), 3, "Edgeday", 2) == "skipped"
+    assert calls == []
+
+
+def test_a_running_job_is_not_started_again(monkeypatch):
+    monkeypatch.setattr(db, "_engine", None)
+    job = make_job([])
+    registry = metrics.MetricsRegistry()
+    monkeypatch.setattr(metrics, "registry", registry)
+    with job.lock:
+        assert scheduler.run_job(job, 3, "Edgeday", 2) == "skipped"
+    assert 'scheduler_job_runs_total{job="test",status="skipped"} 1' in registry.render()
+
+
+def test_catalog_is_invalidated_after_the_job_commits(monkeypatch):
+    events = []
+
+    class CommittingEngine(FakeEngine):
+        @contextlib.contextmanager
+        def begin(self):
+            yield self.connection
+            events.append("commit")
+
+    monkeypatch.setattr(db, "_engine", CommittingEngine(ScriptedConnection([True, 7])))
+    monkeypatch.setattr(scheduler.catalog, "invalidate_catalog", lambda: events.append("invalidate"))
+    job = scheduler.Job("test", lambda connection: events.append("run"), invalidates_catalog=True)
+    assert scheduler.run_job(job, 3, "Edgeday", 2) == "ok"
+    assert events == ["run", "commit", "invalidate"]
+
+
+def test_barrels_job_waits_for_a_wholesale_catalog(monkeypatch):
+    monkeypatch.setattr(barrels, "last_wholesale_catalog", [])
+    connection = ScriptedConnection([])
+    assert utils.purchase_barrels_if_needed(connection) == 0
+    assert connection.executed == []
+
+
+def test_barrels_job_buys_what_the_planner_picks(monkeypatch):
+    offered = barrels.Barrel(sku="SMALL_RED_BARREL", ml_per_barrel=500, potion_type=[1, 0, 0, 0], price=100, quantity=10)
+    monkeypatch.setattr(barrels, "last_wholesale_catalog", [offered])
+    planned = []
+    monkeypatch.setattr(barrels, "plan_purchase", lambda connection, catalog, gold: planned.append(gold) or [(offered, 3)])
+    delivered = []
+    monkeypatch.setattr(barrels, "deliver_barrels", lambda connection, bought: delivered.extend(bought))
+
+    assert utils.purchase_barrels_if_needed(ScriptedConnection([450])) == 1
+    assert planned == [450]
+    assert [(barrel.sku, barrel.quantity) for barrel in delivered] == [("SMALL_RED_BARREL", 3)]